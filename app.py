@@ -1,8 +1,17 @@
-from flask import Flask, render_template, request, jsonify, session, url_for, send_file, redirect
+from flask import Flask, render_template, request, jsonify, session, url_for, send_file, redirect, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime, timedelta
-from gpt_agent import analyze_health_records, analyze_poop_image
+from gpt_agent import extraction_cache
+from ocr import shutdown_pool as shutdown_ocr_pool
+from jobs import job_queue
+from assistant_runs import wait_for_run
+from training_tips import training_tips_cache
+from breeds import breeds_for
+from image_ingest import ingest_data_url, IngestedImage
+from pagination import encode_file_cursor, decode_file_cursor
+from content_store import is_content_key
+from spool import spool, SpoolFullError
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
@@ -21,8 +30,9 @@ import json
 from PIL import Image
 import io
 import time
-import pyheif
-import asyncio
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial, lru_cache, wraps
 import base64
 from email.mime.text import MIMEText
@@ -33,8 +43,7 @@ import requests
 from authlib.integrations.flask_client import OAuth
 from werkzeug.security import generate_password_hash, check_password_hash
 from jose import jwt
-import tempfile
-from storage import S3Storage
+from storage import get_storage, init_storage
 from sqlalchemy import text
 
 # Configure logging
@@ -53,7 +62,8 @@ else:
     logger.warning("No .env file found, using environment variables from system")
 
 # Import after environment is loaded
-from database import get_db_connection
+from database import (raw_pool, db_connection, remove_db_session, begin_request_session, finish_request_session,
+                      commit_db_session, on_commit)
 
 # Initialize OpenAI client
 client = OpenAI(
@@ -65,6 +75,9 @@ translation_api_key=os.environ.get("TRANSLATION_API_KEY")
 app = Flask(__name__)
 app.secret_key = os.environ.get("APP_SECRET_KEY", 'dev-secret-key-123')  # Required for session management
 
+# Build the shared storage backend and check it once, instead of on every request
+init_storage()
+
 # Auth0 configuration
 oauth = OAuth(app)
 auth0 = oauth.register(
@@ -81,14 +94,65 @@ auth0 = oauth.register(
     },
 )
 
-# Configure upload folder
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+# Uploads are written to per-request spool directories (see spool.py)
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'heic', 'txt'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Remove scratch directories left behind by crashed requests or workers
+spool.start_sweeper()
+# Resume or fail analysis jobs a restart left queued or running
+job_queue.start_recovery()
+# Drop shared extracted text older than extraction_cache_max_age_days
+threading.Thread(target=extraction_cache.prune, name='extraction-cache-prune', daemon=True).start()
+
+@atexit.register
+def shutdown_background_work():
+    """Release per-process resources when the worker exits"""
+    spool.stop_sweeper()
+    # Running jobs still need the OCR and database pools, so let them finish first
+    job_queue.shutdown(wait=True)
+    shutdown_ocr_pool()
+    raw_pool.close()
+
+def request_spool_dir():
+    """Scratch directory for this request's files, deleted when the request ends"""
+    path = spool.create('request-')
+    g.setdefault('spool_dirs', []).append(path)
+    return path
+
+def hand_off_spool_dir(path):
+    """Keep a request's scratch directory past the request (a background job now owns it)"""
+    g.spool_dirs.remove(path)
+
+@app.teardown_request
+def release_spool_dirs(exception=None):
+    for path in g.pop('spool_dirs', []):
+        spool.release(path)
+
+def read_only(f):
+    """Mark a route as read-only: its session refuses writes and is never committed"""
+    f.read_only = True
+    return f
+
+@app.before_request
+def start_unit_of_work():
+    # One session per request: routes flush with commit_db_session() and the
+    # request commits once, after the response is built
+    view = app.view_functions.get(request.endpoint)
+    begin_request_session(read_only=getattr(view, 'read_only', False))
+
+@app.after_request
+def commit_unit_of_work(response):
+    try:
+        finish_request_session(commit=response.status_code < 400)
+    except Exception as e:
+        logger.error(f"Error committing request: {e}")
+        response = jsonify({'success': False, 'error': 'Could not save changes'})
+        response.status_code = 500
+    return response
+
+# Closes the session if the request failed before after_request ran
+app.teardown_appcontext(remove_db_session)
 
 # Store token and expiry globally (for demo; for production, use a better cache)
 petfinder_token = None
@@ -219,7 +283,7 @@ def callback_handling():
                 user_type='patient'  # Default user type
             )
             db.add(user)
-            db.commit()
+            commit_db_session(db)
         
         # Store user ID in session for database operations (convert UUID to string)
         session['db_user_id'] = str(user.id)
@@ -277,6 +341,25 @@ def requires_auth_api(f):
         return f(*args, **kwargs)
     return decorated
 
+def requires_admin_api(f):
+    """Decorator to restrict API routes to admin users"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'is_authenticated' not in session or not session['is_authenticated']:
+            return jsonify({'error': 'user not authenticated'}), 401
+        from models import User
+        from database import get_db_session, close_db_session
+        db = get_db_session()
+        try:
+            user = db.query(User).filter(User.id == session.get('db_user_id')).first()
+            is_admin = bool(user and user.is_admin)
+        finally:
+            close_db_session(db)
+        if not is_admin:
+            return jsonify({'success': False, 'error': 'Admin access required'}), 403
+        return f(*args, **kwargs)
+    return decorated
+
 def requires_auth_web(f):
     """Decorator to check if user is authenticated for web routes"""
     @wraps(f)
@@ -343,8 +426,9 @@ def home():
                             db.query(Pet).filter(Pet.user_id == user_id_uuid).update({"is_active": False})
                             # Set selected pet to active
                             active_db_pet.is_active = True
-                            db.commit()
+                            commit_db_session(db)
                     except Exception as e:
+                        db.rollback()
                         logger.error(f"Error updating active pet: {e}")
             except Exception as e:
                 logger.error(f"Error retrieving pets from database: {e}")
@@ -357,6 +441,104 @@ def home():
                           pets=pets,
                           active_pet=active_pet)
 
+def store_avatar(avatar_data, user_id, pet_id, name):
+    """Decode a base64 avatar and store its thumbnail/card/full renditions"""
+    basename = secure_filename(f"{name or 'pet'}_avatar") or 'avatar'
+    return ingest_data_url(avatar_data, get_storage(), user_id, pet_id, 'avatar', basename)
+
+def avatar_urls(record):
+    """Every URL a pet's or user's avatar uses: avatar_url and all its renditions"""
+    urls = {record.avatar_url} if record.avatar_url else set()
+    for formats in (record.avatar_renditions or {}).values():
+        urls.update(formats.values())
+    return urls
+
+def release_avatar_urls(urls):
+    """Delete stored avatar objects nothing refers to any more"""
+    storage = get_storage()
+    for url in urls:
+        try:
+            key = storage.key_from_url(url)
+        except Exception:
+            continue
+        # Placeholders and external URLs aren't ours to delete
+        if is_content_key(key):
+            storage.delete_file(url)
+
+def replace_avatar(db, record, avatar):
+    """
+    Point a pet or user at a new avatar
+
+    Args:
+        db: Session the record belongs to
+        record: Pet or User
+        avatar: IngestedImage from store_avatar, or a plain URL
+
+    The previous avatar's renditions are released once db commits; any
+    still referenced elsewhere (e.g. by an avatar PetFile) are kept.
+    """
+    previous = avatar_urls(record)
+    if isinstance(avatar, IngestedImage):
+        record.avatar_url = avatar.url
+        record.avatar_renditions = avatar.renditions
+    else:
+        record.avatar_url = avatar
+        record.avatar_renditions = None
+    released = previous - avatar_urls(record)
+    if released:
+        on_commit(db, lambda: release_avatar_urls(released))
+
+def avatar_file_record(pet_id, avatar, name):
+    """PetFile row for a stored avatar, pointing at its card rendition"""
+    from models import PetFile
+    return PetFile(
+        pet_id=pet_id,
+        file_type='avatar',
+        original_filename=f"{name or 'pet'}_avatar.webp",
+        s3_path=avatar.url,
+        content_type=avatar.content_type,
+        file_size=avatar.file_size
+    )
+
+# Bounded pool for saving and uploading the files of one request concurrently
+upload_executor = ThreadPoolExecutor(max_workers=default_config.max_workers, thread_name_prefix='upload')
+
+def store_upload(storage, file, file_path, filename, user_id, pet_id, file_type):
+    """
+    Save an uploaded file to file_path for analysis and copy it to storage
+
+    Returns:
+        Dict with filename, file_path, s3_path, content_type and file_size
+    """
+    logger.info(f"Saving file to local filesystem: {file_path}")
+    file.save(file_path)
+    spool.record(file_path)
+    
+    content_type = file.content_type if hasattr(file, 'content_type') else 'application/octet-stream'
+    
+    logger.info(f"Uploading file to S3: {filename}")
+    s3_result = storage.upload_file(file_path, user_id, pet_id, file_type, filename)
+    
+    return {
+        'filename': filename,
+        'file_path': file_path,
+        's3_path': s3_result,
+        'content_type': content_type,
+        'file_size': os.path.getsize(file_path)
+    }
+
+def release_uploads(storage, file_infos):
+    """
+    Give up the stored objects of files whose records won't be saved
+
+    Objects only this request stored are deleted. Content-addressed objects
+    are kept while recently claimed (another upload may be about to refer to
+    them); the unreferenced sweep removes them later.
+    """
+    for file_info in file_infos:
+        if file_info['s3_path']:
+            storage.delete_file(file_info['s3_path'])
+
 @app.route('/upload', methods=['POST'])
 @requires_auth_api
 def upload_file():
@@ -385,128 +567,94 @@ def upload_file():
         # Import necessary modules
         from models import PetFile
         from database import get_db_session, close_db_session
-        from storage import S3Storage
+        from storage import get_storage
         
-        # Initialize S3 storage client
-        s3_storage = S3Storage()
-        
-        file_paths = []
-        uploaded_files = []
-        
-        # Process files first (save locally and upload to S3)
-        processed_files = []
+        # Shared S3 storage client
+        storage = get_storage()
         
-        for file in files:
+        # Save and upload every file at once; the request takes about as long as the slowest file
+        spool_dir = request_spool_dir()
+        uploads = []
+        for index, file in enumerate(files):
             if file and file.filename:
                 filename = secure_filename(file.filename)
                 logger.info(f"Processing file: {filename}")
-                
-                try:
-                    # Save locally for AI processing
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    logger.info(f"Saving file to local filesystem: {file_path}")
-                    file.save(file_path)
-                    
-                    # Get file size and content type
-                    file_size = os.path.getsize(file_path)
-                    content_type = file.content_type if hasattr(file, 'content_type') else 'application/octet-stream'
-                    
-                    # Upload to S3
-                    logger.info(f"Uploading file to S3: {filename}")
-                    file.seek(0)  # Rewind file for S3 upload
-                    
-                    s3_result = s3_storage.upload_file_object(
-                        file,
-                        user_id,
-                        active_pet_id,
-                        'health_record',
-                        filename
-                    )
-                    
-                    if s3_result:
-                        processed_files.append({
-                            'filename': filename,
-                            'file_path': file_path,
-                            's3_path': s3_result,
-                            'content_type': content_type,
-                            'file_size': file_size
-                        })
-                        file_paths.append(file_path)
-                except Exception as file_error:
-                    logger.error(f"Error processing file {filename}: {str(file_error)}")
-                    return jsonify({'success': False, 'error': f'Error processing file {filename}: {str(file_error)}'}), 400
+                # Index prefix so same-named files in one request don't overwrite each other
+                file_path = os.path.join(spool_dir, f"{index}_{filename}")
+                uploads.append((filename, upload_executor.submit(
+                    store_upload, storage, file, file_path, filename, user_id, active_pet_id, 'health_record'
+                )))
+        
+        # Wait for every file, so none is still uploading when a failure is reported
+        processed_files = []
+        failed = []
+        for filename, future in uploads:
+            try:
+                file_info = future.result()
+            except Exception as file_error:
+                logger.error(f"Error processing file {filename}: {str(file_error)}")
+                failed.append((filename, file_error))
+                continue
+            if file_info['s3_path']:
+                processed_files.append(file_info)
+
+        if failed:
+            release_uploads(storage, processed_files)
+            filename, file_error = failed[0]
+            return jsonify({'success': False, 'error': f'Error processing file {filename}: {str(file_error)}'}), 400
         
         # If no files were processed successfully, return an error
         if not processed_files:
             return jsonify({'success': False, 'error': 'No files were processed successfully'}), 400
         
-        # Now save to database - each file in a separate transaction
-        file_records = []
-        
-        for file_info in processed_files:
-            # Get a fresh database session for each file to avoid transaction timeouts
-            db = get_db_session()
-            try:
-                # Create database record
-                pet_file = PetFile(
+        # Save all the records in one transaction
+        db = get_db_session()
+        try:
+            file_records = [
+                PetFile(
                     pet_id=active_pet_id,
                     file_type='health_record',
                     original_filename=file_info['filename'],
                     s3_path=file_info['s3_path'],
-                    local_path=file_info['file_path'],
                     content_type=file_info['content_type'],
                     file_size=file_info['file_size']
                 )
-                
-                db.add(pet_file)
-                db.commit()
-                file_records.append(pet_file)
-                logger.info(f"Created database record for file: {file_info['filename']}")
-            except Exception as db_error:
-                if db:
-                    db.rollback()
-                logger.error(f"Database error saving file {file_info['filename']}: {str(db_error)}")
-                # Continue with other files even if one fails to save to DB
-            finally:
-                if db:
-                    close_db_session(db)
-                    db = None
-        
-        # Now analyze the files
-        logger.info(f"Analyzing files: {file_paths}")
+                for file_info in processed_files
+            ]
+            db.add_all(file_records)
+            commit_db_session(db)
+            logger.info(f"Created database records for {len(file_records)} files")
+        except Exception as db_error:
+            db.rollback()
+            logger.error(f"Database error saving files: {str(db_error)}")
+            release_uploads(storage, processed_files)
+            return jsonify({'success': False, 'error': f'Database error: {str(db_error)}'}), 500
+        finally:
+            close_db_session(db)
         
-        try:
-            result = analyze_health_records(file_paths, document_type='vet_record')
-            logger.info(f"Analysis result: {result}")
-            
-            # Update file records with analysis results - one at a time
-            for pet_file in file_records:
-                db = get_db_session()
-                try:
-                    # Fetch the record again to ensure it's still valid
-                    updated_file = db.query(PetFile).filter(PetFile.id == pet_file.id).first()
-                    if updated_file:
-                        updated_file.analysis_json = result
-                        db.commit()
-                except Exception as analysis_db_error:
-                    if db:
-                        db.rollback()
-                    logger.error(f"Database error updating analysis: {str(analysis_db_error)}")
-                finally:
-                    if db:
-                        close_db_session(db)
-                        db = None
-            
-            return jsonify(result)
-        except Exception as analysis_error:
-            logger.error(f"Error analyzing files: {str(analysis_error)}")
-            # Return a success message with the issue
-            return jsonify({
-                'success': True, 
-                'message': 'Files uploaded successfully but could not be analyzed',
-                'error': str(analysis_error)
-            })
-            
+        file_paths = [file_info['file_path'] for file_info in processed_files]
+
+        # Analyze the files in the background and let the client poll for the result
+        job_id = job_queue.enqueue(
+            'health_record',
+            user_id,
+            active_pet_id,
+            {'file_paths': file_paths, 'document_type': 'vet_record', 'spool_dir': spool_dir},
+            file_ids=[pet_file.id for pet_file in file_records]
+        )
+        # The job deletes the files once it has analysed them
+        on_commit(db, lambda: hand_off_spool_dir(spool_dir))
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'file_ids': [str(pet_file.id) for pet_file in file_records]
+        }), 202
+
+    except SpoolFullError as e:
+        logger.warning(f"Upload refused: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
         if db:
             db.rollback()
@@ -514,8 +662,152 @@ def upload_file():
         logger.error(f"Upload error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+DIRECT_UPLOAD_TYPES = {
+    'health_record': ALLOWED_EXTENSIONS,
+    'poop': {'png', 'jpg', 'jpeg', 'heic'}
+}
+
+def direct_upload_prefix(user_id, pet_id, file_type):
+    """Key prefix a user may upload to directly; finalize rejects keys outside it"""
+    return f"{user_id}/{pet_id}/{file_type}/"
+
+@app.route('/uploads/presign', methods=['POST'])
+@requires_auth_api
+def presign_uploads():
+    """
+    Hand out presigned forms so the browser can upload files straight to S3
+
+    Expects {'file_type': 'health_record'|'poop', 'files': [{'filename', 'content_type', 'size'}]}.
+    Returns 501 when the storage backend can't accept direct uploads, so the
+    client can fall back to /upload or /analyze_poop.
+    """
+    try:
+        user_id = session.get('db_user_id')
+        active_pet_id = session.get('active_pet_id')
+        if not user_id or not active_pet_id:
+            return jsonify({'success': False, 'error': 'User or pet not found'}), 401
+
+        data = request.get_json(silent=True) or {}
+        file_type = data.get('file_type')
+        files = data.get('files') or []
+        if file_type not in DIRECT_UPLOAD_TYPES:
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+        if not files or (file_type == 'poop' and len(files) != 1):
+            return jsonify({'success': False, 'error': 'No files selected'}), 400
+
+        max_bytes = default_config.direct_upload_max_bytes
+        for file_info in files:
+            filename = secure_filename(file_info.get('filename') or '')
+            extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            if extension not in DIRECT_UPLOAD_TYPES[file_type]:
+                return jsonify({'success': False, 'error': f'File type not allowed: {filename}'}), 400
+            if int(file_info.get('size') or 0) > max_bytes:
+                return jsonify({'success': False, 'error': f'{filename} is larger than {max_bytes // (1024 * 1024)}MB'}), 400
+
+        storage = get_storage()
+        uploads = []
+        for file_info in files:
+            filename = secure_filename(file_info['filename'])
+            content_type = file_info.get('content_type') or 'application/octet-stream'
+            key = storage.make_key(user_id, active_pet_id, file_type, filename)
+            form = storage.presign_upload(key, content_type, max_bytes, default_config.direct_upload_expires)
+            uploads.append({
+                'key': key,
+                'filename': filename,
+                'content_type': content_type,
+                'url': form['url'],
+                'fields': form['fields']
+            })
+
+        return jsonify({'success': True, 'uploads': uploads})
+
+    except NotImplementedError:
+        return jsonify({'success': False, 'error': 'Direct uploads are not supported'}), 501
+    except Exception as e:
+        logger.error(f"Presign error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/uploads/finalize', methods=['POST'])
+@requires_auth_api
+def finalize_uploads():
+    """
+    Register files the browser uploaded directly and queue their analysis
+
+    Expects {'file_type': ..., 'uploads': [{'key', 'filename'}]} using keys
+    from /uploads/presign. Returns the same 202 job response as /upload.
+    """
+    from models import PetFile
+    from database import get_db_session, close_db_session
+
+    try:
+        user_id = session.get('db_user_id')
+        active_pet_id = session.get('active_pet_id')
+        if not user_id or not active_pet_id:
+            return jsonify({'success': False, 'error': 'User or pet not found'}), 401
+
+        data = request.get_json(silent=True) or {}
+        file_type = data.get('file_type')
+        uploads = data.get('uploads') or []
+        if file_type not in DIRECT_UPLOAD_TYPES:
+            return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+        if not uploads or (file_type == 'poop' and len(uploads) != 1):
+            return jsonify({'success': False, 'error': 'No uploads to finalize'}), 400
+
+        storage = get_storage()
+        prefix = direct_upload_prefix(user_id, active_pet_id, file_type)
+        objects = []
+        for upload in uploads:
+            key = upload.get('key') or ''
+            if not key.startswith(prefix) or '..' in key:
+                return jsonify({'success': False, 'error': 'Invalid upload key'}), 400
+            stored = storage.stat(key)
+            if not stored:
+                return jsonify({'success': False, 'error': f"Upload not found: {upload.get('filename') or key}"}), 400
+            objects.append((key, upload, stored))
+
+        db = get_db_session()
+        try:
+            file_records = []
+            for key, upload, stored in objects:
+                pet_file = PetFile(
+                    pet_id=active_pet_id,
+                    file_type=file_type,
+                    original_filename=secure_filename(upload.get('filename') or os.path.basename(key)),
+                    s3_path=storage.url_for_key(key),
+                    content_type=stored['content_type'] or 'application/octet-stream',
+                    file_size=stored['size']
+                )
+                db.add(pet_file)
+                file_records.append(pet_file)
+            commit_db_session(db)
+            file_ids = [pet_file.id for pet_file in file_records]
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            close_db_session(db)
+
+        keys = [key for key, _, _ in objects]
+        if file_type == 'poop':
+            payload = {'storage_key': keys[0]}
+        else:
+            payload = {'storage_keys': keys, 'document_type': 'vet_record'}
+        job_id = job_queue.enqueue(file_type, user_id, active_pet_id, payload, file_ids=file_ids)
+
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'file_ids': [str(file_id) for file_id in file_ids]
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Finalize upload error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/profile')
 @requires_auth_web
+@read_only
 def profile():
     # Get user profile data
     from models import User
@@ -560,6 +852,7 @@ def profile():
 
 @app.route('/dashboard')
 @requires_auth_web
+@read_only
 def dashboard():
     from models import User
     from database import get_db_session, close_db_session
@@ -610,7 +903,7 @@ def update_pet_profile():
             return jsonify({'success': False, 'error': 'User not found'}), 401
         
         # Import requirements
-        from models import Pet, PetFile
+        from models import Pet
         from database import get_db_session, close_db_session
         import uuid
         
@@ -633,51 +926,13 @@ def update_pet_profile():
                 # Process avatar if it's a base64 image
                 avatar_data = data.get('avatar')
                 avatar_url = None
+                avatar = None
                 
                 if avatar_data and isinstance(avatar_data, str) and avatar_data.startswith('data:'):
                     try:
-                        # Import necessary modules for image processing
-                        import base64
-                        import io
-                        from PIL import Image
-                        import os
-                        from storage import S3Storage
-                        
-                        # Extract image data from base64 string
-                        image_format = avatar_data.split(';')[0].split('/')[1]
-                        base64_data = avatar_data.split(',')[1]
-                        
-                        # Decode base64 data
-                        image_data = base64.b64decode(base64_data)
-                        
-                        # Create a temporary file
-                        temp_filename = f"temp_avatar_{uuid.uuid4()}.{image_format}"
-                        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-                        
-                        # Save image to temp file
-                        with open(temp_path, 'wb') as f:
-                            f.write(image_data)
-                        
-                        # Initialize S3 storage
-                        s3_storage = S3Storage()
-                        
-                        # Create placeholder pet_id for S3 path
-                        temp_pet_id = str(uuid.uuid4())
-                        
-                        # Upload to S3
-                        s3_result = s3_storage.upload_file(
-                            temp_path,
-                            user_id,
-                            temp_pet_id,  # We'll update this after pet creation
-                            'avatar',
-                            f"{data.get('pet_name', 'pet')}_avatar.{image_format}"
-                        )
-                        
-                        # Get S3 URL
-                        avatar_url = s3_result
-                        
-                        # Remove temp file
-                        os.remove(temp_path)
+                        # Placeholder pet_id for the storage path, since the pet doesn't exist yet
+                        avatar = store_avatar(avatar_data, user_id, str(uuid.uuid4()), data.get('pet_name'))
+                        avatar_url = avatar.url
                     except Exception as avatar_error:
                         logger.error(f"Error processing avatar image: {avatar_error}")
                         avatar_url = None
@@ -703,6 +958,7 @@ def update_pet_profile():
                     vet_phone=data.get('vet_phone', ''),
                     vet_address=data.get('vet_address', ''),
                     avatar_url=avatar_url,
+                    avatar_renditions=avatar.renditions if avatar else None,
                     is_active=True
                 )
                 
@@ -711,24 +967,18 @@ def update_pet_profile():
                 
                 # Add the new pet
                 db.add(pet)
-                db.commit()
+                commit_db_session(db)
                 
                 # Get the ID of the newly created pet (as string for JSON)
                 pet_id = str(pet.id)
                 
                 # If we processed an avatar, create a PetFile record for it
-                if avatar_url and pet_id:
+                if avatar and pet_id:
                     try:
-                        # Create pet file record
-                        pet_file = PetFile(
-                            pet_id=pet.id,  # Use the UUID object directly
-                            file_type='avatar',
-                            original_filename=f"{pet.name}_avatar.{image_format if 'image_format' in locals() else 'jpg'}",
-                            s3_path=avatar_url,
-                            content_type=f"image/{image_format if 'image_format' in locals() else 'jpeg'}"
-                        )
-                        db.add(pet_file)
-                        db.commit()
+                        # Savepoint, so a failure here doesn't undo the pet
+                        with db.begin_nested():
+                            pet_file = avatar_file_record(pet.id, avatar, pet.name)
+                            db.add(pet_file)
                     except Exception as file_error:
                         logger.error(f"Error creating pet file record: {file_error}")
                         # Continue anyway since the pet was created successfully
@@ -765,60 +1015,13 @@ def update_pet_profile():
                 avatar_data = data.get('avatar')
                 if avatar_data and isinstance(avatar_data, str) and avatar_data.startswith('data:'):
                     try:
-                        # Import necessary modules for image processing
-                        import base64
-                        import io
-                        from PIL import Image
-                        import os
-                        from storage import S3Storage
-                        
-                        # Extract image data from base64 string
-                        image_format = avatar_data.split(';')[0].split('/')[1]
-                        base64_data = avatar_data.split(',')[1]
-                        
-                        # Decode base64 data
-                        image_data = base64.b64decode(base64_data)
-                        
-                        # Create a temporary file
-                        temp_filename = f"temp_avatar_{uuid.uuid4()}.{image_format}"
-                        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-                        
-                        # Save image to temp file
-                        with open(temp_path, 'wb') as f:
-                            f.write(image_data)
-                        
-                        # Initialize S3 storage
-                        s3_storage = S3Storage()
-                        
-                        # Upload to S3
-                        s3_result = s3_storage.upload_file(
-                            temp_path,
-                            user_id,
-                            pet_id,
-                            'avatar',
-                            f"{pet.name or 'pet'}_avatar.{image_format}"
-                        )
-                        
-                        # Get S3 URL
-                        avatar_url = s3_result
-                        
-                        # Remove temp file
-                        os.remove(temp_path)
+                        avatar = store_avatar(avatar_data, user_id, pet_id, pet.name)
                         
-                        # Update pet's avatar URL
-                        pet.avatar_url = avatar_url
-                        
-                        # Create pet file record
-                        pet_file = PetFile(
-                            pet_id=pet_id_uuid,
-                            file_type='avatar',
-                            original_filename=f"{pet.name or species}_avatar.{image_format}",
-                            s3_path=avatar_url,
-                            content_type=f"image/{image_format}"
-                        )
+                        # Update pet's avatar, releasing the renditions it replaces
+                        replace_avatar(db, pet, avatar)
                         
                         # Add file record to be committed with other changes
-                        db.add(pet_file)
+                        db.add(avatar_file_record(pet_id_uuid, avatar, pet.name or pet.species))
                     except Exception as avatar_error:
                         logger.error(f"Error processing avatar image: {avatar_error}")
                         # Continue with other updates even if avatar processing fails
@@ -829,7 +1032,7 @@ def update_pet_profile():
                 # Set this pet to active
                 pet.is_active = True
                 
-                db.commit()
+                commit_db_session(db)
             
             # Update session with active pet ID
             session['active_pet_id'] = pet_id
@@ -857,6 +1060,7 @@ def update_pet_profile():
 
 @app.route('/get_pets', methods=['GET'])
 @requires_auth_api
+@read_only
 def get_pets():
     try:
         user_id = session.get('db_user_id')
@@ -890,16 +1094,31 @@ def get_pets():
         
 @app.route('/get_pet_files/<pet_id>', methods=['GET'])
 @requires_auth_api
+@read_only
 def get_pet_files(pet_id):
+    """
+    One page of a pet's files, newest first
+
+    Query args: type (optional file type), limit, and cursor (next_cursor
+    from the previous page). analysis_json isn't loaded; fetch it per file
+    from /pet_files/<file_id>/analysis.
+    """
     try:
         user_id = session.get('db_user_id')
         if not user_id:
             return jsonify({'success': False, 'error': 'User not found'}), 401
             
         file_type = request.args.get('type', None)  # Optional file type filter
+        try:
+            limit = int(request.args.get('limit', default_config.pet_files_page_size))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+        limit = max(1, min(limit, default_config.pet_files_max_page_size))
             
         from models import Pet, PetFile
         from database import get_db_session, close_db_session
+        from sqlalchemy import tuple_
+        from sqlalchemy.orm import defer
         import uuid
         
         # Convert string IDs to UUIDs for database operations
@@ -908,6 +1127,10 @@ def get_pet_files(pet_id):
             pet_id_uuid = uuid.UUID(pet_id)
         except ValueError:
             return jsonify({'success': False, 'error': 'Invalid ID format'}), 400
+        try:
+            cursor = decode_file_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         db = get_db_session()
         try:
@@ -917,23 +1140,33 @@ def get_pet_files(pet_id):
             if not pet:
                 return jsonify({'success': False, 'error': 'Pet not found or not authorized'}), 404
                 
-            # Query files for the pet
-            query = db.query(PetFile).filter(PetFile.pet_id == pet_id_uuid)
+            # Query files for the pet, without the (possibly large) analysis
+            query = db.query(PetFile, PetFile.has_analysis).options(
+                defer(PetFile.analysis_json)
+            ).filter(PetFile.pet_id == pet_id_uuid)
             
             # Apply file type filter if provided
             if file_type:
                 query = query.filter(PetFile.file_type == file_type)
+
+            # Keyset pagination: continue after the last file of the previous page
+            if cursor:
+                query = query.filter(tuple_(PetFile.created_at, PetFile.id) < cursor)
                 
-            # Sort by creation date, newest first
-            query = query.order_by(PetFile.created_at.desc())
+            # Newest first; id breaks ties so pages never skip or repeat files
+            query = query.order_by(PetFile.created_at.desc(), PetFile.id.desc())
             
-            # Execute query and convert to dictionaries
-            files = [pet_file.to_dict() for pet_file in query.all()]
+            # One extra row tells us whether there is another page
+            rows = query.limit(limit + 1).all()
+            page = rows[:limit]
+            files = [pet_file.to_dict(has_analysis=has_analysis) for pet_file, has_analysis in page]
+            next_cursor = encode_file_cursor(page[-1][0]) if len(rows) > limit else None
             
             return jsonify({
                 'success': True,
                 'files': files,
-                'count': len(files)
+                'count': len(files),
+                'next_cursor': next_cursor
             })
         except Exception as e:
             logger.error(f"Database error fetching pet files: {e}")
@@ -944,6 +1177,98 @@ def get_pet_files(pet_id):
         logger.error(f"Error fetching pet files: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
         
+@app.route('/pet_files/<file_id>/analysis', methods=['GET'])
+@requires_auth_api
+@read_only
+def get_pet_file_analysis(file_id):
+    """The stored analysis of one pet file"""
+    try:
+        user_id = session.get('db_user_id')
+        if not user_id:
+            return jsonify({'success': False, 'error': 'User not found'}), 401
+
+        from models import Pet, PetFile
+        from database import get_db_session, close_db_session
+
+        try:
+            user_id_uuid = uuid.UUID(user_id)
+            file_id_uuid = uuid.UUID(file_id)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid ID format'}), 400
+
+        db = get_db_session()
+        try:
+            row = db.query(PetFile.analysis_json).join(Pet).filter(
+                PetFile.id == file_id_uuid,
+                Pet.user_id == user_id_uuid
+            ).first()
+
+            if not row:
+                return jsonify({'success': False, 'error': 'File not found or not authorized'}), 404
+
+            return jsonify({
+                'success': True,
+                'file_id': file_id,
+                'analysis': row.analysis_json
+            })
+        except Exception as e:
+            logger.error(f"Database error fetching file analysis: {e}")
+            return jsonify({'success': False, 'error': 'Database error'}), 500
+        finally:
+            close_db_session(db)
+    except Exception as e:
+        logger.error(f"Error fetching file analysis: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/pet_files/<file_id>', methods=['DELETE'])
+@requires_auth_api
+def delete_pet_file(file_id):
+    """Delete a pet file record; the stored object goes too once nothing else references it"""
+    try:
+        user_id = session.get('db_user_id')
+        if not user_id:
+            return jsonify({'success': False, 'error': 'User not found'}), 401
+            
+        from models import Pet, PetFile
+        from database import get_db_session, close_db_session
+        from storage import get_storage
+        
+        try:
+            user_id_uuid = uuid.UUID(user_id)
+            file_id_uuid = uuid.UUID(file_id)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid ID format'}), 400
+        
+        db = get_db_session()
+        try:
+            pet_file = db.query(PetFile).join(Pet).filter(
+                PetFile.id == file_id_uuid,
+                Pet.user_id == user_id_uuid
+            ).first()
+            
+            if not pet_file:
+                return jsonify({'success': False, 'error': 'File not found or not authorized'}), 404
+                
+            s3_path = pet_file.s3_path
+            db.delete(pet_file)
+            commit_db_session(db)
+
+            # Only once the deletion is committed, so the record no longer counts
+            # as a reference (fallback images under /static/img/ are never deleted)
+            if s3_path and not s3_path.startswith('/static/img/'):
+                on_commit(db, lambda: get_storage().delete_file(s3_path))
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Database error deleting pet file: {e}")
+            return jsonify({'success': False, 'error': 'Database error'}), 500
+        finally:
+            close_db_session(db)
+            
+        return jsonify({'success': True})
+    except Exception as e:
+        logger.error(f"Error deleting pet file: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+        
 @app.route('/set_active_pet/<pet_id>', methods=['POST'])
 @requires_auth_api
 def set_active_pet(pet_id):
@@ -976,7 +1301,7 @@ def set_active_pet(pet_id):
             
             # Set this pet to active
             pet.is_active = True
-            db.commit()
+            commit_db_session(db)
             
             # Update session (store as string)
             session['active_pet_id'] = str(pet_id_uuid)
@@ -1011,13 +1336,8 @@ def generate_pet_avatar():
         
         # Import necessary modules
         import uuid
-        import base64
-        import io
-        from PIL import Image
-        import os
-        from models import PetFile, Pet
+        from models import Pet
         from database import get_db_session, close_db_session
-        from storage import S3Storage
         
         # Convert user_id to UUID
         try:
@@ -1049,62 +1369,23 @@ def generate_pet_avatar():
         
         # Process base64 image data
         try:
-            # Extract image data from base64 string
             # Format is typically: data:image/jpeg;base64,/9j/4AAQ...
-            image_format = avatar_data.split(';')[0].split('/')[1]
-            base64_data = avatar_data.split(',')[1]
-            
-            # Decode base64 data
-            image_data = base64.b64decode(base64_data)
-            
-            # Create a temporary file
-            temp_filename = f"temp_avatar_{uuid.uuid4()}.{image_format}"
-            temp_path = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-            
-            # Save image to temp file
-            with open(temp_path, 'wb') as f:
-                f.write(image_data)
-            
-            # Initialize S3 storage
-            s3_storage = S3Storage()
-            
-            # Upload to S3
-            s3_result = s3_storage.upload_file(
-                temp_path,
-                user_id,
-                pet_id if pet_id else 'temp',
-                'avatar',
-                f"{pet_name or 'pet'}_avatar.{image_format}"
-            )
-            
-            # Get S3 URL
-            avatar_url = s3_result
-            
-            # Remove temp file
-            os.remove(temp_path)
+            avatar = store_avatar(avatar_data, user_id, pet_id if pet_id else 'temp', pet_name)
+            avatar_url = avatar.url
             
             # Update database if pet_id is provided
             if pet_id_uuid:
                 db = get_db_session()
                 try:
-                    # Create pet file record
-                    pet_file = PetFile(
-                        pet_id=pet_id_uuid,
-                        file_type='avatar',
-                        original_filename=f"{pet_name or species}_avatar.{image_format}",
-                        s3_path=avatar_url,
-                        content_type=f"image/{image_format}"
-                    )
-                    
                     # Add file record
-                    db.add(pet_file)
+                    db.add(avatar_file_record(pet_id_uuid, avatar, pet_name or species))
                     
                     # Update pet's avatar URL
                     pet = db.query(Pet).filter(Pet.id == pet_id_uuid).first()
                     if pet:
-                        pet.avatar_url = avatar_url
+                        replace_avatar(db, pet, avatar)
                         
-                    db.commit()
+                    commit_db_session(db)
                 except Exception as db_error:
                     db.rollback()
                     logger.error(f"Database error saving avatar: {db_error}")
@@ -1114,7 +1395,8 @@ def generate_pet_avatar():
             
             return jsonify({
                 'success': True,
-                'avatar_url': avatar_url
+                'avatar_url': avatar_url,
+                'renditions': avatar.renditions
             })
             
         except Exception as e:
@@ -1219,6 +1501,147 @@ def export_pdf():
         print(f"PDF generation error: {str(e)}")
         return jsonify({'error': 'Failed to generate PDF'}), 500
 
+CHAT_ASSISTANT_ID = "asst_bYxIi1SefCRrdHSHfByUtNjd"
+CHAT_PROMPT_TEMPLATE_ID = '3c135563-13cd-452b-85a7-678209c961cb'  # Health Chat Default
+
+def create_chat_session(user_id):
+    """Insert a chat_sessions row and return its id (None if the database is unavailable)"""
+    try:
+        with db_connection() as conn:
+            if conn:
+                cur = conn.cursor()
+                session_id = str(uuid.uuid4())
+                cur.execute("""
+                    INSERT INTO chat_sessions 
+                    (id, user_id, created_at, prompt_template_id, provider) 
+                    VALUES (%s, %s, %s, %s, NULL)
+                """, (session_id, user_id, datetime.now(), CHAT_PROMPT_TEMPLATE_ID))
+                conn.commit()
+                cur.close()
+                return session_id
+    except Exception as db_error:
+        logger.error(f"Database error creating chat session: {str(db_error)}")
+    return None
+
+def save_chat_exchange(chat_session_id, user_message, response):
+    """Store a chat question and the assistant's answer in chat_messages"""
+    if not chat_session_id:
+        return
+    try:
+        with db_connection() as conn:
+            if conn:
+                cur = conn.cursor()
+                for role, content in (('user', user_message), ('assistant', response)):
+                    cur.execute("""
+                        INSERT INTO chat_messages 
+                        (id, session_id, role, content, timestamp)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (str(uuid.uuid4()), chat_session_id, role, content, datetime.now()))
+                conn.commit()
+                cur.close()
+    except Exception as db_error:
+        logger.error(f"Database error: {str(db_error)}")
+        # Continue even if database save fails
+
+def start_chat_thread(user_id):
+    """Create a new OpenAI thread and chat session, remembering them for the user"""
+    from models import ChatThread
+    from database import get_db_session, close_db_session
+
+    thread = client.beta.threads.create()
+    chat_session_id = create_chat_session(user_id or str(uuid.uuid4()))
+
+    if user_id:
+        db = get_db_session()
+        try:
+            chat_thread = db.query(ChatThread).filter(ChatThread.user_id == user_id).first()
+            if not chat_thread:
+                chat_thread = ChatThread(user_id=user_id)
+                db.add(chat_thread)
+            chat_thread.thread_id = thread.id
+            chat_thread.chat_session_id = chat_session_id
+            chat_thread.last_used_at = datetime.utcnow()
+            commit_db_session(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error saving chat thread: {e}")
+        finally:
+            close_db_session(db)
+
+    return thread.id, chat_session_id
+
+def get_chat_thread(user_id):
+    """
+    Return (thread_id, chat_session_id) for the user's conversation
+
+    The stored thread is reused until it has been idle for
+    chat_thread_idle_minutes; anonymous users always get a new thread.
+    """
+    from models import ChatThread
+    from database import get_db_session, close_db_session
+
+    if user_id:
+        db = get_db_session()
+        try:
+            idle_cutoff = datetime.utcnow() - timedelta(minutes=default_config.chat_thread_idle_minutes)
+            chat_thread = db.query(ChatThread).filter(
+                ChatThread.user_id == user_id,
+                ChatThread.last_used_at >= idle_cutoff
+            ).first()
+            if chat_thread:
+                chat_thread.last_used_at = datetime.utcnow()
+                commit_db_session(db)
+                return chat_thread.thread_id, str(chat_thread.chat_session_id) if chat_thread.chat_session_id else None
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error loading chat thread: {e}")
+        finally:
+            close_db_session(db)
+
+    return start_chat_thread(user_id)
+
+def add_chat_message(user_id, user_message):
+    """Add the user's message to their conversation thread, starting a new one if needed"""
+    thread_id, chat_session_id = get_chat_thread(user_id)
+    try:
+        client.beta.threads.messages.create(thread_id=thread_id, role="user", content=user_message)
+    except Exception as e:
+        # The thread may have expired on OpenAI's side or still have an active run
+        logger.warning(f"Could not reuse chat thread {thread_id}: {e}")
+        thread_id, chat_session_id = start_chat_thread(user_id)
+        client.beta.threads.messages.create(thread_id=thread_id, role="user", content=user_message)
+    return thread_id, chat_session_id
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_chat_reply(thread_id, chat_session_id, user_message):
+    """Relay assistant tokens as SSE 'delta' events, then persist the full reply"""
+    chunks = []
+    try:
+        stream = client.beta.threads.runs.create(
+            thread_id=thread_id,
+            assistant_id=CHAT_ASSISTANT_ID,
+            stream=True
+        )
+        for event in stream:
+            if event.event == 'thread.message.delta':
+                for part in event.data.delta.content or []:
+                    if part.type == 'text' and part.text and part.text.value:
+                        chunks.append(part.text.value)
+                        yield sse_event('delta', {'text': part.text.value})
+            elif event.event in ('thread.run.failed', 'thread.run.cancelled', 'thread.run.expired'):
+                raise Exception(f"Chat response {event.event.rsplit('.', 1)[-1]}")
+    except Exception as e:
+        logger.error(f"Chat stream error: {str(e)}")
+        yield sse_event('error', {'error': str(e)})
+        return
+
+    response = "".join(chunks)
+    save_chat_exchange(chat_session_id, user_message, response)
+    yield sse_event('done', {'response': response})
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -1228,89 +1651,30 @@ def chat():
         if not user_message:
             return jsonify({'success': False, 'error': 'No message provided'}), 400
 
-        # Get the default health chat prompt template ID
-        default_prompt_id = '3c135563-13cd-452b-85a7-678209c961cb'  # Health Chat Default
+        # Continue the user's conversation thread (or start one)
+        thread_id, chat_session_id = add_chat_message(session.get('db_user_id'), user_message)
 
-        # Create a thread for the chat
-        thread = client.beta.threads.create()
-        
-        # Add the user's message
-        message = client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=user_message
-        )
+        if data.get('stream'):
+            return Response(
+                stream_with_context(stream_chat_reply(thread_id, chat_session_id, user_message)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
 
         # Run the assistant
         run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id="asst_bYxIi1SefCRrdHSHfByUtNjd"
+            thread_id=thread_id,
+            assistant_id=CHAT_ASSISTANT_ID
         )
 
         # Wait for completion
-        while True:
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-            if run.status == 'completed':
-                break
-            elif run.status == 'failed':
-                raise Exception("Chat response failed")
+        wait_for_run(client, thread_id, run.id)
 
-        # Get the assistant's response
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
+        # Get the assistant's response (newest message first)
+        messages = client.beta.threads.messages.list(thread_id=thread_id, limit=1)
         response = messages.data[0].content[0].text.value
 
-        try:
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                
-                session_id = str(uuid.uuid4())
-                default_user_id = str(uuid.uuid4())
-                
-                cur.execute("""
-                    INSERT INTO chat_sessions 
-                    (id, user_id, created_at, prompt_template_id, provider) 
-                    VALUES (%s, %s, %s, %s, NULL)
-                    RETURNING id
-                """, (session_id, default_user_id, datetime.now(), default_prompt_id))
-                
-                conn.commit()
-                
-                # Store the messages
-                cur.execute("""
-                    INSERT INTO chat_messages 
-                    (id, session_id, role, content, timestamp)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    str(uuid.uuid4()),
-                    session_id,
-                    'user',
-                    user_message,
-                    datetime.now()
-                ))
-
-                cur.execute("""
-                    INSERT INTO chat_messages 
-                    (id, session_id, role, content, timestamp)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (
-                    str(uuid.uuid4()),
-                    session_id,
-                    'assistant',
-                    response,
-                    datetime.now()
-                ))
-
-                conn.commit()
-                cur.close()
-                conn.close()
-                
-        except Exception as db_error:
-            logger.error(f"Database error: {str(db_error)}")
-            # Continue even if database save fails
+        save_chat_exchange(chat_session_id, user_message, response)
 
         return jsonify({
             "success": True,
@@ -1370,33 +1734,32 @@ def search_providers():
         search_term = request.args.get('term', '').strip()
         state = request.args.get('state', '').strip()
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
         
-        cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Base query with column alias
-        query = "SELECT provider as name, location, url FROM providers WHERE 1=1"
-        params = []
+            # Base query with column alias
+            query = "SELECT provider as name, location, url FROM providers WHERE 1=1"
+            params = []
         
-        # Add search term condition if provided
-        if search_term:
-            query += " AND provider ILIKE %s"
-            params.append(f'%{search_term}%')
+            # Add search term condition if provided
+            if search_term:
+                query += " AND provider ILIKE %s"
+                params.append(f'%{search_term}%')
         
-        # Add state condition if provided
-        if state:
-            query += " AND location ILIKE %s"
-            params.append(f'%{state}%')
+            # Add state condition if provided
+            if state:
+                query += " AND location ILIKE %s"
+                params.append(f'%{state}%')
         
-        cur.execute(query, params)
-        providers = cur.fetchall()
+            cur.execute(query, params)
+            providers = cur.fetchall()
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return jsonify({'providers': providers})
+            return jsonify({'providers': providers})
         
     except Exception as e:
         print(f"Error searching providers: {e}")
@@ -1407,22 +1770,21 @@ def get_provider_url():
     try:
         provider_name = request.args.get('provider')
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        # Update query to use provider column
-        cur.execute("SELECT url FROM providers WHERE provider = %s", (provider_name,))
-        result = cur.fetchone()
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            # Update query to use provider column
+            cur.execute("SELECT url FROM providers WHERE provider = %s", (provider_name,))
+            result = cur.fetchone()
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        if result:
-            return jsonify({'url': result['url']})
-        else:
-            return jsonify({'error': 'Provider not found'}), 404
+            if result:
+                return jsonify({'url': result['url']})
+            else:
+                return jsonify({'error': 'Provider not found'}), 404
             
     except Exception as e:
         print(f"Error getting provider URL: {e}")
@@ -1450,20 +1812,21 @@ def analyze_poop():
         # Import necessary modules
         from models import PetFile
         from database import get_db_session, close_db_session
-        from storage import S3Storage
+        from storage import get_storage
 
-        # Initialize S3 storage client
-        s3_storage = S3Storage()
+        # Shared S3 storage client
+        storage = get_storage()
 
         # Secure filename
         filename = secure_filename(image.filename)
         
-        # Save the image temporarily for analysis
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # Save the image to this request's spool directory for analysis
+        spool_dir = request_spool_dir()
+        temp_path = os.path.join(spool_dir, filename)
         image.save(temp_path)
         
         # Get file size and content type
-        file_size = os.path.getsize(temp_path)
+        file_size = spool.record(temp_path)
         content_type = image.content_type if hasattr(image, 'content_type') else 'image/jpeg'
         
         # Upload to S3
@@ -1471,7 +1834,7 @@ def analyze_poop():
         # Rewind file for S3 upload
         image.seek(0)
         
-        s3_result = s3_storage.upload_file_object(
+        s3_result = storage.upload_file_object(
             image,
             user_id,
             active_pet_id,
@@ -1490,52 +1853,32 @@ def analyze_poop():
                 file_type='poop',
                 original_filename=filename,
                 s3_path=s3_result,  # S3 URL
-                local_path=temp_path,
                 content_type=content_type,
                 file_size=file_size
             )
             
             db.add(pet_file)
-            db.commit()
+            commit_db_session(db)
             pet_file_id = pet_file.id
             logger.info(f"Created database record for poop image: {filename}")
             
-            # Create a new event loop for running the async analysis
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
+            # Analyze in the background; the client polls /jobs/<job_id> for the result
+            job_id = job_queue.enqueue(
+                'poop',
+                user_id,
+                active_pet_id,
+                {'file_path': temp_path, 'spool_dir': spool_dir},
+                file_ids=[pet_file_id]
+            )
+            # The job deletes the image once it has analysed it
+            on_commit(db, lambda: hand_off_spool_dir(spool_dir))
             
-            try:
-                # Run the async function using run_until_complete
-                analysis = new_loop.run_until_complete(analyze_poop_image(temp_path))
-                
-                # Update database record with analysis results
-                pet_file = db.query(PetFile).filter(PetFile.id == pet_file_id).first()
-                if pet_file:
-                    pet_file.analysis_json = analysis
-                    db.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'result': {
-                        'summary': analysis.get('summary', ''),
-                        'concerns': analysis.get('concerns', ''),
-                        'recommendations': analysis.get('recommendations', '')
-                    },
-                    'file_id': str(pet_file_id)  # Convert UUID to string for JSON
-                })
-            except Exception as analysis_error:
-                logger.error(f"Analysis error: {str(analysis_error)}")
-                # If analysis fails, still return success for the upload
-                return jsonify({
-                    'success': True,
-                    'message': 'Image uploaded successfully but analysis failed',
-                    'error': str(analysis_error)
-                })
-            finally:
-                # Close the event loop
-                new_loop.close()
-                # We keep the file on the server for future reference
-                # For production, you might want to implement a cleanup job
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'file_id': str(pet_file_id)  # Convert UUID to string for JSON
+            }), 202
                 
         except Exception as db_error:
             if db:
@@ -1546,168 +1889,43 @@ def analyze_poop():
             if db:
                 close_db_session(db)
 
+    except SpoolFullError as e:
+        logger.warning(f"Poop upload refused: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 503
     except Exception as e:
         logger.error(f"Error analyzing poop image: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+@requires_auth_api
+@read_only
+def get_job_status(job_id):
+    """Return the status of a background analysis job, and its result once done"""
+    try:
+        try:
+            job_id_uuid = uuid.UUID(job_id)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Invalid job ID format'}), 400
+
+        job = job_queue.get(job_id_uuid)
+        if not job or job['user_id'] != session.get('db_user_id'):
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'result': job['result'],
+            'error': job['error'],
+            'file_ids': job['file_ids']
+        })
+    except Exception as e:
+        logger.error(f"Error fetching job status: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/breeds/<pet_type>')
 def get_breeds(pet_type):
-    # Comprehensive breed lists organized alphabetically
-    breeds = {
-        'dog': sorted([
-            'Affenpinscher', 'Afghan Hound', 'Airedale Terrier', 'Akita', 'Alaskan Malamute',
-            'American Bulldog', 'American Bully', 'American Eskimo Dog', 'American Pit Bull Terrier', 'American Staffordshire Terrier',
-            'Australian Cattle Dog', 'Australian Shepherd', 'Australian Terrier',
-            'Mixed Breed',
-            'Basenji', 'Basset Hound', 'Beagle', 'Bearded Collie', 'Belgian Malinois',
-            'Bernese Mountain Dog', 'Bichon Frise', 'Bloodhound', 'Border Collie', 'Border Terrier',
-            'Boston Terrier', 'Boxer', 'Boykin Spaniel', 'Brittany', 'Brussels Griffon', 'Bull Terrier',
-            'Bulldog', 'Bullmastiff',
-            'Cairn Terrier', 'Cane Corso', 'Cavalier King Charles Spaniel', 'Chesapeake Bay Retriever',
-            'Chihuahua', 'Chinese Crested', 'Chinese Shar-Pei', 'Chow Chow', 'Cocker Spaniel', 'Collie',
-            'Corgi (Cardigan)', 'Corgi (Pembroke)', 'Dachshund', 'Dalmatian', 'Doberman Pinscher',
-            'English Bulldog', 'English Setter', 'English Springer Spaniel',
-            'French Bulldog',
-            'German Shepherd', 'German Shorthaired Pointer', 'Giant Schnauzer', 'Golden Retriever',
-            'Gordon Setter', 'Great Dane', 'Great Pyrenees', 'Greater Swiss Mountain Dog', 'Greyhound',
-            'Havanese', 'Irish Setter', 'Irish Wolfhound', 'Italian Greyhound',
-            'Jack Russell Terrier', 'Japanese Chin', 'Japanese Spitz',
-            'Keeshond', 'Kerry Blue Terrier', 'Komondor', 'Kuvasz',
-            'Labrador Retriever', 'Leonberger', 'Lhasa Apso',
-            'Maltese', 'Mastiff', 'Miniature Pinscher', 'Miniature Schnauzer',
-            'Newfoundland', 'Norfolk Terrier', 'Norwegian Elkhound', 'Norwich Terrier',
-            'Old English Sheepdog', 'Papillon', 'Pekingese', 'Pharaoh Hound',
-            'Pointer', 'Pomeranian', 'Poodle (Standard)', 'Poodle (Miniature)', 'Poodle (Toy)',
-            'Portuguese Water Dog', 'Pug',
-            'Rat Terrier', 'Rhodesian Ridgeback', 'Rottweiler',
-            'Saint Bernard', 'Saluki', 'Samoyed', 'Schipperke', 'Scottish Terrier',
-            'Shetland Sheepdog', 'Shiba Inu', 'Shih Tzu', 'Siberian Husky',
-            'Silky Terrier', 'Smooth Fox Terrier', 'Soft Coated Wheaten Terrier',
-            'Staffordshire Bull Terrier',
-            'Standard Schnauzer',
-            'Tibetan Mastiff', 'Tibetan Spaniel', 'Tibetan Terrier',
-            'Toy Fox Terrier',
-            'Vizsla',
-            'Weimaraner', 'Welsh Springer Spaniel', 'West Highland White Terrier',
-            'Whippet',
-            'Wire Fox Terrier',
-            'Yorkshire Terrier'
-        ]),
-        'cat': sorted([
-            'Abyssinian', 'American Bobtail', 'American Curl', 'American Shorthair', 'American Wirehair',
-            'Balinese', 'Bengal', 'Birman', 'Bombay', 'British Longhair', 'British Shorthair', 'Burmese',
-            'Chartreux', 'Chausie', 'Cornish Rex', 'Cyprus',
-            'Devon Rex', 'Egyptian Mau', 'European Shorthair', 'Exotic Shorthair',
-            'Havana Brown', 'Himalayan',
-            'Japanese Bobtail',
-            'Korat',
-            'LaPerm', 'Maine Coon', 'Manx', 'Munchkin',
-            'Norwegian Forest Cat',
-            'Ocicat', 'Oriental Longhair', 'Oriental Shorthair',
-            'Persian',
-            'Ragamuffin', 'Ragdoll', 'Russian Blue',
-            'Savannah', 'Scottish Fold', 'Selkirk Rex', 'Siamese', 'Siberian', 'Singapura',
-            'Snowshoe', 'Somali', 'Sphynx',
-            'Thai', 'Tonkinese', 'Turkish Angora', 'Turkish Van'
-        ]),
-        'bird': sorted([
-            'African Grey Parrot', 'Amazon Parrot', 'Australian King Parrot',
-            'Budgerigar (Budgie)',
-            'Caique', 'Canary', 'Cockatiel', 'Cockatoo (Umbrella)', 'Cockatoo (Sulfur-crested)',
-            'Conure (Green Cheek)', 'Conure (Sun)', 'Conure (Blue-crowned)',
-            'Diamond Dove',
-            'Eclectus Parrot',
-            'Finch (Zebra)', 'Finch (Society)', 'Finch (Gouldian)',
-            'Indian Ringneck Parakeet',
-            'Lovebird (Peach-faced)', 'Lovebird (Fischer\'s)', 'Lovebird (Masked)',
-            'Macaw (Blue and Gold)', 'Macaw (Scarlet)', 'Macaw (Green-winged)', 'Macaw (Hyacinth)',
-            'Meyer\'s Parrot',
-            'Pacific Parrotlet',
-            'Pionus Parrot',
-            'Quaker Parrot',
-            'Rainbow Lorikeet', 'Red-factor Canary',
-            'Senegal Parrot',
-            'White-capped Pionus',
-            'Yellow-naped Amazon'
-        ]),
-        'reptile': sorted([
-            'African Fat-tailed Gecko', 'African Spurred Tortoise',
-            'Ball Python', 'Bearded Dragon', 'Blue-tongued Skink', 'Boa Constrictor',
-            'California Kingsnake', 'Carpet Python', 'Chameleon (Veiled)', 'Chameleon (Panther)',
-            'Corn Snake', 'Crested Gecko',
-            'Eastern Box Turtle', 'Emerald Tree Boa',
-            'Fire Skink',
-            'Garter Snake', 'Gecko (Mediterranean)', 'Green Anole', 'Green Iguana',
-            'Hermann\'s Tortoise',
-            'Jackson\'s Chameleon',
-            'Kenyan Sand Boa', 'King Snake',
-            'Leopard Gecko', 'Leopard Tortoise',
-            'Mali Uromastyx',
-            'Painted Turtle',
-            'Red-eared Slider', 'Red-footed Tortoise', 'Rosy Boa', 'Russian Tortoise',
-            'Savannah Monitor',
-            'Tegu (Argentine Black and White)', 'Tokay Gecko',
-            'Water Dragon', 'Western Hognose Snake'
-        ]),
-        'fish': sorted([
-            'Angelfish', 'Arowana',
-            'Barb (Tiger)', 'Betta', 'Black Moor Goldfish', 'Black Skirt Tetra', 'Blue Gourami',
-            'Cardinal Tetra', 'Clownfish', 'Corydoras Catfish',
-            'Danio (Zebra)', 'Discus', 'Dwarf Gourami',
-            'Fancy Guppy', 'Firemouth Cichlid',
-            'German Blue Ram', 'Goldfish',
-            'Harlequin Rasbora',
-            'Jack Dempsey Cichlid',
-            'Killifish', 'Koi',
-            'Lionfish',
-            'Molly (Black)', 'Molly (Sailfin)',
-            'Neon Tetra',
-            'Oscar',
-            'Platy', 'Plecostomus',
-            'Rainbow Shark', 'Rainbowfish',
-            'Siamese Algae Eater', 'Silver Dollar', 'Swordtail',
-            'Tiger Barb',
-            'White Cloud Mountain Minnow'
-        ]),
-        'rabbit': sorted([
-            'American Fuzzy Lop', 'American Sable',
-            'Belgian Hare', 'Beveren',
-            'Californian',
-            'Dutch',
-            'English Angora', 'English Lop', 'English Spot',
-            'Flemish Giant', 'Florida White', 'French Angora', 'French Lop',
-            'Giant Angora', 'Giant Chinchilla',
-            'Harlequin', 'Havana', 'Holland Lop', 'Hotot',
-            'Jersey Wooly',
-            'Lilac',
-            'Mini Lop', 'Mini Rex', 'Mini Satin',
-            'Netherland Dwarf', 'New Zealand',
-            'Polish',
-            'Rex',
-            'Satin', 'Silver Fox', 'Silver Marten',
-            'Standard Chinchilla',
-            'Tan', 'Thrianta'
-        ]),
-        'ferret': sorted([
-            'Albino', 'Black', 'Black Sable', 'Champagne',
-            'Chocolate', 'Cinnamon', 'Dark-Eyed White',
-            'Panda', 'Point', 'Sable',
-            'Silver', 'Standard (Sable)', 'White'
-        ]),
-        'farm animal': sorted([
-            'Alpaca',
-            'Chicken (Ameraucana)', 'Chicken (Australorp)', 'Chicken (Brahma)', 'Chicken (Leghorn)', 'Chicken (Orpington)', 'Chicken (Plymouth Rock)', 'Chicken (Rhode Island Red)', 'Chicken (Silkie)', 'Chicken (Sussex)', 'Chicken (Wyandotte)',
-            'Cow (Angus)', 'Cow (Holstein)', 'Cow (Jersey)',
-            'Donkey',
-            'Duck (Pekin)', 'Duck (Rouen)', 'Duck (Runner)',
-            'Goat (Alpine)', 'Goat (Boer)', 'Goat (LaMancha)', 'Goat (Nigerian Dwarf)', 'Goat (Nubian)',
-            'Horse (American Quarter)', 'Horse (Arabian)', 'Horse (Morgan)', 'Horse (Paint)', 'Horse (Thoroughbred)',
-            'Llama',
-            'Pig (Berkshire)', 'Pig (Duroc)', 'Pig (Hampshire)', 'Pig (Potbelly)', 'Pig (Yorkshire)',
-            'Sheep (Dorper)', 'Sheep (Hampshire)', 'Sheep (Merino)', 'Sheep (Suffolk)'
-        ])
-    }
-    return jsonify(breeds.get(pet_type, []))
+    return jsonify(breeds_for(pet_type))
 
 @app.route('/get_training_tips', methods=['POST'])
 def get_training_tips():
@@ -1719,79 +1937,8 @@ def get_training_tips():
         if not species or not breed:
             return jsonify({'success': False, 'error': 'Species and breed are required'}), 400
 
-        # Create a more specific prompt
-        prompt = f"""As a veterinary expert, please provide detailed training and care tips for a {breed} {species}. 
-        If you're not familiar with this specific breed, provide general tips for {species} while incorporating any known traits of similar breeds.
-
-        Please format your response with these sections:
-
-        Training Tips:
-        • Basic Training: Focus on essential commands and techniques specific to {breed}s
-        • Behavioral Tips: Common {breed} traits and how to manage them
-        • Training Methods: Most effective approaches for this breed
-
-        Exercise & Play:
-        • Exercise Needs: Daily requirements based on {breed} energy levels
-        • Play Activities: Best games and toys for this breed
-        • Exercise Tips: Special considerations for {breed}s
-
-        Enrichment Activities:
-        • Mental Stimulation: Puzzle and learning activities suited for {breed}s
-        • Environmental Enrichment: Creating an engaging space
-        • Social Enrichment: Interaction needs and socialization tips
-
-        Please be specific to the breed when possible, and provide general {species} advice when breed-specific information is limited."""
-
-        # Create thread and send to GPT
-        thread = client.beta.threads.create()
-        message = client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=prompt
-        )
-
-        # Run the assistant
-        run = client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id="asst_bYxIi1SefCRrdHSHfByUtNjd"
-        )
-
-        # Wait for completion
-        while True:
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-            if run.status == 'completed':
-                break
-            elif run.status == 'failed':
-                raise Exception("Failed to generate training tips")
-
-        # Get the response
-        messages = client.beta.threads.messages.list(thread_id=thread.id)
-        response = messages.data[0].content[0].text.value
-
-        # Parse sections
-        sections = response.split('\n\n')
-        result = {
-            'training': '',
-            'play': '',
-            'enrichment': ''
-        }
-
-        current_section = None
-        for section in sections:
-            if 'Training Tips:' in section:
-                current_section = 'training'
-                result['training'] = section
-            elif 'Exercise & Play:' in section:
-                current_section = 'play'
-                result['play'] = section
-            elif 'Enrichment Activities:' in section:
-                current_section = 'enrichment'
-                result['enrichment'] = section
-            elif current_section:
-                result[current_section] += '\n' + section
+        result, cached = training_tips_cache.get_or_generate(client, species, breed)
+        logger.info(f"Training tips for {breed} {species} ({'cache' if cached else 'generated'})")
 
         return jsonify({
             'success': True,
@@ -1805,6 +1952,33 @@ def get_training_tips():
             'error': str(e)
         }), 500
 
+@app.route('/admin/training_tips/invalidate', methods=['POST'])
+@requires_admin_api
+def invalidate_training_tips():
+    """Drop cached training tips (all, one species, or one breed). Admins only."""
+    try:
+        data = request.get_json(silent=True) or {}
+        deleted = training_tips_cache.invalidate(species=data.get('species'), breed=data.get('breed'))
+        return jsonify({'success': True, 'deleted': deleted})
+    except Exception as e:
+        logger.error(f"Training tips invalidation error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/admin/metrics', methods=['GET'])
+@requires_admin_api
+def get_metrics():
+    """Process-local performance counters for this instance. Admins only."""
+    from assistant_runs import run_stats
+    from heic import decode_stats
+    from database import raw_pool, pool_status
+    return jsonify({
+        'success': True,
+        'assistant_runs': run_stats.snapshot(),
+        'heic_decode': decode_stats.snapshot(),
+        'raw_db_pool': raw_pool.stats.snapshot(),
+        'db_pool': pool_status()
+    })
+
 # Add this helper function to extract zipcode
 def extract_zipcode(address):
     """Extract zipcode from address string. Returns None if no zipcode found."""
@@ -1835,48 +2009,47 @@ def report_rescue():
         
         # Store in database
         try:
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
+            with db_connection() as conn:
+                if conn:
+                    cur = conn.cursor()
                 
-                # Get species and breed directly from form data
-                species = data.get('species', '')  # Remove 'Unknown' fallback
-                breed = data.get('breed', '')      # Remove 'Unknown Breed' fallback
-                ticket_name = f"{species} - {breed}" if species and breed else "Unspecified Animal"
+                    # Get species and breed directly from form data
+                    species = data.get('species', '')  # Remove 'Unknown' fallback
+                    breed = data.get('breed', '')      # Remove 'Unknown Breed' fallback
+                    ticket_name = f"{species} - {breed}" if species and breed else "Unspecified Animal"
                 
-                logger.info(f"Creating ticket with species: {species}, breed: {breed}")
+                    logger.info(f"Creating ticket with species: {species}, breed: {breed}")
                 
-                cur.execute("""
-                    INSERT INTO rescue_tickets 
-                    (id, zipcode, description, ticket_name, contact_email, contact_name, 
-                     contact_phone, contact_address, date, species, breed)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    ticket_id,
-                    zipcode,
-                    data.get('description', ''),
-                    ticket_name,
-                    data.get('email', ''),
-                    data.get('name', ''),
-                    data.get('phone', ''),
-                    data.get('location', ''),
-                    current_date,
-                    species,    # Add species to database
-                    breed      # Add breed to database
-                ))
+                    cur.execute("""
+                        INSERT INTO rescue_tickets 
+                        (id, zipcode, description, ticket_name, contact_email, contact_name, 
+                         contact_phone, contact_address, date, species, breed)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (
+                        ticket_id,
+                        zipcode,
+                        data.get('description', ''),
+                        ticket_name,
+                        data.get('email', ''),
+                        data.get('name', ''),
+                        data.get('phone', ''),
+                        data.get('location', ''),
+                        current_date,
+                        species,    # Add species to database
+                        breed      # Add breed to database
+                    ))
                 
-                conn.commit()
-                cur.close()
-                conn.close()
+                    conn.commit()
+                    cur.close()
                 
-                logger.info(f"Rescue ticket {ticket_id} stored in database with species: {species}, breed: {breed}")
+                    logger.info(f"Rescue ticket {ticket_id} stored in database with species: {species}, breed: {breed}")
                 
-                # Return success immediately after database write
-                return jsonify({
-                    'success': True,
-                    'message': 'Your rescue report has been submitted successfully. Thank you for helping!',
-                    'ticket_id': ticket_id
-                })
+                    # Return success immediately after database write
+                    return jsonify({
+                        'success': True,
+                        'message': 'Your rescue report has been submitted successfully. Thank you for helping!',
+                        'ticket_id': ticket_id
+                    })
                 
         except Exception as db_error:
             logger.error(f"Database error: {str(db_error)}")
@@ -1906,27 +2079,26 @@ def search_rescues():
                 'error': 'Please provide a valid 5-digit zipcode'
             }), 400
         
-        conn = get_db_connection()
-        if conn:
-            cur = conn.cursor(cursor_factory=RealDictCursor)
+        with db_connection() as conn:
+            if conn:
+                cur = conn.cursor(cursor_factory=RealDictCursor)
             
-            cur.execute("""
-                SELECT id, species, breed, description, date, ticket_name, 
-                       contact_name, contact_phone, contact_email, contact_address, zipcode
-                FROM rescue_tickets 
-                WHERE zipcode = %s
-                ORDER BY date DESC
-            """, (zipcode,))
+                cur.execute("""
+                    SELECT id, species, breed, description, date, ticket_name, 
+                           contact_name, contact_phone, contact_email, contact_address, zipcode
+                    FROM rescue_tickets 
+                    WHERE zipcode = %s
+                    ORDER BY date DESC
+                """, (zipcode,))
             
-            rescues = cur.fetchall()
+                rescues = cur.fetchall()
             
-            cur.close()
-            conn.close()
+                cur.close()
             
-            return jsonify({
-                'success': True,
-                'rescues': rescues
-            })
+                return jsonify({
+                    'success': True,
+                    'rescues': rescues
+                })
             
     except Exception as e:
         logger.error(f"Error searching rescues: {str(e)}")
@@ -2135,39 +2307,17 @@ def update_user_profile():
                     avatar_data = data['avatar']
                     if avatar_data.startswith('data:'):
                         # Handle base64 image
-                        avatar_data = avatar_data.split(',')[1]
-                        avatar_bytes = base64.b64decode(avatar_data)
-                        
-                        # Create temporary file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-                            temp_file.write(avatar_bytes)
-                            temp_path = temp_file.name
-                        
-                        # Upload to S3
-                        s3 = S3Storage()
-                        avatar_url = s3.upload_file(
-                            temp_path,
-                            str(user.id),  # pet_id parameter
-                            'user',        # file_type parameter
-                            'avatar',      # file_category parameter
-                            'avatar.png'   # filename parameter
-                        )
-                        
-                        # Update user's avatar URL
-                        user.avatar_url = avatar_url
-                        
-                        # Clean up temp file
-                        os.unlink(temp_path)
+                        replace_avatar(db, user, store_avatar(avatar_data, str(user.id), 'user', 'user'))
                     else:
                         # It's already a URL, just update it
-                        user.avatar_url = avatar_data
+                        replace_avatar(db, user, avatar_data)
                 except Exception as e:
                     logger.error(f"Error processing avatar: {e}")
                     # Don't return error, just continue without updating avatar
                     pass
 
             # Commit changes
-            db.commit()
+            commit_db_session(db)
             
             # Update session data
             session['user_name'] = user.name
@@ -2284,7 +2434,7 @@ def get_matches():
                     ON CONFLICT DO NOTHING
                 """)
                 db.execute(insert_sql, {"u1": user_1_id, "u2": user_2_id})
-                db.commit()
+                commit_db_session(db)
             pets = [pet.to_dict() for pet in match.pets]
             matches.append({
                 'id': str(match.id),
@@ -2330,7 +2480,7 @@ def respond_to_match(match_id):
                 ON CONFLICT DO NOTHING
             """)
             db.execute(insert_sql, {"u1": user_1_id, "u2": user_2_id})
-            db.commit()
+            commit_db_session(db)
             result = db.execute(sql, {"u1": user_1_id, "u2": user_2_id}).mappings().fetchone()
         # Determine which column to update based on the current user (cast all to str)
         user_id_str = str(user_id)
@@ -2352,7 +2502,7 @@ def respond_to_match(match_id):
             UPDATE user_matches SET {match_col} = :val WHERE user_1 = :user1 AND user_2 = :user2
         """)
         db.execute(update_sql, {"val": response == 'accept', "user1": user_1_id, "user2": user_2_id})
-        db.commit()
+        commit_db_session(db)
         new_result = db.execute(sql, {"u1": user_1_id, "u2": user_2_id}).mappings().fetchone()
         matched = new_result['user_1_match'] and new_result['user_2_match']
         return jsonify({'success': True, 'matched': matched})
@@ -2364,6 +2514,7 @@ def respond_to_match(match_id):
 
 @app.route('/api/chats')
 @requires_auth_api
+@read_only
 def get_chats():
     try:
         user_id = session.get('db_user_id')
@@ -2428,11 +2579,12 @@ def get_chats():
 def send_message(user_id):
     try:
         from sqlalchemy import text
+        from database import get_db_session, close_db_session
         import uuid
         from datetime import datetime
         db = None
         try:
-            db = __import__('database').get_db_session()
+            db = get_db_session()
             sender_id = session.get('db_user_id')
             if not sender_id:
                 return jsonify({'error': 'User not found'}), 404
@@ -2452,7 +2604,7 @@ def send_message(user_id):
                 'msg': message,
                 'created_at': datetime.utcnow()
             })
-            db.commit()
+            commit_db_session(db)
             return jsonify({'success': True})
         except Exception as e:
             if db:
@@ -2461,7 +2613,7 @@ def send_message(user_id):
             return jsonify({'error': str(e)}), 500
         finally:
             if db:
-                __import__('database').close_db_session(db)
+                close_db_session(db)
     except Exception as e:
         print(f"Error sending message: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from config import default_config
+
+logger = logging.getLogger('AssistantRuns')
+
+TERMINAL_FAILURES = {'failed', 'cancelled', 'expired', 'incomplete', 'requires_action'}
+
+
+class RunFailedError(Exception):
+    """The assistant run finished without completing"""
+
+
+class RunTimeoutError(Exception):
+    """The assistant run did not finish before the deadline"""
+
+
+class RunCancelledError(Exception):
+    """Waiting was cancelled by the caller"""
+
+
+class RunStats:
+    """Process-wide counters for assistant run polling"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.polls = 0
+        self.wall_seconds = 0.0
+        self.max_wall_seconds = 0.0
+        self.outcomes = {}
+
+    def record(self, polls, wall_seconds, outcome):
+        with self._lock:
+            self.runs += 1
+            self.polls += polls
+            self.wall_seconds += wall_seconds
+            self.max_wall_seconds = max(self.max_wall_seconds, wall_seconds)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'runs': self.runs,
+                'polls_per_run': round(self.polls / self.runs, 2) if self.runs else 0,
+                'avg_wall_seconds': round(self.wall_seconds / self.runs, 2) if self.runs else 0,
+                'max_wall_seconds': round(self.max_wall_seconds, 2),
+                'outcomes': dict(self.outcomes)
+            }
+
+
+run_stats = RunStats()
+
+
+class _Backoff:
+    """Jittered exponential delays between polls"""
+
+    def __init__(self, initial_delay, max_delay):
+        self.delay = initial_delay
+        self.max_delay = max_delay
+
+    def next(self):
+        # Equal jitter keeps callers from polling in lockstep
+        sleep = self.delay / 2 + random.uniform(0, self.delay / 2)
+        self.delay = min(self.delay * 2, self.max_delay)
+        return sleep
+
+
+class _RunPoll:
+    """Polling state shared by the sync and async waiters"""
+
+    def __init__(self, client, thread_id, run_id, timeout, initial_delay, max_delay):
+        self.client = client
+        self.thread_id = thread_id
+        self.run_id = run_id
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.backoff = _Backoff(initial_delay, max_delay)
+        self.polls = 0
+
+    def check(self):
+        """Retrieve the run once; returns it when completed, None to keep waiting"""
+        self.polls += 1
+        try:
+            run = self.client.beta.threads.runs.retrieve(thread_id=self.thread_id, run_id=self.run_id)
+        except Exception as e:
+            # Transient API errors shouldn't abandon the run; the deadline still applies
+            logger.warning(f"Error retrieving run {self.run_id}: {e}")
+            return None
+
+        if run.status == 'completed':
+            self.finish('completed')
+            return run
+        if run.status in TERMINAL_FAILURES:
+            self.finish(run.status)
+            last_error = getattr(run, 'last_error', None)
+            raise RunFailedError(f"Run {run.status}: {last_error}" if last_error else f"Run {run.status}")
+        return None
+
+    def next_sleep(self):
+        """Seconds to wait before the next poll, or raise once the deadline passes"""
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            self.abandon('timeout')
+            raise RunTimeoutError(f"Run {self.run_id} did not finish in time")
+        return min(self.backoff.next(), remaining)
+
+    def abandon(self, outcome):
+        """Stop waiting and ask the API to cancel the run"""
+        self.finish(outcome)
+        try:
+            self.client.beta.threads.runs.cancel(thread_id=self.thread_id, run_id=self.run_id)
+        except Exception as e:
+            logger.warning(f"Could not cancel run {self.run_id}: {e}")
+
+    def finish(self, outcome):
+        wall_seconds = time.monotonic() - self.started
+        run_stats.record(self.polls, wall_seconds, outcome)
+        logger.info(f"Run {self.run_id} {outcome} after {self.polls} polls in {wall_seconds:.1f}s")
+
+
+def wait_for_run(client, thread_id, run_id, timeout=None, cancel_event=None,
+                 initial_delay=0.5, max_delay=8.0):
+    """
+    Block until an Assistants run completes
+
+    Args:
+        client: OpenAI client
+        thread_id: Thread the run belongs to
+        run_id: Run to wait for
+        timeout: Overall deadline in seconds (ProcessingConfig.assistant_run_timeout by default)
+        cancel_event: Optional threading.Event; setting it cancels the run
+        initial_delay: First delay between polls in seconds
+        max_delay: Upper bound for the delay between polls
+
+    Returns:
+        The completed run
+
+    Raises:
+        RunFailedError, RunTimeoutError or RunCancelledError
+    """
+    poll = _RunPoll(client, thread_id, run_id, timeout or default_config.assistant_run_timeout,
+                    initial_delay, max_delay)
+    while True:
+        run = poll.check()
+        if run is not None:
+            return run
+        sleep = poll.next_sleep()
+        if cancel_event is not None:
+            if cancel_event.wait(sleep):
+                poll.abandon('cancelled')
+                raise RunCancelledError(f"Run {run_id} cancelled")
+        else:
+            time.sleep(sleep)
+
+
+async def wait_for_run_async(client, thread_id, run_id, timeout=None,
+                             initial_delay=0.5, max_delay=8.0):
+    """Async variant of wait_for_run; cancel by cancelling the awaiting task"""
+    poll = _RunPoll(client, thread_id, run_id, timeout or default_config.assistant_run_timeout,
+                    initial_delay, max_delay)
+    while True:
+        run = poll.check()
+        if run is not None:
+            return run
+        try:
+            await asyncio.sleep(poll.next_sleep())
+        except asyncio.CancelledError:
+            poll.abandon('cancelled')
+            raise
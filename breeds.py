@@ -0,0 +1,167 @@
+# Comprehensive breed lists organized alphabetically
+BREED_CATALOG = {
+    'dog': sorted([
+        'Affenpinscher', 'Afghan Hound', 'Airedale Terrier', 'Akita', 'Alaskan Malamute',
+        'American Bulldog', 'American Bully', 'American Eskimo Dog', 'American Pit Bull Terrier', 'American Staffordshire Terrier',
+        'Australian Cattle Dog', 'Australian Shepherd', 'Australian Terrier',
+        'Mixed Breed',
+        'Basenji', 'Basset Hound', 'Beagle', 'Bearded Collie', 'Belgian Malinois',
+        'Bernese Mountain Dog', 'Bichon Frise', 'Bloodhound', 'Border Collie', 'Border Terrier',
+        'Boston Terrier', 'Boxer', 'Boykin Spaniel', 'Brittany', 'Brussels Griffon', 'Bull Terrier',
+        'Bulldog', 'Bullmastiff',
+        'Cairn Terrier', 'Cane Corso', 'Cavalier King Charles Spaniel', 'Chesapeake Bay Retriever',
+        'Chihuahua', 'Chinese Crested', 'Chinese Shar-Pei', 'Chow Chow', 'Cocker Spaniel', 'Collie',
+        'Corgi (Cardigan)', 'Corgi (Pembroke)', 'Dachshund', 'Dalmatian', 'Doberman Pinscher',
+        'English Bulldog', 'English Setter', 'English Springer Spaniel',
+        'French Bulldog',
+        'German Shepherd', 'German Shorthaired Pointer', 'Giant Schnauzer', 'Golden Retriever',
+        'Gordon Setter', 'Great Dane', 'Great Pyrenees', 'Greater Swiss Mountain Dog', 'Greyhound',
+        'Havanese', 'Irish Setter', 'Irish Wolfhound', 'Italian Greyhound',
+        'Jack Russell Terrier', 'Japanese Chin', 'Japanese Spitz',
+        'Keeshond', 'Kerry Blue Terrier', 'Komondor', 'Kuvasz',
+        'Labrador Retriever', 'Leonberger', 'Lhasa Apso',
+        'Maltese', 'Mastiff', 'Miniature Pinscher', 'Miniature Schnauzer',
+        'Newfoundland', 'Norfolk Terrier', 'Norwegian Elkhound', 'Norwich Terrier',
+        'Old English Sheepdog', 'Papillon', 'Pekingese', 'Pharaoh Hound',
+        'Pointer', 'Pomeranian', 'Poodle (Standard)', 'Poodle (Miniature)', 'Poodle (Toy)',
+        'Portuguese Water Dog', 'Pug',
+        'Rat Terrier', 'Rhodesian Ridgeback', 'Rottweiler',
+        'Saint Bernard', 'Saluki', 'Samoyed', 'Schipperke', 'Scottish Terrier',
+        'Shetland Sheepdog', 'Shiba Inu', 'Shih Tzu', 'Siberian Husky',
+        'Silky Terrier', 'Smooth Fox Terrier', 'Soft Coated Wheaten Terrier',
+        'Staffordshire Bull Terrier',
+        'Standard Schnauzer',
+        'Tibetan Mastiff', 'Tibetan Spaniel', 'Tibetan Terrier',
+        'Toy Fox Terrier',
+        'Vizsla',
+        'Weimaraner', 'Welsh Springer Spaniel', 'West Highland White Terrier',
+        'Whippet',
+        'Wire Fox Terrier',
+        'Yorkshire Terrier'
+    ]),
+    'cat': sorted([
+        'Abyssinian', 'American Bobtail', 'American Curl', 'American Shorthair', 'American Wirehair',
+        'Balinese', 'Bengal', 'Birman', 'Bombay', 'British Longhair', 'British Shorthair', 'Burmese',
+        'Chartreux', 'Chausie', 'Cornish Rex', 'Cyprus',
+        'Devon Rex', 'Egyptian Mau', 'European Shorthair', 'Exotic Shorthair',
+        'Havana Brown', 'Himalayan',
+        'Japanese Bobtail',
+        'Korat',
+        'LaPerm', 'Maine Coon', 'Manx', 'Munchkin',
+        'Norwegian Forest Cat',
+        'Ocicat', 'Oriental Longhair', 'Oriental Shorthair',
+        'Persian',
+        'Ragamuffin', 'Ragdoll', 'Russian Blue',
+        'Savannah', 'Scottish Fold', 'Selkirk Rex', 'Siamese', 'Siberian', 'Singapura',
+        'Snowshoe', 'Somali', 'Sphynx',
+        'Thai', 'Tonkinese', 'Turkish Angora', 'Turkish Van'
+    ]),
+    'bird': sorted([
+        'African Grey Parrot', 'Amazon Parrot', 'Australian King Parrot',
+        'Budgerigar (Budgie)',
+        'Caique', 'Canary', 'Cockatiel', 'Cockatoo (Umbrella)', 'Cockatoo (Sulfur-crested)',
+        'Conure (Green Cheek)', 'Conure (Sun)', 'Conure (Blue-crowned)',
+        'Diamond Dove',
+        'Eclectus Parrot',
+        'Finch (Zebra)', 'Finch (Society)', 'Finch (Gouldian)',
+        'Indian Ringneck Parakeet',
+        'Lovebird (Peach-faced)', 'Lovebird (Fischer\'s)', 'Lovebird (Masked)',
+        'Macaw (Blue and Gold)', 'Macaw (Scarlet)', 'Macaw (Green-winged)', 'Macaw (Hyacinth)',
+        'Meyer\'s Parrot',
+        'Pacific Parrotlet',
+        'Pionus Parrot',
+        'Quaker Parrot',
+        'Rainbow Lorikeet', 'Red-factor Canary',
+        'Senegal Parrot',
+        'White-capped Pionus',
+        'Yellow-naped Amazon'
+    ]),
+    'reptile': sorted([
+        'African Fat-tailed Gecko', 'African Spurred Tortoise',
+        'Ball Python', 'Bearded Dragon', 'Blue-tongued Skink', 'Boa Constrictor',
+        'California Kingsnake', 'Carpet Python', 'Chameleon (Veiled)', 'Chameleon (Panther)',
+        'Corn Snake', 'Crested Gecko',
+        'Eastern Box Turtle', 'Emerald Tree Boa',
+        'Fire Skink',
+        'Garter Snake', 'Gecko (Mediterranean)', 'Green Anole', 'Green Iguana',
+        'Hermann\'s Tortoise',
+        'Jackson\'s Chameleon',
+        'Kenyan Sand Boa', 'King Snake',
+        'Leopard Gecko', 'Leopard Tortoise',
+        'Mali Uromastyx',
+        'Painted Turtle',
+        'Red-eared Slider', 'Red-footed Tortoise', 'Rosy Boa', 'Russian Tortoise',
+        'Savannah Monitor',
+        'Tegu (Argentine Black and White)', 'Tokay Gecko',
+        'Water Dragon', 'Western Hognose Snake'
+    ]),
+    'fish': sorted([
+        'Angelfish', 'Arowana',
+        'Barb (Tiger)', 'Betta', 'Black Moor Goldfish', 'Black Skirt Tetra', 'Blue Gourami',
+        'Cardinal Tetra', 'Clownfish', 'Corydoras Catfish',
+        'Danio (Zebra)', 'Discus', 'Dwarf Gourami',
+        'Fancy Guppy', 'Firemouth Cichlid',
+        'German Blue Ram', 'Goldfish',
+        'Harlequin Rasbora',
+        'Jack Dempsey Cichlid',
+        'Killifish', 'Koi',
+        'Lionfish',
+        'Molly (Black)', 'Molly (Sailfin)',
+        'Neon Tetra',
+        'Oscar',
+        'Platy', 'Plecostomus',
+        'Rainbow Shark', 'Rainbowfish',
+        'Siamese Algae Eater', 'Silver Dollar', 'Swordtail',
+        'Tiger Barb',
+        'White Cloud Mountain Minnow'
+    ]),
+    'rabbit': sorted([
+        'American Fuzzy Lop', 'American Sable',
+        'Belgian Hare', 'Beveren',
+        'Californian',
+        'Dutch',
+        'English Angora', 'English Lop', 'English Spot',
+        'Flemish Giant', 'Florida White', 'French Angora', 'French Lop',
+        'Giant Angora', 'Giant Chinchilla',
+        'Harlequin', 'Havana', 'Holland Lop', 'Hotot',
+        'Jersey Wooly',
+        'Lilac',
+        'Mini Lop', 'Mini Rex', 'Mini Satin',
+        'Netherland Dwarf', 'New Zealand',
+        'Polish',
+        'Rex',
+        'Satin', 'Silver Fox', 'Silver Marten',
+        'Standard Chinchilla',
+        'Tan', 'Thrianta'
+    ]),
+    'ferret': sorted([
+        'Albino', 'Black', 'Black Sable', 'Champagne',
+        'Chocolate', 'Cinnamon', 'Dark-Eyed White',
+        'Panda', 'Point', 'Sable',
+        'Silver', 'Standard (Sable)', 'White'
+    ]),
+    'farm animal': sorted([
+        'Alpaca',
+        'Chicken (Ameraucana)', 'Chicken (Australorp)', 'Chicken (Brahma)', 'Chicken (Leghorn)', 'Chicken (Orpington)', 'Chicken (Plymouth Rock)', 'Chicken (Rhode Island Red)', 'Chicken (Silkie)', 'Chicken (Sussex)', 'Chicken (Wyandotte)',
+        'Cow (Angus)', 'Cow (Holstein)', 'Cow (Jersey)',
+        'Donkey',
+        'Duck (Pekin)', 'Duck (Rouen)', 'Duck (Runner)',
+        'Goat (Alpine)', 'Goat (Boer)', 'Goat (LaMancha)', 'Goat (Nigerian Dwarf)', 'Goat (Nubian)',
+        'Horse (American Quarter)', 'Horse (Arabian)', 'Horse (Morgan)', 'Horse (Paint)', 'Horse (Thoroughbred)',
+        'Llama',
+        'Pig (Berkshire)', 'Pig (Duroc)', 'Pig (Hampshire)', 'Pig (Potbelly)', 'Pig (Yorkshire)',
+        'Sheep (Dorper)', 'Sheep (Hampshire)', 'Sheep (Merino)', 'Sheep (Suffolk)'
+    ])
+}
+
+
+def breeds_for(pet_type):
+    """Sorted breed names for a pet type (empty for unknown types)"""
+    return BREED_CATALOG.get(pet_type, [])
+
+
+def iter_breeds():
+    """Yield every (pet_type, breed) pair in the catalog"""
+    for pet_type, breeds in BREED_CATALOG.items():
+        for breed in breeds:
+            yield pet_type, breed
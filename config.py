@@ -1,3 +1,5 @@
+import os
+import tempfile
 from dataclasses import dataclass
 from typing import Set
 
@@ -6,14 +8,92 @@ class ProcessingConfig:
     """Configuration for PII scrubbing and processing"""
     skip_file_types: Set[str] = None  # File extensions to skip PII scrubbing
     max_workers: int = 4  # Maximum number of parallel workers
+    job_workers: int = 2  # Background analysis jobs run at once per instance
+    job_stale_minutes: int = 15  # Jobs whose heartbeat is this old lost their worker
+    job_recover_interval: int = 300  # seconds between checks for lost jobs
+    job_heartbeat_interval: int = 60  # seconds between heartbeats of running jobs
     ocr_confidence_threshold: float = 80.0  # Minimum confidence for OCR results
+    text_layer_min_chars: int = 50  # Embedded text needed to skip OCR for a PDF page
+    ocr_dpi: int = 300  # Rasterization resolution when the probe finds no text
+    ocr_probe_dpi: int = 72  # Low-resolution render used to pick each page's DPI
+    ocr_min_dpi: int = 150
+    ocr_max_dpi: int = 400
+    ocr_target_text_height: int = 32  # Word height in pixels tesseract reads best
+    ocr_preprocess: bool = True  # Grayscale, deskew and binarize pages before OCR
+    raster_memory_limit_mb: int = 512  # Peak memory for pages being rasterized at once
+    raster_window: int = 1  # Pages rasterized per poppler call when streaming
+    raster_temp_dir: str = None  # Where poppler writes page images (system temp by default)
     enable_progress_bar: bool = True
     retry_attempts: int = 3
     retry_delay: int = 1  # seconds
+    assistant_run_timeout: int = 180  # seconds to wait for an Assistants run
+    chat_thread_idle_minutes: int = 30  # Start a new chat thread after this much inactivity
+    training_tips_ttl_days: int = 30  # How long generated training tips are served from the cache
+    image_workers: int = 2  # Image renditions resized and encoded at once per instance
+    image_webp_quality: int = 80
+    image_jpeg_quality: int = 85
+    vision_max_edge: int = 2048  # Vision model fits images in this square...
+    vision_short_edge: int = 768  # ...then scales the short side down to this
+    vision_jpeg_quality: int = 85
+    storage_backend: str = None  # s3, local or memory (STORAGE_BACKEND env, s3 by default)
+    direct_upload_max_bytes: int = 50 * 1024 * 1024  # Size limit for browser-to-S3 uploads
+    direct_upload_expires: int = 900  # seconds a presigned upload form stays valid
+    s3_max_pool_connections: int = 25  # Connections kept in the shared S3 client's pool
+    s3_tcp_keepalive: bool = True  # Keep idle S3 connections alive between requests
+    s3_connect_timeout: int = 5  # seconds
+    s3_read_timeout: int = 60  # seconds
+    s3_multipart_threshold_mb: int = 16  # Files at least this large are uploaded in parts
+    s3_multipart_chunksize_mb: int = 8  # Part size for multipart uploads (S3 minimum is 5)
+    s3_max_concurrency: int = 4  # Parts of one file uploaded at once
+    s3_resume_dir: str = None  # Where multipart part state is recorded for resuming
+    extraction_cache_dir: str = None  # Local extracted-text cache directory
+    extraction_cache_max_bytes: int = 256 * 1024 * 1024  # Local cache size limit
+    extraction_cache_shared: bool = True  # Also use the Postgres cache tier
+    extraction_cache_max_age_days: int = 90  # Shared entries older than this are pruned at startup
+    heic_cache_dir: str = None  # Where HEIC uploads converted to JPEG are cached
+    heic_cache_max_bytes: int = 512 * 1024 * 1024
+    heic_jpeg_quality: int = 92
+    content_reuse_grace_minutes: int = 60  # Reused objects aren't deleted for this long after a claim
+    db_pool_size: int = 5  # SQLAlchemy connections kept open per instance
+    db_max_overflow: int = 10  # Extra connections allowed under burst load
+    db_pool_timeout: int = 30  # seconds to wait for a connection
+    db_pool_recycle: int = 3600  # seconds before a connection is replaced
+    db_pool_use_lifo: bool = True  # Reuse the most recent connection so idle extras can time out server-side
+    db_raw_pool_min: int = 1  # Raw psycopg2 connections kept open per instance
+    db_raw_pool_max: int = 10  # Raw psycopg2 connections allowed at once per instance
+    db_raw_pool_timeout: int = 10  # seconds to wait for a free raw connection
+    pet_files_page_size: int = 50  # Files per get_pet_files page by default
+    pet_files_max_page_size: int = 200
+    spool_dir: str = None  # Per-request upload scratch directories (point at tmpfs, e.g. /dev/shm, for speed)
+    spool_max_bytes: int = 1024 * 1024 * 1024  # New requests are refused above this
+    spool_max_age_minutes: int = 360  # Abandoned directories older than this are swept
+    spool_sweep_interval: int = 300  # seconds between background sweeps
 
     def __post_init__(self):
         if self.skip_file_types is None:
             self.skip_file_types = set()
+        if self.storage_backend is None:
+            self.storage_backend = os.getenv('STORAGE_BACKEND', 's3')
+        if self.s3_resume_dir is None:
+            self.s3_resume_dir = os.getenv(
+                'S3_RESUME_DIR',
+                os.path.join(tempfile.gettempdir(), 'mypetlink-multipart')
+            )
+        if self.heic_cache_dir is None:
+            self.heic_cache_dir = os.getenv(
+                'HEIC_CACHE_DIR',
+                os.path.join(tempfile.gettempdir(), 'mypetlink-heic-cache')
+            )
+        if self.spool_dir is None:
+            self.spool_dir = os.getenv(
+                'SPOOL_DIR',
+                os.path.join(tempfile.gettempdir(), 'mypetlink-spool')
+            )
+        if self.extraction_cache_dir is None:
+            self.extraction_cache_dir = os.getenv(
+                'EXTRACTION_CACHE_DIR',
+                os.path.join(tempfile.gettempdir(), 'mypetlink-extraction-cache')
+            )
 
 # Default configuration for the application
 default_config = ProcessingConfig(
@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import Text, cast, or_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from config import default_config
+
+logger = logging.getLogger('ContentStore')
+
+# Content-addressed objects live under this prefix; everything else has a random key
+CONTENT_PREFIX = 'content/'
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stream_sha256(file_obj, chunk_size=1024 * 1024):
+    """SHA-256 of a seekable file object, leaving it rewound to where it started"""
+    start = file_obj.tell()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        digest.update(chunk)
+    file_obj.seek(start)
+    return digest.hexdigest()
+
+
+def content_key(content_hash, original_filename=None):
+    """Storage key for a content hash, sharded by its first two characters"""
+    file_ext = os.path.splitext(original_filename or '')[1].lower()
+    return f"{CONTENT_PREFIX}{content_hash[:2]}/{content_hash}{file_ext}"
+
+
+def is_content_key(key):
+    return key.startswith(CONTENT_PREFIX)
+
+
+def claim_object(content_hash):
+    """
+    Key of the stored object with this content hash, or None
+
+    A hit stamps last_used_at, so release_object() won't delete the object
+    while the caller is still saving the record that will refer to it.
+    """
+    from models import StoredObject
+    from database import session_factory, close_db_session
+
+    db = None
+    try:
+        db = session_factory()
+        # The UPDATE takes the row lock, so it waits for a concurrent release_object()
+        key = db.execute(
+            update(StoredObject)
+            .where(StoredObject.content_hash == content_hash)
+            .values(last_used_at=datetime.utcnow())
+            .returning(StoredObject.storage_key)
+        ).scalar()
+        db.commit()
+        return key
+    except Exception as e:
+        if db:
+            db.rollback()
+        # Treat as a miss; the upload just won't be deduplicated
+        logger.warning(f"Stored object lookup failed for {content_hash}: {e}")
+        return None
+    finally:
+        close_db_session(db)
+
+
+def record_object(content_hash, key, size, content_type=None):
+    """Remember that an object with this content hash is stored at key"""
+    from models import StoredObject
+    from database import session_factory, close_db_session
+
+    # Own session: the object is in storage whether or not the calling request commits
+    db = None
+    try:
+        db = session_factory()
+        now = datetime.utcnow()
+        statement = insert(StoredObject).values(
+            content_hash=content_hash,
+            storage_key=key,
+            size=size,
+            content_type=content_type,
+            last_used_at=now
+        )
+        # Two uploads of the same bytes can race; both wrote the same key, so either row is right
+        db.execute(statement.on_conflict_do_update(
+            index_elements=['content_hash'],
+            set_={'last_used_at': now}
+        ))
+        db.commit()
+    except Exception as e:
+        if db:
+            db.rollback()
+        logger.warning(f"Could not record stored object {key}: {e}")
+    finally:
+        close_db_session(db)
+
+
+def reference_count(db, url):
+    """
+    Number of records still pointing at a stored object's URL
+
+    Pet files, pet avatars (and their renditions) and user avatars can all
+    share one object.
+    """
+    from models import PetFile, Pet, User
+
+    return (
+        db.query(PetFile).filter(PetFile.s3_path == url).count()
+        + db.query(Pet).filter(or_(
+            Pet.avatar_url == url,
+            cast(Pet.avatar_renditions, Text).contains(url, autoescape=True)
+        )).count()
+        + db.query(User).filter(or_(
+            User.avatar_url == url,
+            cast(User.avatar_renditions, Text).contains(url, autoescape=True)
+        )).count()
+    )
+
+
+def release_object(key, url, remove, grace_seconds=None):
+    """
+    Delete a content-addressed object once nothing refers to it
+
+    The stored_objects row is locked while references are counted and
+    remove(key) runs. claim_object() blocks on that lock, so a concurrent
+    upload either claims the object first (and it is kept) or finds the row
+    gone and stores the bytes again. Objects claimed within grace_seconds
+    are kept too: the record referring to them may not be committed yet.
+
+    Returns:
+        True if the object was removed
+
+    Raises:
+        Database and storage errors, so nothing is removed when in doubt
+    """
+    from models import StoredObject
+    from database import session_factory, close_db_session
+
+    if grace_seconds is None:
+        grace_seconds = default_config.content_reuse_grace_minutes * 60
+
+    db = session_factory()
+    try:
+        stored = db.query(StoredObject).filter(StoredObject.storage_key == key).with_for_update().first()
+        if stored and stored.last_used_at and stored.last_used_at > datetime.utcnow() - timedelta(seconds=grace_seconds):
+            logger.info(f"Keeping {key}, claimed at {stored.last_used_at}")
+            db.rollback()
+            return False
+
+        references = reference_count(db, url)
+        if references:
+            logger.info(f"Keeping {key}, still referenced {references} times")
+            db.rollback()
+            return False
+
+        remove(key)
+        if stored:
+            db.delete(stored)
+        db.commit()
+        return True
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        close_db_session(db)
+
+
+def unreferenced_keys(limit=500, grace_seconds=None):
+    """
+    Keys of stored objects nothing refers to and nobody has claimed recently
+
+    These are left behind when a delete found the object freshly claimed,
+    or when a request stored a file and then failed before committing.
+    """
+    from models import StoredObject, PetFile, Pet, User
+    from database import session_factory, close_db_session
+
+    if grace_seconds is None:
+        grace_seconds = default_config.content_reuse_grace_minutes * 60
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+
+    db = session_factory()
+    try:
+        rows = db.query(StoredObject.storage_key).filter(
+            StoredObject.last_used_at < cutoff,
+            ~db.query(PetFile.id).filter(PetFile.s3_path.endswith(StoredObject.storage_key)).exists(),
+            ~db.query(Pet.id).filter(Pet.avatar_url.endswith(StoredObject.storage_key)).exists(),
+            ~db.query(Pet.id).filter(cast(Pet.avatar_renditions, Text).contains(StoredObject.storage_key)).exists(),
+            ~db.query(User.id).filter(User.avatar_url.endswith(StoredObject.storage_key)).exists(),
+            ~db.query(User.id).filter(cast(User.avatar_renditions, Text).contains(StoredObject.storage_key)).exists()
+        ).limit(limit).all()
+        return [row.storage_key for row in rows]
+    finally:
+        close_db_session(db)
@@ -1,14 +1,18 @@
 import os
 import psycopg2
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 from urllib.parse import urlparse
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 from models import Base
 from dotenv import load_dotenv, find_dotenv
-from sqlalchemy.sql import text
+from config import default_config
 
 # Load environment variables
 ENV_FILE = find_dotenv()
@@ -19,22 +23,159 @@ else:
 
 logger = logging.getLogger('Database')
 
+def _connection_kwargs():
+    """psycopg2.connect arguments parsed from DATABASE_URL"""
+    url = urlparse(os.getenv('DATABASE_URL'))
+    return dict(
+        dbname=url.path[1:],
+        user=url.username,
+        password=url.password,
+        host=url.hostname,
+        port=url.port,
+        sslmode='require'  # Add SSL mode
+    )
+
+class PoolStats:
+    """Checkout counters for the raw connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.checkout_seconds = 0.0
+        self.max_checkout_seconds = 0.0
+
+    def record_checkout(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.checkout_seconds += seconds
+            self.max_checkout_seconds = max(self.max_checkout_seconds, seconds)
+
+    def record_checkin(self, discarded=False):
+        with self._lock:
+            self.in_use -= 1
+            if discarded:
+                self.discarded += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'in_use': self.in_use,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'avg_checkout_ms': round(self.checkout_seconds / self.checkouts * 1000, 2) if self.checkouts else 0,
+                'max_checkout_ms': round(self.max_checkout_seconds * 1000, 2)
+            }
+
+class RawConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections for the legacy raw-SQL routes
+
+    ThreadedConnectionPool raises as soon as maxconn connections are out, so
+    a semaphore makes callers wait up to timeout seconds for one instead.
+    The pool is created on first use, after gunicorn has forked.
+    """
+
+    def __init__(self, minconn, maxconn, timeout):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+
+    @classmethod
+    def from_config(cls, config=default_config):
+        return cls(config.db_raw_pool_min, config.db_raw_pool_max, config.db_raw_pool_timeout)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, **_connection_kwargs())
+            return self._pool
+
+    def getconn(self):
+        """
+        Borrow a connection, waiting for a free slot if the pool is exhausted
+
+        Raises:
+            PoolError if none frees up within timeout; connection errors
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.record_timeout()
+            raise PoolError(f"No database connection free after {self.timeout}s")
+        try:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            if conn.closed:
+                # The server or network dropped it while idle
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        self.stats.record_checkout(time.perf_counter() - start)
+        return conn
+
+    def putconn(self, conn):
+        """Return a connection, rolling back anything the caller left open"""
+        discard = bool(conn.closed)
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        try:
+            self._get_pool().putconn(conn, close=discard)
+        finally:
+            self.stats.record_checkin(discarded=discard)
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+raw_pool = RawConnectionPool.from_config()
+
+@contextmanager
+def db_connection():
+    """
+    Pooled psycopg2 connection for a with block, returned to the pool afterwards
+
+    Yields None if no connection could be made, like the old get_db_connection.
+    """
+    try:
+        conn = raw_pool.getconn()
+    except Exception as e:
+        logger.error(f"Database connection error: {str(e)}")
+        conn = None
+    try:
+        yield conn
+    finally:
+        if conn is not None:
+            raw_pool.putconn(conn)
+
 # Legacy connection function for existing code
 def get_db_connection():
+    """
+    Unpooled psycopg2 connection; the caller must close() it
+
+    Prefer db_connection(), which reuses connections.
+    """
     try:
-        # Parse DATABASE_URL
-        db_url = os.getenv('DATABASE_URL')
-        url = urlparse(db_url)
-        
-        conn = psycopg2.connect(
-            dbname=url.path[1:],
-            user=url.username,
-            password=url.password,
-            host=url.hostname,
-            port=url.port,
-            sslmode='require'  # Add SSL mode
-        )
-        return conn
+        return psycopg2.connect(**_connection_kwargs())
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
         return None 
@@ -60,51 +201,160 @@ def get_database_url():
 engine = create_engine(
     get_database_url(), 
     pool_pre_ping=True,  # Test connections before using them
-    pool_recycle=3600,   # Recycle connections after an hour
-    pool_timeout=30      # Wait up to 30 seconds for a connection
+    pool_recycle=default_config.db_pool_recycle,
+    pool_timeout=default_config.db_pool_timeout,
+    pool_size=default_config.db_pool_size,
+    max_overflow=default_config.db_max_overflow,
+    pool_use_lifo=default_config.db_pool_use_lifo
 )
 session_factory = sessionmaker(bind=engine)
 SessionLocal = scoped_session(session_factory)
 
-# Initialize database (create tables)
+class EnginePoolStats:
+    """Lifetime counters for the SQLAlchemy engine pool, fed by pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+
+    def _increment(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self, pool):
+        with self._lock:
+            return {
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'invalidations': self.invalidations
+            }
+
+engine_pool_stats = EnginePoolStats()
+
+@event.listens_for(engine, 'connect')
+def _on_connect(dbapi_connection, connection_record):
+    engine_pool_stats._increment('connects')
+
+@event.listens_for(engine, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    engine_pool_stats._increment('checkouts')
+
+@event.listens_for(engine, 'invalidate')
+def _on_invalidate(dbapi_connection, connection_record, exception):
+    engine_pool_stats._increment('invalidations')
+
+def pool_status():
+    """Current engine pool occupancy and lifetime counters"""
+    return engine_pool_stats.snapshot(engine.pool)
+
+# Create tables directly from the models, for throwaway databases (tests).
+# Real databases are managed by Alembic: alembic upgrade head
 def init_db():
     Base.metadata.create_all(bind=engine)
 
 # Session management
 def get_db_session():
-    """Get a new database session with improved error handling"""
+    """
+    Session for the current thread (the current request, in Flask)
+
+    No connection is taken until the first query; pool_pre_ping checks it
+    then, so stale connections are replaced without a separate round trip.
+    """
+    return SessionLocal()
+
+def remove_db_session(exception=None):
+    """Close the current thread's session and return its connection to the pool"""
     try:
-        db = SessionLocal()
-        # Test the connection
-        db.execute(text("SELECT 1"))
-        return db
+        SessionLocal.remove()
     except Exception as e:
-        logger.error(f"Database session creation error: {e}")
-        # Attempt to close if session was created
-        try:
-            if 'db' in locals():
-                db.close()
-        except:
-            pass
-        # Return a new session as a fallback (may fail again but worth trying)
-        try:
-            return SessionLocal()
-        except Exception as retry_error:
-            logger.error(f"Failed to create database session on retry: {retry_error}")
-            raise
+        logger.error(f"Error removing database session: {e}")
 
 def close_db_session(db):
-    """Close database session safely"""
+    """Close database session safely (request sessions are closed at teardown instead)"""
     if db is not None:
+        if db.info.get('request_scoped'):
+            return
         try:
             db.close()
         except Exception as e:
             logger.error(f"Error closing database session: {e}")
             # No need to re-raise, just log the error
 
-# Initialize database on module import
-try:
-    init_db()
-except Exception as e:
-    logger.warning(f"Database initialization skipped: {e}")
-    logger.warning("Tables will need to be created manually or the application may not function properly")
+class ReadOnlySessionError(Exception):
+    """A read-only request tried to write"""
+
+@event.listens_for(session_factory, 'before_flush')
+def _reject_read_only_flush(db, flush_context, instances):
+    if db.info.get('read_only'):
+        raise ReadOnlySessionError("This request is read-only and cannot modify the database")
+
+def begin_request_session(read_only=False):
+    """
+    Make the current thread's session the unit of work for a request
+
+    Until finish_request_session(), commit_db_session() only flushes and
+    close_db_session() does nothing, so the request uses one connection
+    and commits once. No connection is taken until the first query.
+    """
+    db = SessionLocal()
+    db.info['request_scoped'] = True
+    db.info['read_only'] = read_only
+    return db
+
+def finish_request_session(commit=True):
+    """
+    Commit the request's unit of work (or roll it back) and close it
+
+    Read-only sessions are always rolled back. Callbacks registered with
+    on_commit() run only after a successful commit.
+
+    Raises:
+        Commit errors, after rolling back and closing the session
+    """
+    if not SessionLocal.registry.has():
+        return
+    db = SessionLocal()
+    callbacks = db.info.pop('on_commit', [])
+    try:
+        if commit and not db.info.get('read_only'):
+            db.commit()
+        else:
+            db.rollback()
+            callbacks = []
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        SessionLocal.remove()
+
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"After-commit callback failed: {e}")
+
+def commit_db_session(db):
+    """Commit, or just flush when the session is a request's unit of work"""
+    if db.info.get('request_scoped'):
+        db.flush()
+    else:
+        db.commit()
+
+def on_commit(db, callback):
+    """
+    Run callback once db's changes are committed
+
+    Work that depends on committed rows (starting a background job, for
+    example) is deferred until the request commits; outside a request the
+    caller has already committed, so it runs now.
+    """
+    if db.info.get('request_scoped'):
+        db.info.setdefault('on_commit', []).append(callback)
+    else:
+        callback()
@@ -0,0 +1,266 @@
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+
+from config import default_config
+from content_store import file_sha256
+from ocr import EXTRACTOR_VERSION
+
+logger = logging.getLogger('ExtractionCache')
+
+# Eviction frees space down to this fraction of max_bytes
+EVICT_TO = 0.9
+
+
+def cache_key(content_hash, kind):
+    """
+    Cache key for a file's content hash, extraction kind and extractor version
+
+    The hash is the same one content-addressed storage uses, so a stored
+    object's key and its cached text share an identifier.
+    """
+    return f"{kind}-v{EXTRACTOR_VERSION}-{content_hash}"
+
+
+class LocalDiskCache:
+    """
+    Size-bounded on-disk cache, evicting least recently used entries
+
+    Writes keep a running total of the directory's size. The directory is
+    only walked when that total goes over max_bytes, and eviction then
+    frees a batch (down to EVICT_TO of the limit) so the next walk is
+    many writes away.
+    """
+
+    def __init__(self, directory, max_bytes, suffix='.txt'):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._size = None  # bytes in the directory, measured on the first write
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Shard by hash prefix so no single directory grows too large
+        return os.path.join(self.directory, key[-2:], f"{key}{self.suffix}")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                text = file.read()
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path, None)
+            return text
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Local cache read failed for {key}: {e}")
+            return None
+
+    def get_path(self, key):
+        """Path of a cached entry, for callers that want the file itself, or None"""
+        path = self._path(key)
+        try:
+            os.utime(path, None)
+            return path
+        except OSError:
+            return None
+
+    def put(self, key, text):
+        self.put_bytes(key, text.encode('utf-8'))
+
+    def put_bytes(self, key, data):
+        """Store raw bytes; returns the entry's path, or None if the write failed"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Local cache write failed for {key}: {e}")
+            return None
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data) - replaced
+            over = self._size is None or self._size > self.max_bytes
+        if over:
+            self.evict()
+        return path
+
+    def evict(self):
+        """
+        Measure the directory and, if it is over max_bytes, remove least
+        recently used entries until it is down to EVICT_TO of the limit
+
+        The walk also picks up entries other processes sharing the
+        directory have written.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, filenames in os.walk(self.directory):
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            if total > self.max_bytes:
+                target = self.max_bytes * EVICT_TO
+                entries.sort()
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                    except OSError:
+                        pass
+            self._size = total
+
+
+class PostgresCache:
+    """Shared cache tier stored in the extraction_cache table"""
+
+    def get(self, key):
+        from models import ExtractionCacheEntry
+        from database import session_factory, close_db_session
+
+        # Own session: a failed read mustn't abort the caller's transaction
+        db = None
+        try:
+            db = session_factory()
+            entry = db.query(ExtractionCacheEntry).filter(ExtractionCacheEntry.cache_key == key).first()
+            return entry.text if entry else None
+        except Exception as e:
+            logger.warning(f"Shared cache read failed for {key}: {e}")
+            return None
+        finally:
+            close_db_session(db)
+
+    def put(self, key, text):
+        from models import ExtractionCacheEntry
+        from database import session_factory, close_db_session
+
+        # Own session: cache entries are kept whatever happens to the caller's transaction
+        db = None
+        try:
+            db = session_factory()
+            statement = insert(ExtractionCacheEntry).values(cache_key=key, text=text)
+            db.execute(statement.on_conflict_do_nothing(index_elements=['cache_key']))
+            db.commit()
+        except Exception as e:
+            if db:
+                db.rollback()
+            logger.warning(f"Shared cache write failed for {key}: {e}")
+        finally:
+            close_db_session(db)
+
+    def prune(self, max_age_days):
+        """Delete shared entries older than max_age_days"""
+        from models import ExtractionCacheEntry
+        from database import session_factory, close_db_session
+
+        db = session_factory()
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+            deleted = db.query(ExtractionCacheEntry).filter(ExtractionCacheEntry.created_at < cutoff).delete()
+            db.commit()
+            return deleted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            close_db_session(db)
+
+
+class ExtractionCache:
+    """Read-through cache of extracted text, local tier first then shared"""
+
+    def __init__(self, local=None, shared=None, shared_max_age_days=None):
+        self.local = local
+        self.shared = shared
+        self.shared_max_age_days = shared_max_age_days
+
+    @classmethod
+    def from_config(cls, config=default_config):
+        local = LocalDiskCache(config.extraction_cache_dir, config.extraction_cache_max_bytes)
+        shared = PostgresCache() if config.extraction_cache_shared else None
+        return cls(local=local, shared=shared, shared_max_age_days=config.extraction_cache_max_age_days)
+
+    def prune(self):
+        """
+        Delete shared entries older than shared_max_age_days
+
+        Returns:
+            Number of entries deleted
+        """
+        if not self.shared or not self.shared_max_age_days:
+            return 0
+        try:
+            deleted = self.shared.prune(self.shared_max_age_days)
+        except Exception as e:
+            logger.warning(f"Shared cache prune failed: {e}")
+            return 0
+        if deleted:
+            logger.info(f"Pruned {deleted} shared extraction cache entries")
+        return deleted
+
+    def get(self, key):
+        if self.local:
+            text = self.local.get(key)
+            if text is not None:
+                return text
+        if self.shared:
+            text = self.shared.get(key)
+            if text is not None:
+                # Backfill the local tier so the next hit skips the database
+                if self.local:
+                    self.local.put(key, text)
+                return text
+        return None
+
+    def put(self, key, text):
+        if self.local:
+            self.local.put(key, text)
+        if self.shared:
+            self.shared.put(key, text)
+
+    def get_or_extract(self, file_path, kind, extract):
+        """
+        Return cached text for a file, running extract(file_path) on a miss
+
+        Args:
+            file_path: Path to the uploaded file
+            kind: Extraction kind (pdf, image) - part of the cache key
+            extract: Callable returning the extracted text
+
+        Returns:
+            Extracted text
+        """
+        key = cache_key(file_sha256(file_path), kind)
+        text = self.get(key)
+        if text is not None:
+            logger.info(f"Extraction cache hit for {os.path.basename(file_path)}")
+            return text
+
+        text = extract(file_path)
+        # Empty results are usually failures worth retrying, so don't cache them
+        if text and text.strip():
+            self.put(key, text)
+        return text
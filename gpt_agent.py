@@ -3,7 +3,6 @@ import os
 import logging
 from dotenv import load_dotenv, find_dotenv
 import pytesseract
-from pdf2image import convert_from_path
 import time
 import uuid
 import json
@@ -13,6 +12,11 @@ from flask import session
 import base64
 import asyncio
 import PyPDF2
+from ocr import OCREngine
+from extraction_cache import ExtractionCache
+from heic import HEIC_EXTENSIONS, heic_converter
+from image_ingest import prepare_for_vision
+from assistant_runs import wait_for_run, wait_for_run_async, RunTimeoutError
 
 # Basic logging setup
 logging.basicConfig(level=logging.INFO)
@@ -34,17 +38,24 @@ if not os.environ.get("OPENAI_API_KEY"):
     logger.error("OpenAI API key not found in environment variables")
     raise ValueError("OpenAI API key must be set in .env file")
 
+ocr_engine = OCREngine()
+extraction_cache = ExtractionCache.from_config()
+
+def _extract_pdf_pages(file_path):
+    """Text layer where present, OCR for the remaining pages"""
+    result = ocr_engine.extract_pdf(file_path)
+    logger.info(f"Extraction timings for {os.path.basename(file_path)}: {result.timings()}")
+    return result.text
+
+def _ocr_image(file_path):
+    """OCR an image file, converting HEIC to JPEG first"""
+    return pytesseract.image_to_string(heic_converter.analysis_file(file_path))
+
 def extract_text_from_pdf(file_path):
     """Extract text from PDF file with fallback"""
     try:
-        # First try with pdf2image/poppler
         try:
-            images = convert_from_path(file_path)
-            text_content = []
-            for image in images:
-                text = pytesseract.image_to_string(image)
-                text_content.append(text)
-            return "\n\n".join(text_content)
+            return extraction_cache.get_or_extract(file_path, 'pdf', _extract_pdf_pages)
         except Exception as poppler_error:
             logger.warning(f"Poppler extraction failed: {poppler_error}, trying fallback method")
             
@@ -76,8 +87,8 @@ def analyze_health_records(file_paths, document_type="vet_record"):
                 elif file_path.lower().endswith('.txt'):
                     with open(file_path, 'r') as f:
                         text = f.read()
-                elif file_path.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    text = pytesseract.image_to_string(file_path)
+                elif file_path.lower().endswith(('.jpg', '.jpeg', '.png') + HEIC_EXTENSIONS):
+                    text = extraction_cache.get_or_extract(file_path, 'image', _ocr_image)
                 
                 if text:
                     all_text.append(text)
@@ -132,15 +143,7 @@ Please use appropriate emojis for key points (🔴 for urgent concerns, 💊 for
         )
 
         # Wait for completion
-        while True:
-            run = client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-            if run.status == 'completed':
-                break
-            elif run.status == 'failed':
-                raise Exception("Analysis failed")
+        wait_for_run(client, thread.id, run.id)
 
         # Get response
         messages = client.beta.threads.messages.list(thread_id=thread.id)
@@ -202,11 +205,20 @@ Please use appropriate emojis for key points (🔴 for urgent concerns, 💊 for
         }
 
 async def analyze_poop_image(image_path):
-    """Analyze pet stool image using GPT-4 Vision"""
+    """
+    Analyze pet stool image using GPT-4 Vision
+
+    Returns:
+        Dict with summary, concerns and recommendations, or
+        {'success': False, 'error': ...} if the analysis failed
+    """
     try:
-        # Read the image file
-        with open(image_path, "rb") as image_file:
-            image_data = image_file.read()
+        # The vision model can't read HEIC; use the cached JPEG conversion
+        image_path = heic_converter.analysis_file(image_path)
+        
+        # Shrink to the resolution the model analyses at before uploading
+        image_data, upload_stats = prepare_for_vision(image_path)
+        upload_name = f"{os.path.splitext(os.path.basename(image_path))[0]}.jpg"
         
         # First upload the file to OpenAI with retry logic
         logger.info("Uploading image to OpenAI for analysis")
@@ -217,11 +229,10 @@ async def analyze_poop_image(image_path):
         file_id = None
         while upload_retry_count < max_upload_retries and not file_id:
             try:
-                with open(image_path, "rb") as file_obj:
-                    file_response = client.files.create(
-                        file=file_obj,
-                        purpose="assistants"
-                    )
+                file_response = client.files.create(
+                    file=(upload_name, image_data, "image/jpeg"),
+                    purpose="assistants"
+                )
                 file_id = file_response.id
                 logger.info(f"Successfully uploaded image to OpenAI, file_id: {file_id}")
             except Exception as upload_error:
@@ -263,47 +274,14 @@ async def analyze_poop_image(image_path):
             assistant_id="asst_bYxIi1SefCRrdHSHfByUtNjd"  # Your assistant ID
         )
 
-        # Wait for completion with exponential backoff and longer timeout
-        max_retries = 60  # Maximum number of times to check for completion (increased from 30)
-        retry_count = 0
-        backoff_time = 1  # Starting backoff time in seconds
-        max_backoff = 10  # Maximum backoff time in seconds
-        
-        while retry_count < max_retries:
-            try:
-                run = client.beta.threads.runs.retrieve(
-                    thread_id=thread.id,
-                    run_id=run.id
-                )
-                
-                if run.status == 'completed':
-                    logger.info(f"Analysis completed successfully after {retry_count} retries")
-                    break
-                elif run.status == 'failed':
-                    error_msg = f"Analysis failed: {run.last_error}" if hasattr(run, 'last_error') else "Analysis failed"
-                    raise Exception(error_msg)
-                elif run.status in ['queued', 'in_progress']:
-                    logger.info(f"Analysis in progress: {run.status}, retry {retry_count+1}/{max_retries}")
-                else:
-                    logger.warning(f"Unexpected status: {run.status}, continuing to wait")
-                
-                # Exponential backoff with a maximum
-                backoff_time = min(backoff_time * 1.5, max_backoff)
-                retry_count += 1
-                await asyncio.sleep(backoff_time)
-            except Exception as retrieval_error:
-                logger.error(f"Error retrieving run status: {retrieval_error}")
-                retry_count += 1
-                await asyncio.sleep(backoff_time)
-                continue
-
-        # Check if we reached max retries without completion
-        if retry_count >= max_retries:
-            logger.error(f"Analysis timed out after maximum {max_retries} retries")
+        # Wait for completion with jittered backoff and an overall deadline
+        try:
+            await wait_for_run_async(client, thread.id, run.id)
+        except RunTimeoutError:
+            logger.error("Analysis timed out waiting for the assistant run")
             return {
-                'summary': 'Analysis timed out',
-                'concerns': 'The analysis took too long to complete',
-                'recommendations': 'Please try again with a clearer image or contact support if the issue persists'
+                'success': False,
+                'error': 'Analysis timed out. Please try again with a clearer image or contact support if the issue persists'
             }
             
         # Get the response with minimal logging
@@ -343,9 +321,8 @@ async def analyze_poop_image(image_path):
         except Exception as message_error:
             logger.error(f"Error retrieving analysis result: {message_error}")
             return {
-                'summary': 'Error retrieving analysis',
-                'concerns': f'Technical issue: {str(message_error)}',
-                'recommendations': 'Please try again later'
+                'success': False,
+                'error': f'Error retrieving analysis: {str(message_error)}. Please try again later'
             }
 
         # Parse sections with minimal logging
@@ -392,12 +369,12 @@ async def analyze_poop_image(image_path):
         # Simple log of success/failure
         has_content = bool(result['summary']) or bool(result['concerns']) or bool(result['recommendations'])
         logger.info(f"Analysis complete, returning {has_content=}")
+        result['upload_stats'] = upload_stats
         return result
 
     except Exception as e:
         logger.error(f"Poop analysis error: {str(e)}")
         return {
-            'summary': 'Error analyzing image',
-            'concerns': 'Unable to process the image',
-            'recommendations': 'Please try again with a clearer image'
+            'success': False,
+            'error': 'Unable to process the image. Please try again with a clearer image'
         }
@@ -0,0 +1,138 @@
+import io
+import logging
+import os
+import threading
+import time
+
+import pyheif
+from PIL import Image
+
+from config import default_config
+from content_store import file_sha256
+from extraction_cache import LocalDiskCache
+
+logger = logging.getLogger('HEIC')
+
+HEIC_EXTENSIONS = ('.heic', '.heif')
+
+# ISO base media 'ftyp' brands used by HEIC/HEIF images
+HEIF_BRANDS = {b'heic', b'heix', b'hevc', b'hevx', b'heim', b'heis', b'mif1', b'msf1'}
+
+
+def is_heic_bytes(data):
+    """True when the bytes start with a HEIF ftyp box"""
+    return len(data) >= 12 and data[4:8] == b'ftyp' and data[8:12] in HEIF_BRANDS
+
+
+def is_heic(file_path):
+    """True for .heic/.heif files, or files whose header says they are HEIF"""
+    if file_path.lower().endswith(HEIC_EXTENSIONS):
+        return True
+    try:
+        with open(file_path, 'rb') as file:
+            return is_heic_bytes(file.read(12))
+    except OSError:
+        return False
+
+
+def decode_heic(data):
+    """Decode HEIC bytes into a PIL image"""
+    heif_file = pyheif.read(data)
+    return Image.frombytes(
+        heif_file.mode,
+        heif_file.size,
+        heif_file.data,
+        'raw',
+        heif_file.mode,
+        heif_file.stride
+    )
+
+
+class DecodeStats:
+    """Process-wide HEIC decode counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decodes = 0
+        self.cache_hits = 0
+        self.decode_seconds = 0.0
+        self.max_decode_seconds = 0.0
+
+    def record_decode(self, seconds):
+        with self._lock:
+            self.decodes += 1
+            self.decode_seconds += seconds
+            self.max_decode_seconds = max(self.max_decode_seconds, seconds)
+
+    def record_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'decodes': self.decodes,
+                'cache_hits': self.cache_hits,
+                'avg_decode_seconds': round(self.decode_seconds / self.decodes, 3) if self.decodes else 0,
+                'max_decode_seconds': round(self.max_decode_seconds, 3)
+            }
+
+
+decode_stats = DecodeStats()
+
+
+class HeicConverter:
+    """
+    Converts HEIC uploads to JPEG once, caching the result by content hash
+
+    Tesseract and the vision model both handle JPEG well and HEIC badly,
+    so analysis paths ask for an analysis-friendly file before reading.
+    """
+
+    def __init__(self, cache, quality=92):
+        self.cache = cache
+        self.quality = quality
+
+    @classmethod
+    def from_config(cls, config=default_config):
+        cache = LocalDiskCache(config.heic_cache_dir, config.heic_cache_max_bytes, suffix='.jpg')
+        return cls(cache, quality=config.heic_jpeg_quality)
+
+    def analysis_file(self, file_path):
+        """
+        Path to a JPEG version of a HEIC file (other files are returned as-is)
+
+        Returns:
+            Path of the cached JPEG, or file_path when no conversion is needed
+        """
+        if not is_heic(file_path):
+            return file_path
+
+        key = f"heic-jpeg-q{self.quality}-{file_sha256(file_path)}"
+        cached_path = self.cache.get_path(key)
+        if cached_path:
+            decode_stats.record_hit()
+            return cached_path
+
+        start = time.perf_counter()
+        with open(file_path, 'rb') as file:
+            image = decode_heic(file.read())
+        buffer = io.BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=self.quality)
+        seconds = time.perf_counter() - start
+        decode_stats.record_decode(seconds)
+        logger.info(f"Decoded {os.path.basename(file_path)} ({image.width}x{image.height}) "
+                    f"to JPEG in {seconds:.2f}s")
+
+        converted_path = self.cache.put_bytes(key, buffer.getvalue())
+        if converted_path:
+            return converted_path
+
+        # Cache unavailable; write next to the original so analysis can still proceed
+        fallback_path = f"{os.path.splitext(file_path)[0]}.jpg"
+        with open(fallback_path, 'wb') as file:
+            file.write(buffer.getvalue())
+        return fallback_path
+
+
+heic_converter = HeicConverter.from_config()
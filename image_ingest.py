@@ -0,0 +1,255 @@
+import base64
+import binascii
+import io
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+from config import default_config
+from heic import decode_heic, decode_stats, is_heic_bytes
+
+logger = logging.getLogger('ImageIngest')
+
+# Longest edge in pixels for each rendition
+RENDITION_SIZES = {
+    'thumbnail': 128,
+    'card': 512,
+    'full': 1600
+}
+
+# EXIF tag saying how the stored pixels must be rotated for display
+EXIF_ORIENTATION = 0x0112
+
+# Rendition used when a single URL is needed (pet and user avatar_url)
+PRIMARY_RENDITION = 'card'
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg')
+}
+
+# Shared encoder pool, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class IngestedImage:
+    """Stored renditions of one uploaded image"""
+    width: int
+    height: int
+    renditions: Dict[str, Dict[str, str]] = field(default_factory=dict)  # name -> format -> URL
+    sizes: Dict[str, Dict[str, int]] = field(default_factory=dict)  # name -> format -> bytes
+
+    @property
+    def url(self):
+        """WebP card rendition, the URL stored as avatar_url"""
+        return self.renditions[PRIMARY_RENDITION]['webp']
+
+    @property
+    def content_type(self):
+        return FORMATS['webp'][1]
+
+    @property
+    def file_size(self):
+        return self.sizes[PRIMARY_RENDITION]['webp']
+
+    def to_dict(self):
+        return {'url': self.url, 'width': self.width, 'height': self.height, 'renditions': self.renditions}
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=default_config.image_workers, thread_name_prefix='image')
+        return _pool
+
+
+def decode_data_url(data_url):
+    """
+    Decode a base64 data URL in memory
+
+    Returns:
+        (bytes, mime type)
+
+    Raises:
+        ValueError if the string isn't a base64 data URL
+    """
+    if not data_url or not data_url.startswith('data:') or ',' not in data_url:
+        raise ValueError("Not a data URL")
+    header, payload = data_url.split(',', 1)
+    mime_type = header[5:].split(';')[0] or 'application/octet-stream'
+    if ';base64' not in header:
+        raise ValueError("Only base64 data URLs are supported")
+    try:
+        return base64.b64decode(payload, validate=False), mime_type
+    except binascii.Error as e:
+        raise ValueError(f"Invalid base64 image data: {e}")
+
+
+def load_image(data):
+    """
+    Open image bytes and normalize them for encoding
+
+    The EXIF orientation is applied to the pixels (phone photos are often
+    stored sideways with a rotation tag), and the mode is reduced to RGB,
+    or RGBA when the image has transparency.
+    """
+    if is_heic_bytes(data):
+        start = time.perf_counter()
+        image = decode_heic(data)
+        decode_stats.record_decode(time.perf_counter() - start)
+    else:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def render(image, max_edge, image_format, config=default_config):
+    """Resize (never upscale) and encode one rendition, returning its bytes"""
+    rendition = image.copy()
+    rendition.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    pil_format, _ = FORMATS[image_format]
+    buffer = io.BytesIO()
+    if pil_format == 'JPEG':
+        if rendition.mode == 'RGBA':
+            # JPEG has no alpha; flatten onto white
+            background = Image.new('RGB', rendition.size, (255, 255, 255))
+            background.paste(rendition, mask=rendition.split()[-1])
+            rendition = background
+        rendition.save(buffer, 'JPEG', quality=config.image_jpeg_quality, optimize=True, progressive=True)
+    else:
+        rendition.save(buffer, 'WEBP', quality=config.image_webp_quality, method=4)
+    return buffer.getvalue()
+
+
+def _render_and_store(storage, image, name, image_format, user_id, pet_id, file_type, basename, config):
+    data = render(image, RENDITION_SIZES[name], image_format, config)
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+    url = storage.upload_file_object(
+        io.BytesIO(data),
+        user_id,
+        pet_id,
+        file_type,
+        f"{basename}_{name}.{extension}"
+    )
+    return name, image_format, url, len(data)
+
+
+def ingest_image(data, storage, user_id, pet_id, file_type='avatar', basename='image', config=default_config):
+    """
+    Decode an uploaded image once and store WebP and JPEG renditions of it
+
+    Callers save every URL in renditions on the record (avatar_renditions),
+    so all of them are released together when the avatar is replaced.
+
+    Each rendition is resized, encoded and uploaded on the shared image pool,
+    which bounds how many are in memory at once across requests.
+
+    Args:
+        data: Raw image bytes
+        storage: Storage backend to upload to
+        user_id: User ID
+        pet_id: Pet ID (or a placeholder folder name)
+        file_type: Type of file (avatar)
+        basename: Filename stem for the stored renditions
+
+    Returns:
+        IngestedImage with a URL per rendition and format
+
+    Raises:
+        ValueError if the bytes aren't a readable image; storage errors
+    """
+    start = time.perf_counter()
+    try:
+        image = load_image(data)
+    except Exception as e:
+        raise ValueError(f"Unreadable image: {e}")
+
+    futures = [
+        _get_pool().submit(_render_and_store, storage, image, name, image_format,
+                           user_id, pet_id, file_type, basename, config)
+        for name in RENDITION_SIZES
+        for image_format in FORMATS
+    ]
+
+    result = IngestedImage(width=image.width, height=image.height)
+    for future in futures:
+        name, image_format, url, size = future.result()
+        result.renditions.setdefault(name, {})[image_format] = url
+        result.sizes.setdefault(name, {})[image_format] = size
+
+    logger.info(f"Ingested {image.width}x{image.height} image ({len(data)} bytes) into "
+                f"{len(futures)} renditions, card WebP {result.file_size} bytes, "
+                f"in {time.perf_counter() - start:.2f}s")
+    return result
+
+
+def ingest_data_url(data_url, storage, user_id, pet_id, file_type='avatar', basename='image', config=default_config):
+    """ingest_image for a base64 data URL, as sent by the avatar forms"""
+    data, _ = decode_data_url(data_url)
+    return ingest_image(data, storage, user_id, pet_id, file_type, basename, config)
+
+
+def vision_size(width, height, config=default_config):
+    """
+    Size the vision model actually analyses an image at
+
+    High-detail images are scaled to fit vision_max_edge, then so the short
+    side is at most vision_short_edge. Anything larger is discarded by the
+    API, so there's no point uploading it.
+    """
+    scale = min(1.0, config.vision_max_edge / max(width, height))
+    scale = min(scale, config.vision_short_edge / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_for_vision(file_path, config=default_config):
+    """
+    Downscale and recompress an image for upload to the vision model
+
+    Returns:
+        (JPEG bytes to upload, stats dict with original/uploaded bytes and sizes)
+    """
+    start = time.perf_counter()
+    with open(file_path, 'rb') as file:
+        original = file.read()
+
+    image = load_image(original)
+    original_size = image.size
+    size = vision_size(image.width, image.height, config)
+    if size != original_size:
+        image = image.resize(size, Image.LANCZOS)
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=config.vision_jpeg_quality, optimize=True)
+    data = buffer.getvalue()
+
+    # A small JPEG that needed no resizing can already be tighter than our re-encode of it,
+    # unless its pixels are stored rotated: the model doesn't read the orientation tag
+    if (size == original_size and len(original) <= len(data) and original[:3] == b'\xff\xd8\xff'
+            and Image.open(io.BytesIO(original)).getexif().get(EXIF_ORIENTATION, 1) == 1):
+        data = original
+
+    stats = {
+        'original_bytes': len(original),
+        'uploaded_bytes': len(data),
+        'uploaded_size': list(size),
+        'prepare_seconds': round(time.perf_counter() - start, 3)
+    }
+    logger.info(f"Prepared {file_path} for vision: {stats['original_bytes']} -> {stats['uploaded_bytes']} bytes "
+                f"at {size[0]}x{size[1]}")
+    return data, stats
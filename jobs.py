@@ -0,0 +1,396 @@
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import default_config
+
+logger = logging.getLogger('Jobs')
+
+# job_type -> callable(payload) returning a JSON-serializable result
+_handlers = {}
+
+
+def job_handler(job_type):
+    """Register the function that runs jobs of the given type"""
+    def register(func):
+        _handlers[job_type] = func
+        return func
+    return register
+
+
+@contextmanager
+def stored_files(keys):
+    """
+    Download stored objects into a temporary directory for analysis
+
+    Used for files the browser uploaded straight to storage, which never
+    touched this instance's disk. The directory is removed on exit.
+
+    Yields:
+        Local paths in the same order as keys
+    """
+    from storage import get_storage
+    from spool import spool
+
+    storage = get_storage()
+    with spool.directory('analysis-') as directory:
+        paths = []
+        for index, key in enumerate(keys):
+            # Keep the extension, analysis picks the extractor from it
+            path = os.path.join(directory, f"{index}{os.path.splitext(key)[1]}")
+            storage.download_file(key, path)
+            spool.record(path)
+            paths.append(path)
+        yield paths
+
+
+@job_handler('health_record')
+def run_health_record_analysis(payload):
+    from gpt_agent import analyze_health_records
+    document_type = payload.get('document_type', 'vet_record')
+    if 'storage_keys' in payload:
+        with stored_files(payload['storage_keys']) as file_paths:
+            return analyze_health_records(file_paths, document_type=document_type)
+    return analyze_health_records(payload['file_paths'], document_type=document_type)
+
+
+@job_handler('poop')
+def run_poop_analysis(payload):
+    from gpt_agent import analyze_poop_image
+    if 'storage_key' in payload:
+        with stored_files([payload['storage_key']]) as (file_path,):
+            return asyncio.run(analyze_poop_image(file_path))
+    return asyncio.run(analyze_poop_image(payload['file_path']))
+
+
+class JobQueue:
+    """
+    Background analysis jobs backed by the analysis_jobs table
+
+    The table is the source of truth for job state, so any instance can
+    answer a status request. Work runs on a local thread pool in the
+    instance that accepted the upload, since that is where the files are.
+    Running jobs are heartbeated; jobs whose heartbeat stops (their worker
+    died) are picked up by recover().
+    """
+
+    def __init__(self, max_workers, stale_minutes=15, recover_interval=300, heartbeat_interval=60):
+        self.max_workers = max_workers
+        self.stale_minutes = stale_minutes
+        self.recover_interval = recover_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._executor = None
+        self._lock = threading.Lock()
+        self._running = {}  # job id -> started_at this instance claimed it with
+        self._recoverer = None
+        self._heartbeat = None
+        self._stop = threading.Event()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+    def enqueue(self, job_type, user_id, pet_id, payload, file_ids=None):
+        """
+        Record a job and hand it to a background worker
+
+        Called during a request, the job joins the request's unit of work and
+        starts when the request commits.
+
+        Args:
+            job_type: Registered handler name (health_record, poop)
+            user_id: Owner of the job
+            pet_id: Pet the analysed files belong to
+            payload: Handler arguments (must be JSON-serializable)
+            file_ids: PetFile ids whose analysis_json receives the result
+
+        Returns:
+            The new job id as a string
+        """
+        from models import AnalysisJob
+        from database import get_db_session, close_db_session, commit_db_session, on_commit
+
+        if job_type not in _handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        db = get_db_session()
+        try:
+            job = AnalysisJob(
+                job_type=job_type,
+                user_id=user_id,
+                pet_id=pet_id,
+                file_ids=[str(file_id) for file_id in (file_ids or [])],
+                payload=payload,
+                status='queued'
+            )
+            db.add(job)
+            commit_db_session(db)
+            job_id = job.id
+            # Inside a request the job row (and the files it refers to) only
+            # exist once the request commits, so start the worker after that
+            on_commit(db, lambda: self._get_executor().submit(self._run, job_id, payload.get('spool_dir')))
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            close_db_session(db)
+
+        logger.info(f"Queued {job_type} job {job_id}")
+        return str(job_id)
+
+    def _claim(self, db, job_id):
+        """
+        Atomically move a queued job to running
+
+        Returns:
+            The started_at the job was claimed with, or None if someone else has it
+        """
+        from models import AnalysisJob
+
+        started_at = datetime.utcnow()
+        claimed = db.query(AnalysisJob).filter(
+            AnalysisJob.id == job_id,
+            AnalysisJob.status == 'queued'
+        ).update({'status': 'running', 'started_at': started_at, 'heartbeat_at': started_at})
+        db.commit()
+        return started_at if claimed == 1 else None
+
+    def heartbeat(self):
+        """Mark this instance's running jobs as alive so recover() leaves them alone"""
+        from models import AnalysisJob
+        from database import session_factory
+
+        with self._lock:
+            running = list(self._running.items())
+        if not running:
+            return
+
+        db = session_factory()
+        try:
+            for job_id, started_at in running:
+                db.query(AnalysisJob).filter(
+                    AnalysisJob.id == job_id,
+                    AnalysisJob.status == 'running',
+                    AnalysisJob.started_at == started_at
+                ).update({'heartbeat_at': datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+
+    def _run(self, job_id, spool_dir=None):
+        """
+        Claim and run one job, recording its outcome
+
+        The outcome is only written while the job is still the run this
+        worker claimed; if recover() handed it on meanwhile, the result is
+        dropped. The job's spool directory (its uploaded files) is removed
+        however the run ends, unless another worker has the job and still
+        needs it.
+        """
+        from models import AnalysisJob, PetFile
+        from database import get_db_session, close_db_session
+
+        release_spool = True
+        started_at = None
+        db = get_db_session()
+        try:
+            started_at = self._claim(db, job_id)
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            if job is None:
+                logger.warning(f"Job {job_id} no longer exists, skipping")
+                return
+            job_type, payload, file_ids = job.job_type, job.payload or {}, job.file_ids or []
+            spool_dir = spool_dir or payload.get('spool_dir')
+            if started_at is None:
+                release_spool = job.status not in ('queued', 'running')
+                logger.info(f"Job {job_id} already claimed, skipping")
+                return
+            with self._lock:
+                self._running[job_id] = started_at
+            # Don't hold a connection open for the length of the analysis
+            db.commit()
+            close_db_session(db)
+            db = None
+
+            try:
+                result = _handlers[job_type](payload)
+                if isinstance(result, dict) and result.get('success') is False:
+                    # Handlers report expected failures (unreadable file, model error) this way
+                    status, error = 'failed', result.get('error') or 'Analysis failed'
+                else:
+                    status, error = 'completed', None
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                result, status, error = None, 'failed', str(e)
+
+            db = get_db_session()
+            finished = db.query(AnalysisJob).filter(
+                AnalysisJob.id == job_id,
+                AnalysisJob.status == 'running',
+                AnalysisJob.started_at == started_at
+            ).update({
+                'status': status,
+                'result': result,
+                'error': error,
+                'finished_at': datetime.utcnow()
+            }, synchronize_session=False)
+            if not finished:
+                # recover() gave the job to another run, which owns its outcome and files
+                release_spool = False
+                db.rollback()
+                logger.warning(f"Job {job_id} was taken over while running, dropping this result")
+                return
+
+            if status == 'completed' and result is not None and file_ids:
+                db.query(PetFile).filter(
+                    PetFile.id.in_([uuid.UUID(file_id) for file_id in file_ids])
+                ).update({'analysis_json': result}, synchronize_session=False)
+
+            db.commit()
+            logger.info(f"Job {job_id} {status}")
+        except Exception as e:
+            if db:
+                db.rollback()
+            logger.error(f"Error running job {job_id}: {e}")
+        finally:
+            close_db_session(db)
+            with self._lock:
+                if started_at is not None and self._running.get(job_id) == started_at:
+                    del self._running[job_id]
+            # Uploaded files are only needed for the analysis
+            if spool_dir and release_spool:
+                from spool import spool
+                spool.release(spool_dir)
+
+    @staticmethod
+    def _files_available(payload):
+        """Whether this instance can still read the files a job analyses"""
+        if 'storage_keys' in payload or 'storage_key' in payload:
+            return True
+        paths = payload.get('file_paths') or [payload.get('file_path')]
+        return all(path and os.path.exists(path) for path in paths)
+
+    def recover(self, limit=100):
+        """
+        Pick up jobs a restarted or crashed worker left queued or running
+
+        A running job's worker heartbeats it every heartbeat_interval, so a
+        job whose heartbeat (or, if queued, creation) is older than
+        stale_minutes has lost its worker. It is requeued and run here when its
+        files can still be read (from storage, or this instance's spool), and
+        marked failed otherwise. Each job is moved with a conditional UPDATE,
+        so instances recovering at the same time don't both take it.
+
+        Returns:
+            (requeued, failed) job counts
+        """
+        from sqlalchemy import func
+        from models import AnalysisJob
+        from database import session_factory
+
+        cutoff = datetime.utcnow() - timedelta(minutes=self.stale_minutes)
+        last_touched = func.coalesce(AnalysisJob.heartbeat_at, AnalysisJob.created_at)
+        requeued, failed = [], 0
+
+        db = session_factory()
+        try:
+            stale = db.query(AnalysisJob.id, AnalysisJob.payload).filter(
+                AnalysisJob.status.in_(['queued', 'running']),
+                last_touched < cutoff
+            ).limit(limit).all()
+
+            for job_id, payload in stale:
+                payload = payload or {}
+                still_stale = db.query(AnalysisJob).filter(
+                    AnalysisJob.id == job_id,
+                    AnalysisJob.status.in_(['queued', 'running']),
+                    last_touched < cutoff
+                )
+                if self._files_available(payload):
+                    # The fresh heartbeat keeps other instances from taking it too
+                    if still_stale.update({'status': 'queued', 'heartbeat_at': datetime.utcnow()},
+                                          synchronize_session=False):
+                        requeued.append((job_id, payload.get('spool_dir')))
+                elif still_stale.update({
+                    'status': 'failed',
+                    'error': 'Interrupted by a restart; please upload the files again',
+                    'finished_at': datetime.utcnow()
+                }, synchronize_session=False):
+                    failed += 1
+                    if payload.get('spool_dir'):
+                        from spool import spool
+                        spool.release(payload['spool_dir'])
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        for job_id, spool_dir in requeued:
+            self._get_executor().submit(self._run, job_id, spool_dir)
+        if requeued or failed:
+            logger.info(f"Recovered {len(requeued)} interrupted jobs, failed {failed}")
+        return len(requeued), failed
+
+    def _recover_loop(self):
+        while True:
+            try:
+                self.recover()
+            except Exception as e:
+                logger.error(f"Job recovery failed: {e}")
+            if self._stop.wait(self.recover_interval):
+                return
+
+    def start_recovery(self):
+        """Recover lost jobs now and then periodically on a daemon thread (once per process)"""
+        with self._lock:
+            if self._recoverer is None:
+                self._recoverer = threading.Thread(target=self._recover_loop, name='job-recovery', daemon=True)
+                self._recoverer.start()
+
+    def get(self, job_id):
+        """Return the job row as a dict, or None if it doesn't exist"""
+        from models import AnalysisJob
+        from database import get_db_session, close_db_session
+
+        db = get_db_session()
+        try:
+            job = db.query(AnalysisJob).filter(AnalysisJob.id == job_id).first()
+            return job.to_dict() if job else None
+        finally:
+            close_db_session(db)
+
+    def shutdown(self, wait=True):
+        self._stop.set()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+job_queue = JobQueue(
+    max_workers=default_config.job_workers,
+    stale_minutes=default_config.job_stale_minutes,
+    recover_interval=default_config.job_recover_interval,
+    heartbeat_interval=default_config.job_heartbeat_interval
+)
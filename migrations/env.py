@@ -0,0 +1,68 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+
+from database import get_database_url
+from models import Base
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Tables created outside the ORM (raw SQL routes, the vet scraper). Their
+# indexes are managed by hand-written migrations, so autogenerate must not
+# propose dropping them.
+RAW_TABLES = {'chat_sessions', 'chat_messages', 'user_matches', 'user_chats', 'rescue_tickets', 'providers'}
+
+# Every container runs `alembic upgrade head` on start; this session-level
+# advisory lock makes concurrent starts apply migrations one at a time. The
+# later ones find the version table already at head and do nothing.
+MIGRATION_LOCK_KEY = 0x70657473
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and compare_to is None:
+        return name not in RAW_TABLES
+    if type_ == 'index' and reflected and compare_to is None:
+        return object.table.name not in RAW_TABLES
+    return True
+
+
+def run_migrations_offline():
+    context.configure(
+        url=get_database_url(),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(get_database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': MIGRATION_LOCK_KEY})
+        # End the implicit transaction so the migrations run in their own
+        connection.commit()
+        try:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+                include_object=include_object
+            )
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': MIGRATION_LOCK_KEY})
+            connection.commit()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,84 @@
+"""Baseline: the tables database.init_db() created before migrations existed
+
+Databases created before migrations existed already have these tables;
+mark them as migrated to this revision instead of running it:
+
+    alembic stamp 0001
+    alembic upgrade head
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('auth0_id', sa.String(255), nullable=False, unique=True),
+        sa.Column('email', sa.String(255), nullable=False, unique=True),
+        sa.Column('first_name', sa.String(100)),
+        sa.Column('last_name', sa.String(100)),
+        sa.Column('user_type', sa.String(50)),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.func.now()),
+        sa.Column('is_admin', sa.Boolean()),
+        sa.Column('avatar_url', sa.String(500)),
+        sa.Column('bio', sa.Text()),
+        sa.Column('city', sa.String(100)),
+        sa.Column('us_state', sa.String(2)),
+        sa.Column('looking_for', postgresql.ARRAY(sa.String())),
+        sa.Column('vet_name', sa.String(200)),
+        sa.Column('vet_phone', sa.String(50)),
+        sa.Column('vet_address', sa.Text())
+    )
+    op.create_table(
+        'pets',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(100)),
+        sa.Column('species', sa.String(50)),
+        sa.Column('breed', sa.String(100)),
+        sa.Column('age_years', sa.Integer()),
+        sa.Column('age_months', sa.Integer()),
+        sa.Column('weight', sa.Float()),
+        sa.Column('health_conditions', sa.Text()),
+        sa.Column('last_checkup', sa.Date()),
+        sa.Column('last_vaccination_date', sa.Date()),
+        sa.Column('state', sa.String(2)),
+        sa.Column('city', sa.String(100)),
+        sa.Column('vet_clinic', sa.String(200)),
+        sa.Column('vet_phone', sa.String(50)),
+        sa.Column('vet_address', sa.Text()),
+        sa.Column('avatar_url', sa.String(500)),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column('is_active', sa.Boolean())
+    )
+    op.create_table(
+        'pet_files',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('pet_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('pets.id'), nullable=False),
+        sa.Column('file_type', sa.String(50)),
+        sa.Column('original_filename', sa.String(255)),
+        sa.Column('s3_path', sa.String(500)),
+        sa.Column('local_path', sa.String(500)),
+        sa.Column('content_type', sa.String(100)),
+        sa.Column('file_size', sa.Integer()),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+        sa.Column('analysis_json', sa.JSON())
+    )
+
+
+def downgrade():
+    for table in ('pet_files', 'pets', 'users'):
+        op.drop_table(table)
@@ -0,0 +1,90 @@
+"""Tables added alongside the baseline: caches, stored objects, jobs, chat threads
+
+    extraction_cache       text extracted from uploads, by content hash
+    training_tips_cache    generated training tips per species/breed
+    stored_objects         content-addressed storage objects
+    analysis_jobs          background analysis jobs
+    chat_threads           reusable assistant threads per user
+
+Databases that ran init_db() after these models were added already have
+some of them, so tables that exist are skipped; every database ends up
+with the same schema either way.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+TABLES = ['extraction_cache', 'training_tips_cache', 'stored_objects', 'analysis_jobs', 'chat_threads']
+
+
+def upgrade():
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'extraction_cache' not in existing_tables:
+        op.create_table(
+            'extraction_cache',
+            sa.Column('cache_key', sa.String(128), primary_key=True),
+            sa.Column('text', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now())
+        )
+    if 'training_tips_cache' not in existing_tables:
+        op.create_table(
+            'training_tips_cache',
+            sa.Column('cache_key', sa.String(255), primary_key=True),
+            sa.Column('species', sa.String(50), nullable=False),
+            sa.Column('breed', sa.String(100), nullable=False),
+            sa.Column('prompt_version', sa.String(20), nullable=False),
+            sa.Column('tips', sa.JSON(), nullable=False),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+            sa.Column('expires_at', sa.TIMESTAMP(), nullable=False)
+        )
+        op.create_index('ix_training_tips_cache_species', 'training_tips_cache', ['species'])
+    if 'stored_objects' not in existing_tables:
+        # last_used_at is added by 0004
+        op.create_table(
+            'stored_objects',
+            sa.Column('content_hash', sa.String(64), primary_key=True),
+            sa.Column('storage_key', sa.String(500), nullable=False, unique=True),
+            sa.Column('size', sa.Integer()),
+            sa.Column('content_type', sa.String(100)),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now())
+        )
+    if 'analysis_jobs' not in existing_tables:
+        op.create_table(
+            'analysis_jobs',
+            sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+            sa.Column('job_type', sa.String(50), nullable=False),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('pet_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('pets.id')),
+            sa.Column('file_ids', sa.JSON()),
+            sa.Column('payload', sa.JSON()),
+            sa.Column('result', sa.JSON()),
+            sa.Column('error', sa.Text()),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+            sa.Column('started_at', sa.TIMESTAMP()),
+            sa.Column('finished_at', sa.TIMESTAMP())
+        )
+    if 'chat_threads' not in existing_tables:
+        op.create_table(
+            'chat_threads',
+            sa.Column('user_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('thread_id', sa.String(100), nullable=False),
+            sa.Column('chat_session_id', postgresql.UUID(as_uuid=True)),
+            sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.func.now()),
+            sa.Column('last_used_at', sa.TIMESTAMP(), server_default=sa.func.now())
+        )
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        op.execute(f'DROP TABLE IF EXISTS {table}')
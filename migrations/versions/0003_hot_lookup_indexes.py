@@ -0,0 +1,63 @@
+"""Indexes for the hot lookup queries
+
+Each index matches a route's WHERE clause and ORDER BY:
+
+    get_pets, home             pets WHERE user_id
+    get_pet_files              pet_files WHERE pet_id [AND file_type] ORDER BY created_at DESC, id DESC
+    delete_pet_file            pet_files WHERE s3_path (reference counting)
+    get_matches                users WHERE city AND us_state; user_matches WHERE user_1 AND user_2
+    get_chats                  user_matches WHERE user_1 OR user_2; user_chats by sender/recipient ORDER BY created_at
+    search_rescues             rescue_tickets WHERE zipcode ORDER BY date DESC
+    search_providers           providers WHERE provider/location ILIKE '%term%' (trigram)
+    get_provider_url           providers WHERE provider
+
+Indexes are built CONCURRENTLY so writes aren't blocked on a live database.
+Raw-SQL tables are skipped when they don't exist yet.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# (index name, table, definition)
+INDEXES = [
+    ('ix_pets_user_id', 'pets', '(user_id)'),
+    ('ix_pet_files_pet_created', 'pet_files', '(pet_id, created_at DESC, id DESC)'),
+    ('ix_pet_files_pet_type_created', 'pet_files', '(pet_id, file_type, created_at DESC, id DESC)'),
+    ('ix_pet_files_s3_path', 'pet_files', '(s3_path)'),
+    ('ix_users_city_us_state', 'users', '(city, us_state)'),
+    ('ix_user_matches_users', 'user_matches', '(user_1, user_2)'),
+    ('ix_user_matches_user_2', 'user_matches', '(user_2)'),
+    ('ix_user_chats_conversation', 'user_chats', '(from_id, to_id, created_at)'),
+    ('ix_rescue_tickets_zipcode_date', 'rescue_tickets', '(zipcode, date DESC)'),
+    ('ix_providers_provider', 'providers', '(provider)'),
+    ('ix_providers_provider_trgm', 'providers', 'USING gin (provider gin_trgm_ops)'),
+    ('ix_providers_location_trgm', 'providers', 'USING gin (location gin_trgm_ops)'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing_tables = set(sa.inspect(bind).get_table_names())
+    if 'providers' in existing_tables:
+        # Substring ILIKE searches can only use trigram indexes
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            if table in existing_tables:
+                op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}')
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,27 @@
+"""Track when a stored object was last claimed by an upload
+
+release_object() keeps objects claimed within content_reuse_grace_minutes,
+so a delete can't remove an object an in-flight upload has just reused.
+Databases that got stored_objects from init_db() may already have it.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('stored_objects')}
+    if 'last_used_at' not in columns:
+        op.add_column('stored_objects', sa.Column('last_used_at', sa.TIMESTAMP(), server_default=sa.func.now()))
+
+
+def downgrade():
+    op.drop_column('stored_objects', 'last_used_at')
@@ -0,0 +1,31 @@
+"""Record every stored avatar rendition on pets and users
+
+avatar_url only holds the card WebP; avatar_renditions keeps the URL of
+each size and format, so replacing an avatar can release all of them.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+TABLES = ['pets', 'users']
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'avatar_renditions' not in columns:
+            op.add_column(table, sa.Column('avatar_renditions', sa.JSON()))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_column(table, 'avatar_renditions')
@@ -0,0 +1,26 @@
+"""Heartbeat running analysis jobs
+
+JobQueue refreshes heartbeat_at while a job runs; recover() only takes
+over jobs whose heartbeat has stopped, not ones that are just slow.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('analysis_jobs')}
+    if 'heartbeat_at' not in columns:
+        op.add_column('analysis_jobs', sa.Column('heartbeat_at', sa.TIMESTAMP()))
+
+
+def downgrade():
+    op.drop_column('analysis_jobs', 'heartbeat_at')
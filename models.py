@@ -1,7 +1,9 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, ForeignKey, DateTime, Date, Text, LargeBinary, TIMESTAMP, JSON, ARRAY
+from sqlalchemy import Column, String, Integer, Float, Boolean, ForeignKey, DateTime, Date, Text, LargeBinary, TIMESTAMP, JSON, ARRAY, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy import and_, cast
 from sqlalchemy.sql import func
 import uuid
 from datetime import datetime
@@ -25,6 +27,7 @@ class User(Base):
     updated_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     is_admin = Column(Boolean, default=False)
     avatar_url = Column(String(500))
+    avatar_renditions = Column(JSON)  # rendition -> format -> URL (see image_ingest)
     bio = Column(Text)
     city = Column(String(100))
     us_state = Column(String(2))
@@ -55,7 +58,7 @@ class Pet(Base):
     __tablename__ = 'pets'
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=generate_uuid)
-    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False, index=True)
     name = Column(String(100))
     species = Column(String(50))
     breed = Column(String(100))
@@ -71,6 +74,7 @@ class Pet(Base):
     vet_phone = Column(String(50))
     vet_address = Column(Text)
     avatar_url = Column(String(500))
+    avatar_renditions = Column(JSON)  # rendition -> format -> URL (see image_ingest)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     is_active = Column(Boolean, default=False)
@@ -125,7 +129,7 @@ class PetFile(Base):
     pet_id = Column(UUID(as_uuid=True), ForeignKey('pets.id'), nullable=False)
     file_type = Column(String(50))  # avatar, health_record, poop
     original_filename = Column(String(255))
-    s3_path = Column(String(500))
+    s3_path = Column(String(500), index=True)  # Shared by files with the same content
     local_path = Column(String(500))
     content_type = Column(String(100))
     file_size = Column(Integer)
@@ -137,9 +141,25 @@ class PetFile(Base):
 
     def __repr__(self):
         return f"<PetFile(id='{self.id}', type='{self.file_type}', filename='{self.original_filename}')>"
+
+    @hybrid_property
+    def has_analysis(self):
+        return self.analysis_json is not None
+
+    @has_analysis.expression
+    def has_analysis(cls):
+        # JSON columns can hold a JSON null as well as SQL NULL
+        return and_(cls.analysis_json.isnot(None), cast(cls.analysis_json, Text) != 'null')
     
-    def to_dict(self):
-        """Convert PetFile to dictionary for API responses"""
+    def to_dict(self, has_analysis=None):
+        """
+        Convert PetFile to dictionary for API responses
+
+        Pass has_analysis (selected with PetFile.has_analysis) when analysis_json
+        is deferred, so it isn't loaded just to be tested.
+        """
+        if has_analysis is None:
+            has_analysis = self.has_analysis
         return {
             'id': str(self.id),
             'pet_id': str(self.pet_id),
@@ -149,5 +169,102 @@ class PetFile(Base):
             'content_type': self.content_type,
             'file_size': self.file_size,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'has_analysis': self.analysis_json is not None
-        }
\ No newline at end of file
+            'has_analysis': bool(has_analysis)
+        }
+
+# Indexes matching the hot route queries (see migrations/versions and
+# tests/test_query_plans.py); existing databases get them from Alembic
+Index('ix_users_city_us_state', User.city, User.us_state)
+Index('ix_pet_files_pet_created', PetFile.pet_id, PetFile.created_at.desc(), PetFile.id.desc())
+Index('ix_pet_files_pet_type_created', PetFile.pet_id, PetFile.file_type, PetFile.created_at.desc(), PetFile.id.desc())
+
+class ExtractionCacheEntry(Base):
+    """Shared cache of text extracted from uploaded files, keyed by content hash"""
+    __tablename__ = 'extraction_cache'
+
+    cache_key = Column(String(128), primary_key=True)
+    text = Column(Text, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ExtractionCacheEntry(key='{self.cache_key}')>"
+
+
+class TrainingTipsCacheEntry(Base):
+    """Generated training tips for a normalized species/breed pair"""
+    __tablename__ = 'training_tips_cache'
+
+    cache_key = Column(String(255), primary_key=True)
+    species = Column(String(50), nullable=False, index=True)
+    breed = Column(String(100), nullable=False)
+    prompt_version = Column(String(20), nullable=False)
+    tips = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    expires_at = Column(TIMESTAMP, nullable=False)
+
+    def __repr__(self):
+        return f"<TrainingTipsCacheEntry(key='{self.cache_key}')>"
+
+class StoredObject(Base):
+    """A content-addressed object in storage, shared by every record with the same bytes"""
+    __tablename__ = 'stored_objects'
+
+    content_hash = Column(String(64), primary_key=True)  # SHA-256 hex digest
+    storage_key = Column(String(500), nullable=False, unique=True)
+    size = Column(Integer)
+    content_type = Column(String(100))
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    last_used_at = Column(TIMESTAMP, server_default=func.now())  # Last upload that reused or stored it
+
+    def __repr__(self):
+        return f"<StoredObject(hash='{self.content_hash}', key='{self.storage_key}')>"
+
+class AnalysisJob(Base):
+    """Background analysis job for uploaded pet files"""
+    __tablename__ = 'analysis_jobs'
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=generate_uuid)
+    job_type = Column(String(50), nullable=False)  # health_record, poop
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=False)
+    pet_id = Column(UUID(as_uuid=True), ForeignKey('pets.id'))
+    file_ids = Column(JSON)
+    payload = Column(JSON)
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    started_at = Column(TIMESTAMP)
+    heartbeat_at = Column(TIMESTAMP)  # Refreshed by the worker while the job runs
+    finished_at = Column(TIMESTAMP)
+
+    def __repr__(self):
+        return f"<AnalysisJob(id='{self.id}', type='{self.job_type}', status='{self.status}')>"
+
+    def to_dict(self):
+        """Convert AnalysisJob to dictionary for API responses"""
+        return {
+            'id': str(self.id),
+            'job_type': self.job_type,
+            'status': self.status,
+            'user_id': str(self.user_id),
+            'pet_id': str(self.pet_id) if self.pet_id else None,
+            'file_ids': self.file_ids or [],
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ChatThread(Base):
+    """A user's ongoing assistant conversation, reused until it goes idle"""
+    __tablename__ = 'chat_threads'
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), primary_key=True)
+    thread_id = Column(String(100), nullable=False)
+    chat_session_id = Column(UUID(as_uuid=True))
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    last_used_at = Column(TIMESTAMP, server_default=func.now())
+
+    def __repr__(self):
+        return f"<ChatThread(user_id='{self.user_id}', thread_id='{self.thread_id}')>"
@@ -0,0 +1,349 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import List
+
+import PyPDF2
+from pdf2image import convert_from_path, pdfinfo_from_path
+
+from config import default_config
+from ocr_preprocess import choose_dpi, preprocess, recognize
+
+logger = logging.getLogger('OCR')
+
+# Bump whenever extraction output changes so cached text is not reused
+EXTRACTOR_VERSION = '2'
+
+# Shared process pool, created on first use so importing this module stays cheap
+_pool = None
+_pool_lock = threading.Lock()
+
+
+@dataclass
+class PageResult:
+    """OCR output and timing for a single PDF page"""
+    page_number: int
+    text: str
+    rasterize_seconds: float = 0.0
+    ocr_seconds: float = 0.0
+    source: str = 'ocr'  # 'ocr' or 'text_layer'
+    dpi: int = None
+    confidence: float = None
+
+    @property
+    def total_seconds(self):
+        return self.rasterize_seconds + self.ocr_seconds
+
+    def to_dict(self):
+        return {
+            'page': self.page_number,
+            'source': self.source,
+            'rasterize_seconds': round(self.rasterize_seconds, 3),
+            'ocr_seconds': round(self.ocr_seconds, 3),
+            'dpi': self.dpi,
+            'confidence': round(self.confidence, 1) if self.confidence is not None else None,
+            'chars': len(self.text)
+        }
+
+
+@dataclass
+class OCRResult:
+    """Ordered page results for a whole document"""
+    pages: List[PageResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def text(self):
+        return "\n\n".join(page.text for page in self.pages)
+
+    def timings(self):
+        """Per-page timing breakdown for logging and diagnostics"""
+        return {
+            'pages': [page.to_dict() for page in self.pages],
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_seconds': round(sum(page.total_seconds for page in self.pages), 3)
+        }
+
+
+def has_usable_text(text, min_chars):
+    """True when an embedded text layer carries enough real characters"""
+    if not text:
+        return False
+    return sum(1 for char in text if char.isalnum()) >= min_chars
+
+
+def read_text_layer(file_path):
+    """
+    Read the embedded text of every PDF page
+
+    Returns:
+        List of page texts in page order ('' for pages that fail to extract)
+    """
+    texts = []
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            try:
+                texts.append(page.extract_text() or "")
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed for a page: {e}")
+                texts.append("")
+    return texts
+
+
+def estimate_page_bytes(file_path, dpi):
+    """
+    Estimate peak memory needed to rasterize and OCR one page
+
+    Uses the first page's size from pdfinfo. An RGB raster is 3 bytes per
+    pixel and tesseract keeps roughly one more copy while recognizing.
+    """
+    info = pdfinfo_from_path(file_path)
+    try:
+        # e.g. "612 x 792 pts (letter)"
+        width_pts, _, height_pts = info['Page size'].split()[:3]
+        width_px = float(width_pts) / 72 * dpi
+        height_px = float(height_pts) / 72 * dpi
+    except (KeyError, ValueError):
+        # Assume US letter when the size can't be read
+        width_px, height_px = 8.5 * dpi, 11 * dpi
+    return int(width_px * height_px * 3 * 2)
+
+
+def iter_page_images(file_path, page_numbers, dpi=200, window=1, temp_root=None):
+    """
+    Rasterize PDF pages lazily, a small window at a time
+
+    Poppler writes each window to a temporary directory and the images are
+    closed as soon as the caller moves on, so at most `window` pages are
+    held in memory.
+
+    Yields:
+        (page_number, PIL image) tuples in the order of page_numbers
+    """
+    with tempfile.TemporaryDirectory(prefix='ocr-', dir=temp_root) as output_folder:
+        for first_page, last_page in _page_windows(page_numbers, window):
+            images = convert_from_path(
+                file_path,
+                dpi=dpi,
+                first_page=first_page,
+                last_page=last_page,
+                output_folder=output_folder,
+                fmt='png'
+            )
+            try:
+                for page_number, image in zip(range(first_page, last_page + 1), images):
+                    yield page_number, image
+                    image.close()
+            finally:
+                for image in images:
+                    image.close()
+                    try:
+                        os.remove(image.filename)
+                    except (AttributeError, OSError):
+                        pass
+
+
+def _page_windows(page_numbers, window):
+    """Split page numbers into runs of consecutive pages, at most `window` long"""
+    window = max(1, window)
+    runs = []
+    for page_number in page_numbers:
+        if runs and page_number == runs[-1][1] + 1 and page_number - runs[-1][0] < window:
+            runs[-1][1] = page_number
+        else:
+            runs.append([page_number, page_number])
+    return [tuple(run) for run in runs]
+
+
+@contextmanager
+def rendered_page(file_path, page_number, dpi, temp_root=None):
+    """Render a single page, releasing the image and its temp file on exit"""
+    pages = iter_page_images(file_path, [page_number], dpi, 1, temp_root)
+    try:
+        _, image = next(pages)
+        yield image
+    finally:
+        pages.close()
+
+
+def _ocr_rendered(file_path, page_number, dpi, config):
+    """Render, preprocess and OCR one page; returns text, confidence and render time"""
+    start = time.perf_counter()
+    with rendered_page(file_path, page_number, dpi, config.raster_temp_dir) as image:
+        image.load()
+        rasterize_seconds = time.perf_counter() - start
+        if config.ocr_preprocess:
+            image = preprocess(image)
+        text, confidence = recognize(image)
+    return text, confidence, rasterize_seconds
+
+
+def _ocr_pages(task):
+    """
+    Probe, rasterize and OCR a run of pages one at a time. Runs in pool workers.
+
+    Each page is first rendered at ocr_probe_dpi to pick its DPI, then
+    rendered, preprocessed and recognized. Pages whose mean confidence is
+    below ocr_confidence_threshold are retried once at a higher DPI.
+    """
+    file_path, page_numbers, config = task
+
+    results = []
+    start = time.perf_counter()
+    probes = iter_page_images(file_path, page_numbers, config.ocr_probe_dpi,
+                              config.raster_window, config.raster_temp_dir)
+    for page_number, probe in probes:
+        dpi = choose_dpi(probe, config.ocr_probe_dpi, config)
+        probe.close()
+
+        text, confidence, rasterize_seconds = _ocr_rendered(file_path, page_number, dpi, config)
+        if confidence < config.ocr_confidence_threshold and dpi < config.ocr_max_dpi:
+            retry_dpi = min(config.ocr_max_dpi, int(dpi * 1.5))
+            retry_text, retry_confidence, retry_seconds = _ocr_rendered(file_path, page_number, retry_dpi, config)
+            rasterize_seconds += retry_seconds
+            logger.info(f"Page {page_number} re-OCRed at {retry_dpi} DPI: "
+                        f"confidence {confidence:.1f} -> {retry_confidence:.1f}")
+            if retry_confidence > confidence:
+                text, confidence, dpi = retry_text, retry_confidence, retry_dpi
+
+        finished = time.perf_counter()
+        results.append(PageResult(
+            page_number=page_number,
+            text=text,
+            rasterize_seconds=rasterize_seconds,
+            ocr_seconds=finished - start - rasterize_seconds,
+            dpi=dpi,
+            confidence=confidence
+        ))
+        start = time.perf_counter()
+    return results
+
+
+def _run_bounded(pool, tasks, limit):
+    """Run tasks in the pool with at most `limit` in flight, keeping order"""
+    results = [None] * len(tasks)
+    pending = {}
+    next_index = 0
+    while next_index < len(tasks) or pending:
+        while next_index < len(tasks) and len(pending) < limit:
+            pending[pool.submit(_ocr_pages, tasks[next_index])] = next_index
+            next_index += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+    return [page for batch in results for page in batch]
+
+
+def _get_pool(max_workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers)
+            logger.info(f"Started OCR process pool with {max_workers} workers")
+        return _pool
+
+
+def shutdown_pool():
+    """Stop the shared OCR pool (used on worker shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+class OCREngine:
+    """Page-parallel OCR for PDF documents"""
+
+    def __init__(self, config=default_config):
+        self.config = config
+        self.max_workers = max(1, config.max_workers)
+
+    def page_count(self, file_path):
+        return int(pdfinfo_from_path(file_path)['Pages'])
+
+    def max_pages_in_flight(self, file_path, dpi):
+        """Pages that can be rasterized at once without passing the memory ceiling"""
+        limit_bytes = self.config.raster_memory_limit_mb * 1024 * 1024
+        try:
+            page_bytes = estimate_page_bytes(file_path, dpi)
+        except Exception as e:
+            logger.warning(f"Could not estimate page size, OCRing one page at a time: {e}")
+            return 1
+        return max(1, min(self.max_workers, limit_bytes // max(1, page_bytes)))
+
+    def ocr_pdf(self, file_path, page_numbers=None):
+        """
+        OCR the given pages of a PDF (all pages by default)
+
+        Pages are rasterized and recognized in the process pool, with the
+        number of pages in flight capped by raster_memory_limit_mb; results
+        come back in page order regardless of completion order.
+
+        Args:
+            file_path: Path to the PDF file
+            page_numbers: Optional list of 1-based page numbers
+
+        Returns:
+            OCRResult with ordered pages and per-page timings
+        """
+        start = time.perf_counter()
+        if page_numbers is None:
+            page_numbers = list(range(1, self.page_count(file_path) + 1))
+
+        # Size the window for the worst case, a retry at the maximum DPI
+        in_flight = self.max_pages_in_flight(file_path, self.config.ocr_max_dpi)
+
+        if len(page_numbers) <= 1 or in_flight == 1:
+            # Stream the pages through this process one window at a time
+            pages = _ocr_pages((file_path, page_numbers, self.config))
+        else:
+            pool = _get_pool(self.max_workers)
+            tasks = [(file_path, [page_number], self.config) for page_number in page_numbers]
+            pages = _run_bounded(pool, tasks, in_flight)
+
+        result = OCRResult(pages=pages, wall_seconds=time.perf_counter() - start)
+        logger.info(f"OCR of {len(pages)} pages took {result.wall_seconds:.2f}s")
+        return result
+
+    def extract_pdf(self, file_path):
+        """
+        Extract PDF text, preferring the embedded text layer
+
+        Each page's embedded text is checked first; only pages without
+        usable text are rasterized and sent through OCR.
+
+        Returns:
+            OCRResult covering every page, in page order
+        """
+        start = time.perf_counter()
+        try:
+            layer_texts = read_text_layer(file_path)
+        except Exception as e:
+            logger.warning(f"Could not read text layer, OCRing all pages: {e}")
+            return self.ocr_pdf(file_path)
+
+        pages = {}
+        needs_ocr = []
+        for page_number, text in enumerate(layer_texts, start=1):
+            if has_usable_text(text, self.config.text_layer_min_chars):
+                pages[page_number] = PageResult(page_number=page_number, text=text, source='text_layer')
+            else:
+                needs_ocr.append(page_number)
+
+        logger.info(f"{len(pages)} of {len(layer_texts)} pages have a text layer, {len(needs_ocr)} need OCR")
+
+        if needs_ocr:
+            for page in self.ocr_pdf(file_path, needs_ocr).pages:
+                pages[page.page_number] = page
+
+        return OCRResult(
+            pages=[pages[number] for number in sorted(pages)],
+            wall_seconds=time.perf_counter() - start
+        )
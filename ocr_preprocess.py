@@ -0,0 +1,125 @@
+import logging
+import statistics
+
+import pytesseract
+from PIL import Image, ImageOps
+
+logger = logging.getLogger('OCRPreprocess')
+
+
+def otsu_threshold(histogram):
+    """Otsu's threshold for a 256-bin grayscale histogram"""
+    total = sum(histogram)
+    if not total:
+        return 127
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+
+    background_weight = 0
+    background_sum = 0
+    best_threshold, best_variance = 127, -1.0
+    for value, count in enumerate(histogram):
+        background_weight += count
+        if background_weight == 0:
+            continue
+        foreground_weight = total - background_weight
+        if foreground_weight == 0:
+            break
+        background_sum += value * count
+        background_mean = background_sum / background_weight
+        foreground_mean = (weighted_total - background_sum) / foreground_weight
+        variance = background_weight * foreground_weight * (background_mean - foreground_mean) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+
+def binarize(gray):
+    """Black text on a white background using a global Otsu threshold"""
+    threshold = otsu_threshold(gray.histogram())
+    return gray.point(lambda value: 255 if value > threshold else 0)
+
+
+def estimate_skew(gray, max_angle=5.0, step=0.5):
+    """
+    Estimate page skew in degrees with a projection profile search
+
+    Text lines are sharpest (highest row-to-row variation of ink) when the
+    page is level, so the angle that maximizes that variation wins.
+    """
+    small = gray.copy()
+    small.thumbnail((800, 800))
+    # Invert so text is bright and the rotation fill adds no ink
+    ink = ImageOps.invert(binarize(small))
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_angle / step)
+    for index in range(-steps, steps + 1):
+        angle = index * step
+        rotated = ink.rotate(angle, resample=Image.BILINEAR, fillcolor=0)
+        # Averaging each row down to one pixel gives the horizontal projection
+        rows = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        score = sum((rows[i + 1] - rows[i]) ** 2 for i in range(len(rows) - 1))
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+
+def preprocess(image, min_skew=0.5):
+    """Grayscale, deskew and binarize a page image for tesseract"""
+    gray = ImageOps.autocontrast(ImageOps.grayscale(image), cutoff=1)
+    angle = estimate_skew(gray)
+    if abs(angle) >= min_skew:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return binarize(gray)
+
+
+def _words(data):
+    for index, word in enumerate(data['text']):
+        confidence = float(data['conf'][index])
+        if word.strip() and confidence >= 0:
+            yield index, word, confidence
+
+
+def choose_dpi(probe_image, probe_dpi, config):
+    """
+    Pick a rendering DPI from a low-resolution probe of the page
+
+    Tesseract is most accurate when text is around
+    ocr_target_text_height pixels tall, so the probe's median word height
+    is scaled to that size and clamped to the configured DPI range.
+    """
+    data = pytesseract.image_to_data(probe_image, output_type=pytesseract.Output.DICT)
+    heights = [data['height'][index] for index, word, _ in _words(data) if len(word.strip()) > 1]
+    if not heights:
+        return config.ocr_dpi
+
+    dpi = probe_dpi * config.ocr_target_text_height / statistics.median(heights)
+    dpi = int(round(dpi / 50.0) * 50)
+    return max(config.ocr_min_dpi, min(config.ocr_max_dpi, dpi))
+
+
+def recognize(image):
+    """
+    OCR an image, returning its text and mean word confidence
+
+    Text is rebuilt from image_to_data so one tesseract pass yields both.
+    """
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    lines = {}
+    confidences = []
+    for index, word, confidence in _words(data):
+        key = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+        lines.setdefault(key, []).append(word)
+        confidences.append(confidence)
+
+    text_lines = []
+    previous_paragraph = None
+    for (block, paragraph, _), words in sorted(lines.items()):
+        if previous_paragraph is not None and previous_paragraph != (block, paragraph):
+            text_lines.append("")
+        text_lines.append(" ".join(words))
+        previous_paragraph = (block, paragraph)
+
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return "\n".join(text_lines), confidence
@@ -0,0 +1,25 @@
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime
+
+
+def encode_file_cursor(pet_file):
+    """Opaque cursor for the page after this file (newest-first order)"""
+    position = json.dumps([pet_file.created_at.isoformat(), str(pet_file.id)])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_file_cursor(cursor):
+    """
+    (created_at, id) from a cursor made by encode_file_cursor
+
+    Raises:
+        ValueError if the cursor is malformed
+    """
+    try:
+        created_at, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), uuid.UUID(file_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"Invalid cursor: {e}")
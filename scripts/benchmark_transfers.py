@@ -0,0 +1,96 @@
+"""
+Compare S3 upload throughput across multipart chunk sizes
+
+Runs against moto's in-process S3, so no AWS account is needed:
+
+    pip install "moto[s3]"
+    python scripts/benchmark_transfers.py --size-mb 200 --chunks 5 8 16 32 64
+
+moto keeps objects in memory, so the numbers show the client-side cost of
+each setting (part count, request overhead, concurrency) rather than real
+network throughput. Point AWS_ENDPOINT_URL at a MinIO or LocalStack server
+and pass --no-mock to measure against a real network stack.
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BUCKET = 'mypetlink-benchmark'
+
+
+def make_file(directory, size_mb):
+    path = os.path.join(directory, f"benchmark-{size_mb}mb.bin")
+    with open(path, 'wb') as file:
+        for _ in range(size_mb):
+            file.write(os.urandom(1024 * 1024))
+    return path
+
+
+def run(args, directory):
+    from config import default_config
+    from storage import S3Storage
+
+    file_path = make_file(directory, args.size_mb)
+    storage = S3Storage(default_config)
+    if not storage.verify():
+        storage.s3_client.create_bucket(Bucket=BUCKET)
+
+    print(f"{'chunk MB':>8} {'mode':>10} {'seconds':>8} {'MB/s':>8}")
+    for chunk_mb in args.chunks:
+        for mode in ('resumable', 'boto3'):
+            config = dataclasses.replace(
+                default_config,
+                s3_multipart_threshold_mb=0 if mode == 'resumable' else chunk_mb,
+                s3_multipart_chunksize_mb=chunk_mb,
+                s3_max_concurrency=args.concurrency,
+                s3_resume_dir=os.path.join(directory, 'resume')
+            )
+            storage = S3Storage(config)
+            timings = []
+            for run_number in range(args.repeat):
+                key = f"benchmark/{chunk_mb}-{mode}-{run_number}"
+                start = time.perf_counter()
+                if mode == 'resumable':
+                    storage.put_file(file_path, key)
+                else:
+                    storage.s3_client.upload_file(file_path, BUCKET, key, Config=storage.transfer_config)
+                timings.append(time.perf_counter() - start)
+                storage.remove(key)
+            seconds = min(timings)
+            print(f"{chunk_mb:>8} {mode:>10} {seconds:>8.2f} {args.size_mb / seconds:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark S3 multipart chunk sizes')
+    parser.add_argument('--size-mb', type=int, default=100, help='Size of the test file')
+    parser.add_argument('--chunks', type=int, nargs='+', default=[5, 8, 16, 32, 64], help='Chunk sizes in MB')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parts uploaded at once')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per setting (best is reported)')
+    parser.add_argument('--no-mock', action='store_true', help='Use the configured endpoint instead of moto')
+    args = parser.parse_args()
+
+    os.environ['S3_BUCKET_NAME'] = BUCKET
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+
+    with tempfile.TemporaryDirectory(prefix='transfer-benchmark-') as directory:
+        if args.no_mock:
+            run(args, directory)
+            return
+        try:
+            from moto import mock_aws
+        except ImportError:
+            # moto < 5
+            from moto import mock_s3 as mock_aws
+        with mock_aws():
+            run(args, directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import fcntl
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from config import default_config
+
+logger = logging.getLogger('Spool')
+
+LOCK_FILENAME = '.active'
+
+
+class SpoolFullError(Exception):
+    """The spool is over its size limit and nothing can be swept"""
+
+
+class SpoolManager:
+    """
+    Per-request scratch directories for uploaded files
+
+    Every request gets its own directory, so same-named uploads can't collide.
+    The owner holds a lock on a marker file inside it until release(); the
+    sweeper only removes unlocked directories, which belong to requests that
+    finished without cleaning up or to processes that died. Locks are
+    released by the OS when a process exits, so this works across gunicorn
+    workers sharing the same root.
+    """
+
+    def __init__(self, root, max_bytes, max_age_seconds, sweep_interval):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._locks = {}
+        self._sizes = {}  # directory -> bytes recorded in it by this process
+        self._usage = None  # bytes in the spool, measured lazily on first use
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config=default_config):
+        return cls(
+            config.spool_dir,
+            config.spool_max_bytes,
+            config.spool_max_age_minutes * 60,
+            config.spool_sweep_interval
+        )
+
+    def create(self, prefix='request-'):
+        """
+        Make a new scratch directory owned by this process
+
+        Raises:
+            SpoolFullError if the spool is still over max_bytes after a sweep
+        """
+        if self.usage() > self.max_bytes:
+            # sweep() re-measures, catching up on other processes' files
+            self.sweep()
+            if self.usage() > self.max_bytes:
+                raise SpoolFullError("Upload spool is full, try again shortly")
+
+        path = tempfile.mkdtemp(prefix=prefix, dir=self.root)
+        lock_file = open(os.path.join(path, LOCK_FILENAME), 'w')
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with self._lock:
+            self._locks[path] = lock_file
+        return path
+
+    def record(self, path):
+        """
+        Count a file just written into a spool directory towards usage
+
+        Returns:
+            The file's size in bytes
+        """
+        size = os.path.getsize(path)
+        directory = os.path.dirname(path)
+        with self._lock:
+            self._sizes[directory] = self._sizes.get(directory, 0) + size
+            if self._usage is not None:
+                self._usage += size
+        return size
+
+    def release(self, path):
+        """Delete a scratch directory created by create()"""
+        if not path or os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.root):
+            logger.warning(f"Refusing to release {path}, it is not a spool directory")
+            return
+        with self._lock:
+            lock_file = self._locks.pop(path, None)
+            size = self._sizes.pop(path, 0)
+            if self._usage is not None:
+                self._usage = max(0, self._usage - size)
+        shutil.rmtree(path, ignore_errors=True)
+        if lock_file:
+            lock_file.close()
+
+    @contextmanager
+    def directory(self, prefix='request-'):
+        """Scratch directory for the duration of a with block"""
+        path = self.create(prefix)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _entries(self):
+        """(mtime, bytes, path) for each spool directory"""
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            path = os.path.join(self.root, name)
+            total = 0
+            try:
+                mtime = os.stat(path).st_mtime
+                for directory, _, filenames in os.walk(path):
+                    for filename in filenames:
+                        try:
+                            total += os.path.getsize(os.path.join(directory, filename))
+                        except OSError:
+                            pass
+            except OSError:
+                continue
+            entries.append((mtime, total, path))
+        return entries
+
+    def usage(self):
+        """Bytes currently held in the spool, as of the last sweep plus files recorded since"""
+        with self._lock:
+            usage = self._usage
+        if usage is None:
+            usage = sum(size for _, size, _ in self._entries())
+            with self._lock:
+                if self._usage is None:
+                    self._usage = usage
+                usage = self._usage
+        return usage
+
+    def _in_use(self, path):
+        """True if some process still holds the directory's lock"""
+        try:
+            with open(os.path.join(path, LOCK_FILENAME), 'a') as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return True
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                return False
+        except OSError:
+            # No marker (not a spool directory, or half-created); treat as abandoned
+            return False
+
+    def sweep(self):
+        """
+        Remove abandoned directories older than max_age, then the oldest
+        abandoned ones until the spool fits max_bytes
+
+        Returns:
+            Number of directories removed
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        cutoff = time.time() - self.max_age_seconds
+        removed = 0
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                continue
+            if path in self._locks or self._in_use(path):
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+            total -= size
+            removed += 1
+            with self._lock:
+                self._sizes.pop(path, None)
+        with self._lock:
+            self._usage = total
+        if removed:
+            logger.info(f"Swept {removed} spool entries, {total} bytes remain")
+        return removed
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Spool sweep failed: {e}")
+
+    def start_sweeper(self):
+        """Sweep periodically on a daemon thread (once per process)"""
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name='spool-sweeper', daemon=True)
+                self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+
+spool = SpoolManager.from_config()
@@ -111,6 +111,71 @@ function switchTab(tabName) {
     }
 }
 
+// Poll a background analysis job until it finishes
+async function waitForJob(jobId, { interval = 2000, timeout = 5 * 60 * 1000 } = {}) {
+    const deadline = Date.now() + timeout;
+    while (Date.now() < deadline) {
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        if (!job.success) {
+            throw new Error(job.error || 'Failed to check analysis status');
+        }
+        if (job.status === 'completed') {
+            return job.result;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Analysis failed');
+        }
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+    throw new Error('Analysis is taking longer than expected. Check your pet files later for the result.');
+}
+
+// Upload files straight to S3 with presigned forms, then register them for analysis.
+// Resolves to null when the server can't presign, so callers fall back to posting through the app.
+async function uploadDirect(files, fileType) {
+    files = Array.from(files);
+    const presignResponse = await fetch('/uploads/presign', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            file_type: fileType,
+            files: files.map(file => ({
+                filename: file.name,
+                content_type: file.type || 'application/octet-stream',
+                size: file.size
+            }))
+        })
+    });
+    if (presignResponse.status === 501) {
+        return null;
+    }
+    const presign = await presignResponse.json();
+    if (!presign.success) {
+        throw new Error(presign.error || 'Failed to start upload');
+    }
+
+    await Promise.all(presign.uploads.map(async (upload, index) => {
+        const form = new FormData();
+        Object.entries(upload.fields).forEach(([name, value]) => form.append(name, value));
+        form.append('file', files[index]);  // S3 requires the file to be the last field
+        const response = await fetch(upload.url, { method: 'POST', body: form });
+        if (!response.ok) {
+            throw new Error(`Failed to upload ${files[index].name}`);
+        }
+    }));
+
+    const finalizeResponse = await fetch('/uploads/finalize', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            file_type: fileType,
+            uploads: presign.uploads.map(upload => ({ key: upload.key, filename: upload.filename }))
+        })
+    });
+    return finalizeResponse.json();
+}
+
 // File upload handling
 function handleFiles(files) {
     if (!files.length) return;
@@ -122,13 +187,19 @@ function handleFiles(files) {
 
     showLoading('documents');
 
-    fetch('/upload', {
+    uploadDirect(files, 'health_record')
+    .then(data => data || fetch('/upload', {
         method: 'POST',
         body: formData
+    }).then(response => response.json()))
+    .then(data => {
+        if (!data.success) {
+            throw new Error(data.error || 'Failed to upload documents');
+        }
+        return waitForJob(data.job_id);
     })
-    .then(response => response.json())
     .then(data => {
-        if (data.success) {
+        if (data && data.success) {
             const analysisResult = document.getElementById('analysisResult');
             document.getElementById('synopsis').innerHTML = data.result.synopsis;
             document.getElementById('insights-anomalies').innerHTML = data.result.insights_anomalies;
@@ -145,7 +216,7 @@ function handleFiles(files) {
             
             analysisResult.scrollIntoView({ behavior: 'smooth' });
         } else {
-            throw new Error(data.error || 'Failed to analyze documents');
+            throw new Error((data && data.error) || 'Failed to analyze documents');
         }
     })
     .catch(error => {
@@ -209,18 +280,21 @@ document.addEventListener('DOMContentLoaded', function() {
             
             showLoading('poop');
             
-            fetch('/analyze_poop', {
+            uploadDirect([file], 'poop')
+            .then(data => data || fetch('/analyze_poop', {
                 method: 'POST',
                 body: formData
-            })
-            .then(response => response.json())
+            }).then(response => response.json()))
             .then(data => {
-                console.log('Poop analysis API response:', data);  // Add logging to see the response structure
+                if (!data.success) {
+                    throw new Error(data.error || 'Failed to upload image');
+                }
+                return waitForJob(data.job_id);
+            })
+            .then(results => {
+                console.log('Poop analysis result:', results);
                 
-                // Check if data contains summary/concerns/recommendations directly or in result property
-                if (data.success) {
-                    // Get results from data.result if it exists, otherwise from data directly
-                    const results = data.result || data;
+                if (results) {
                     
                     document.getElementById('poopSummary').innerHTML = formatSection(results.summary);
                     document.getElementById('poopConcerns').innerHTML = formatSection(results.concerns);
@@ -230,7 +304,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     // Scroll to results
                     document.getElementById('poopAnalysisResult').scrollIntoView({ behavior: 'smooth' });
                 } else {
-                    throw new Error(data.error || 'Failed to analyze image');
+                    throw new Error('Failed to analyze image');
                 }
             })
             .catch(error => {
@@ -257,29 +331,7 @@ document.addEventListener('DOMContentLoaded', function() {
             addMessageToChat(message, 'user');
             chatInput.value = '';
 
-            showLoading('chat');
-
-            try {
-                const response = await fetch('/chat', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({ message })
-                });
-
-                const data = await response.json();
-                if (data.success) {
-                    addMessageToChat(data.response, 'assistant');
-                } else {
-                    throw new Error(data.error || 'Failed to get response');
-                }
-            } catch (error) {
-                console.error('Chat error:', error);
-                addMessageToChat('Sorry, I encountered an error. Please try again.', 'assistant');
-            } finally {
-                hideLoading();
-            }
+            await sendChatMessage(message);
         });
     }
 
@@ -412,14 +464,24 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // Chat functionality
 function addMessageToChat(message, role = 'user') {
+    const messageDiv = createChatMessage(role);
+    if (messageDiv) renderChatMessage(messageDiv, message);
+    return messageDiv;
+}
+
+function createChatMessage(role = 'user') {
     const chatMessages = document.getElementById('chat-messages');
-    if (!chatMessages) return;
+    if (!chatMessages) return null;
 
     const messageDiv = document.createElement('div');
     messageDiv.className = role === 'assistant' ? 
         'bg-blue-50 p-4 rounded-lg chat-message' : 
         'bg-gray-50 p-4 rounded-lg chat-message';
+    chatMessages.appendChild(messageDiv);
+    return messageDiv;
+}
 
+function renderChatMessage(messageDiv, message) {
     // Convert line breaks and format lists
     const formattedMessage = message
         .replace(/\n\n/g, '<br><br>')
@@ -427,10 +489,79 @@ function addMessageToChat(message, role = 'user') {
         .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
 
     messageDiv.innerHTML = `<div class="prose max-w-none text-gray-700">${formattedMessage}</div>`;
-    chatMessages.appendChild(messageDiv);
+    const chatMessages = document.getElementById('chat-messages');
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// Send a chat message and render the assistant's reply as it streams in (SSE)
+async function sendChatMessage(message) {
+    showLoading('chat');
+
+    let messageDiv = null;
+    let reply = '';
+
+    try {
+        const response = await fetch('/chat', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify({ message, stream: true })
+        });
+
+        if (!response.ok || !response.body) {
+            const data = await response.json().catch(() => ({}));
+            throw new Error(data.error || 'Failed to get response');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Events are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let eventName = 'message';
+                let eventData = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) eventData += line.slice(5).trim();
+                });
+                const payload = eventData ? JSON.parse(eventData) : {};
+
+                if (eventName === 'delta') {
+                    if (!messageDiv) {
+                        hideLoading();
+                        messageDiv = createChatMessage('assistant');
+                    }
+                    reply += payload.text;
+                    renderChatMessage(messageDiv, reply);
+                } else if (eventName === 'done') {
+                    reply = payload.response || reply;
+                    if (!messageDiv) messageDiv = createChatMessage('assistant');
+                    renderChatMessage(messageDiv, reply);
+                } else if (eventName === 'error') {
+                    throw new Error(payload.error || 'Failed to get response');
+                }
+            }
+        }
+    } catch (error) {
+        console.error('Chat error:', error);
+        addMessageToChat('Sorry, I encountered an error. Please try again.', 'assistant');
+    } finally {
+        hideLoading();
+    }
+}
+
 // Update suggested prompts based on context
 function updateSuggestedPrompts(context = 'default') {
     const promptsContainer = document.getElementById('suggestedPrompts');
@@ -536,29 +667,7 @@ async function useSuggestedPrompt(prompt) {
     addMessageToChat(prompt, 'user');
     chatInput.value = '';
 
-    showLoading('chat');  // Use chat context for loading message
-
-    try {
-        const response = await fetch('/chat', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ message: prompt })
-        });
-
-        const data = await response.json();
-        if (data.success) {
-            addMessageToChat(data.response, 'assistant');
-        } else {
-            throw new Error(data.error || 'Failed to get response');
-        }
-    } catch (error) {
-        console.error('Chat error:', error);
-        addMessageToChat('Sorry, I encountered an error. Please try again.', 'assistant');
-    } finally {
-        hideLoading();
-    }
+    await sendChatMessage(prompt);
 }
 
 // Add this with the other utility functions
@@ -664,20 +773,29 @@ function selectActivePet(petId) {
     });
 }
 
-// Function to fetch pet files and display in UI
-function loadPetFiles(petId, fileType = null) {
+// Function to fetch pet files and display in UI (one page at a time)
+function loadPetFiles(petId, fileType = null, cursor = null, loadedFiles = []) {
     if (!petId) return;
     
-    let url = `/get_pet_files/${petId}`;
+    const params = new URLSearchParams();
     if (fileType) {
-        url += `?type=${fileType}`;
+        params.set('type', fileType);
     }
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    const query = params.toString();
+    const url = `/get_pet_files/${petId}` + (query ? `?${query}` : '');
     
     fetch(url)
         .then(response => response.json())
         .then(data => {
             if (data.success) {
-                displayPetFiles(data.files, fileType);
+                const files = loadedFiles.concat(data.files);
+                displayPetFiles(files, fileType);
+                if (data.next_cursor) {
+                    addLoadMoreFilesButton(petId, fileType, data.next_cursor, files);
+                }
             } else {
                 throw new Error(data.error || 'Failed to fetch pet files');
             }
@@ -691,6 +809,22 @@ function loadPetFiles(petId, fileType = null) {
         });
 }
 
+// Append a button that fetches the next page of files
+function addLoadMoreFilesButton(petId, fileType, cursor, loadedFiles) {
+    const fileContainer = document.getElementById('pet-files-container');
+    if (!fileContainer) return;
+
+    const button = document.createElement('button');
+    button.className = 'mt-4 w-full py-2 text-sm text-gray-600 bg-gray-100 rounded-lg hover:bg-gray-200';
+    button.textContent = 'Load more';
+    button.addEventListener('click', () => {
+        button.disabled = true;
+        button.textContent = 'Loading...';
+        loadPetFiles(petId, fileType, cursor, loadedFiles);
+    });
+    fileContainer.appendChild(button);
+}
+
 // Function to display pet files in the UI
 function displayPetFiles(files, fileType) {
     const fileContainer = document.getElementById('pet-files-container');
@@ -765,7 +899,7 @@ function displayPetFiles(files, fileType) {
                     previewImage(filePath, fileName);
                 }
             } else if (fileType === 'poop') {
-                previewImage(filePath, fileName, true); // true indicates analysis is available
+                previewImage(filePath, fileName, true, fileId); // true indicates analysis is available
             }
         });
     });
@@ -819,7 +953,7 @@ function getFilesHTML(files) {
 }
 
 // Function to preview an image
-function previewImage(imagePath, fileName, hasAnalysis = false) {
+function previewImage(imagePath, fileName, hasAnalysis = false, fileId = null) {
     // Create modal for image preview
     const modal = document.createElement('div');
     modal.className = 'fixed inset-0 bg-black bg-opacity-75 flex items-center justify-center z-50 p-4';
@@ -872,32 +1006,45 @@ function previewImage(imagePath, fileName, hasAnalysis = false) {
         }
     });
     
-    // If there's analysis, fetch it
-    if (hasAnalysis) {
-        // This would be a call to get the analysis from the backend
-        // For now, we'll just simulate with a placeholder
-        
-        setTimeout(() => {
-            const analysisContent = document.getElementById('analysis-content');
-            if (analysisContent) {
+    // If there's analysis, fetch it (the file list doesn't include it)
+    if (hasAnalysis && fileId) {
+        fetch(`/pet_files/${fileId}/analysis`)
+            .then(response => response.json())
+            .then(data => {
+                const analysisContent = document.getElementById('analysis-content');
+                if (!analysisContent) return;
+                if (!data.success) {
+                    throw new Error(data.error || 'Failed to fetch analysis');
+                }
+                const analysis = data.analysis;
+                if (!analysis) {
+                    analysisContent.innerHTML = '<p class="text-gray-500 italic">No analysis available yet.</p>';
+                    return;
+                }
                 analysisContent.innerHTML = `
                     <div class="space-y-3">
                         <div>
                             <h5 class="font-medium">Summary</h5>
-                            <p>Normal healthy stool sample with good consistency.</p>
+                            ${formatSection(analysis.summary)}
                         </div>
                         <div>
                             <h5 class="font-medium">Concerns</h5>
-                            <p>No concerns detected in this sample.</p>
+                            ${formatSection(analysis.concerns)}
                         </div>
                         <div>
                             <h5 class="font-medium">Recommendations</h5>
-                            <p>Continue with current diet and monitoring routine.</p>
+                            ${formatSection(analysis.recommendations)}
                         </div>
                     </div>
                 `;
-            }
-        }, 1000);
+            })
+            .catch(error => {
+                console.error('Error fetching analysis:', error);
+                const analysisContent = document.getElementById('analysis-content');
+                if (analysisContent) {
+                    analysisContent.innerHTML = `<p class="text-red-500">Error loading analysis: ${error.message}</p>`;
+                }
+            });
     }
 }
 
@@ -1,224 +1,505 @@
 import os
 import boto3
 import logging
+import mimetypes
+import shutil
+import threading
+import time
 import uuid
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 
+from config import default_config
+from content_store import (claim_object, content_key, file_sha256, is_content_key, record_object,
+                           release_object, stream_sha256, unreferenced_keys)
+from transfers import MB, ResumableUpload, abort_stale_uploads, transfer_config
+
 logger = logging.getLogger('Storage')
 
-class S3Storage:
-    """Service to handle S3 storage operations"""
-    
-    def __init__(self):
-        # Get environment variables with defaults
-        aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY') 
-        aws_region = os.getenv('AWS_REGION', 'us-east-1')
-        self.bucket_name = os.getenv('S3_BUCKET_NAME')
-        
-        # Check for missing environment variables
-        missing_vars = []
-        if not aws_access_key: missing_vars.append('AWS_ACCESS_KEY_ID')
-        if not aws_secret_key: missing_vars.append('AWS_SECRET_ACCESS_KEY')
-        if not self.bucket_name: missing_vars.append('S3_BUCKET_NAME')
-        
-        if missing_vars:
-            logger.warning(f"Missing S3 configuration: {', '.join(missing_vars)}")
-            if not self.bucket_name:
-                raise ValueError("S3_BUCKET_NAME environment variable not set")
-            
-        try:
-            # Initialize S3 client
-            self.s3_client = boto3.client(
-                's3',
-                aws_access_key_id=aws_access_key,
-                aws_secret_access_key=aws_secret_key,
-                region_name=aws_region
-            )
-            
-            # Log S3 configuration
-            logger.info(f"S3 Configuration:")
-            logger.info(f"  Bucket: {self.bucket_name}")
-            logger.info(f"  Region: {aws_region}")
-            
-            # Verify bucket exists and is accessible
-            try:
-                self.s3_client.head_bucket(Bucket=self.bucket_name)
-                logger.info(f"  Bucket verification: Success - bucket {self.bucket_name} exists and is accessible")
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
-                if error_code == '404':
-                    logger.error(f"  Bucket verification failed: Bucket {self.bucket_name} does not exist")
-                elif error_code == '403':
-                    logger.error(f"  Bucket verification failed: No permission to access bucket {self.bucket_name}")
-                else:
-                    logger.error(f"  Bucket verification failed: {str(e)}")
-        except Exception as e:
-            logger.error(f"Failed to initialize S3 client: {str(e)}")
-            # We'll continue without raising an exception and handle errors in the upload methods
-    
+class StorageBackend:
+    """
+    Interface for storing uploaded files
+
+    Routes only use these methods, so S3 can be swapped for the local or
+    in-memory backends (STORAGE_BACKEND=local|memory) in tests and offline
+    benchmarks.
+    """
+
+    def make_key(self, user_id, pet_id, file_type, original_filename):
+        """Unique object key in the user/pet folder structure"""
+        file_ext = os.path.splitext(original_filename or '')[1].lower()
+        return f"{user_id}/{pet_id}/{file_type}/{str(uuid.uuid4())}{file_ext}"
+
+    def fallback_url(self, file_type):
+        """URL returned when an upload fails, so the UI still has something to show"""
+        if file_type == 'avatar':
+            return "/static/img/avatars/default_avatar.png"
+        return f"/static/img/default_{file_type}.png"
+
+    def verify(self):
+        """Check the backend is usable; True if it is"""
+        return True
+
+    def url_for_key(self, key):
+        raise NotImplementedError
+
+    def key_from_url(self, url):
+        raise NotImplementedError
+
+    def put_file(self, file_path, key, content_hash=None):
+        """Store a local file at key; content_hash is its SHA-256 if already known"""
+        raise NotImplementedError
+
+    def put_object(self, file_obj, key):
+        raise NotImplementedError
+
+    def remove(self, key):
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Size and content type of a stored object, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def download_file(self, key, dest_path):
+        """Copy a stored object to a local path"""
+        raise NotImplementedError
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in):
+        """
+        Let a browser upload an object directly, without going through the app
+
+        Returns:
+            Dict with the form 'url' and the 'fields' to post with the file
+
+        Raises:
+            NotImplementedError if the backend can't accept direct uploads
+        """
+        raise NotImplementedError
+
+    def _store_content(self, content_hash, original_filename, put, size):
+        """Reuse the object with this hash if there is one, otherwise put it at its content key"""
+        key = claim_object(content_hash)
+        if key:
+            logger.info(f"Reusing stored object {key} for {original_filename}")
+            return key
+
+        key = content_key(content_hash, original_filename)
+        put(key)
+        record_object(content_hash, key, size, mimetypes.guess_type(original_filename or '')[0])
+        return key
+
     def upload_file(self, file_path, user_id, pet_id, file_type, original_filename=None):
         """
-        Upload a file to S3
-        
+        Store a local file
+
+        Files are stored by content hash, so uploading the same bytes again
+        reuses the existing object instead of writing a new one.
+
         Args:
             file_path: Path to the local file
             user_id: User ID
             pet_id: Pet ID
             file_type: Type of file (avatar, health_record, poop)
             original_filename: Original filename (if provided)
-            
+
         Returns:
-            S3 object URL if successful, None otherwise
+            Object URL if successful, a fallback URL if the upload failed,
+            None if the file does not exist
         """
         if not os.path.exists(file_path):
             logger.error(f"File not found: {file_path}")
             return None
-            
+
+        original_filename = original_filename or file_path
         try:
-            # Generate a unique S3 key in the user/pet folder structure
-            file_ext = os.path.splitext(original_filename or file_path)[1].lower()
-            s3_key = f"{user_id}/{pet_id}/{file_type}/{str(uuid.uuid4())}{file_ext}"
-            
-            # Log detailed debug information
-            logger.info(f"S3 upload details:")
-            logger.info(f"  Bucket: {self.bucket_name}")
-            logger.info(f"  Region: {self.s3_client.meta.region_name}")
-            logger.info(f"  File path: {file_path}")
-            logger.info(f"  S3 key: {s3_key}")
-            
-            # Test if bucket exists
-            try:
-                self.s3_client.head_bucket(Bucket=self.bucket_name)
-                logger.info(f"  Bucket verification: Success - bucket exists")
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
-                if error_code == '404':
-                    logger.error(f"  Bucket verification failed: Bucket {self.bucket_name} does not exist")
-                elif error_code == '403':
-                    logger.error(f"  Bucket verification failed: No access to bucket {self.bucket_name}")
-                else:
-                    logger.error(f"  Bucket verification failed: {error_code}")
-                # Despite error, continue trying the upload - the error might be misleading
-            
-            # Upload the file to S3 (without ACL - bucket policy should handle permissions)
-            self.s3_client.upload_file(
-                file_path, 
-                self.bucket_name, 
-                s3_key
+            content_hash = file_sha256(file_path)
+            key = self._store_content(
+                content_hash,
+                original_filename,
+                lambda key: self.put_file(file_path, key, content_hash=content_hash),
+                os.path.getsize(file_path)
             )
-            
-            # Construct and return the S3 URL
-            region = self.s3_client.meta.region_name
-            # Use the regional endpoint format which works for all regions
-            s3_url = f"https://s3.{region}.amazonaws.com/{self.bucket_name}/{s3_key}"
-                
-            logger.info(f"  Successfully uploaded to: {s3_url}")
-            return s3_url
-        
-        except ClientError as e:
-            error_message = f"Failed to upload {file_path} to {self.bucket_name}/{s3_key}: {e}"
-            logger.error(error_message)
-            
-            # For development purpose, return a local URL instead of failing completely
-            local_url = f"/static/img/avatars/default_avatar.png"
-            logger.info(f"  Falling back to local URL: {local_url}")
-            return local_url
-            
+        except Exception as e:
+            logger.error(f"Failed to store {file_path}: {e}")
+            return self.fallback_url(file_type)
+
+        url = self.url_for_key(key)
+        logger.info(f"Stored {file_path} at {url}")
+        return url
+
     def upload_file_object(self, file_obj, user_id, pet_id, file_type, original_filename=None):
         """
-        Upload a file object (e.g., from a web request) to S3
-        
+        Store a file object (e.g., from a web request)
+
+        Seekable objects are stored by content hash like upload_file; streams
+        that can't be rewound get a unique key under the user/pet folder.
+
         Args:
             file_obj: File object with read() method
             user_id: User ID
             pet_id: Pet ID
             file_type: Type of file (avatar, health_record, poop)
             original_filename: Original filename
-            
+
         Returns:
-            S3 object URL if successful, fallback URL otherwise
+            Object URL if successful, fallback URL otherwise
         """
         try:
-            # Generate a unique S3 key in the user/pet folder structure
-            file_ext = os.path.splitext(original_filename or '')[1].lower()
-            s3_key = f"{user_id}/{pet_id}/{file_type}/{str(uuid.uuid4())}{file_ext}"
-            
-            # Log detailed debug information
-            logger.info(f"S3 upload details (file object):")
-            logger.info(f"  Bucket: {self.bucket_name}")
-            logger.info(f"  Region: {self.s3_client.meta.region_name}")
-            logger.info(f"  Original filename: {original_filename}")
-            logger.info(f"  S3 key: {s3_key}")
-            
-            # Test if bucket exists
-            try:
-                self.s3_client.head_bucket(Bucket=self.bucket_name)
-                logger.info(f"  Bucket verification: Success - bucket exists")
-            except ClientError as e:
-                error_code = e.response['Error']['Code']
-                if error_code == '404':
-                    logger.error(f"  Bucket verification failed: Bucket {self.bucket_name} does not exist")
-                elif error_code == '403':
-                    logger.error(f"  Bucket verification failed: No access to bucket {self.bucket_name}")
-                else:
-                    logger.error(f"  Bucket verification failed: {error_code}")
-                # Despite error, continue trying the upload - the error might be misleading
-            
-            # Upload the file to S3 (without ACL - bucket policy should handle permissions)
-            self.s3_client.upload_fileobj(
-                file_obj, 
-                self.bucket_name, 
-                s3_key
-            )
-            
-            # Construct and return the S3 URL
-            region = self.s3_client.meta.region_name
-            # Use the regional endpoint format which works for all regions
-            s3_url = f"https://s3.{region}.amazonaws.com/{self.bucket_name}/{s3_key}"
-                
-            logger.info(f"  Successfully uploaded to: {s3_url}")
-            return s3_url
-            
-        except ClientError as e:
-            error_message = f"Failed to upload file object to {self.bucket_name}/{s3_key}: {e}"
-            logger.error(error_message)
-            
-            # Determine fallback URL based on file type
-            if file_type == 'avatar':
-                local_url = f"/static/img/avatars/default_avatar.png"
+            if getattr(file_obj, 'seekable', lambda: False)():
+                start = file_obj.tell()
+                content_hash = stream_sha256(file_obj)
+                size = file_obj.seek(0, os.SEEK_END) - start
+                file_obj.seek(start)
+                key = self._store_content(
+                    content_hash,
+                    original_filename,
+                    lambda key: self.put_object(file_obj, key),
+                    size
+                )
             else:
-                local_url = f"/static/img/default_{file_type}.png"
-                
-            logger.info(f"  Falling back to local URL: {local_url}")
-            return local_url
-    
-    def delete_file(self, s3_path):
+                key = self.make_key(user_id, pet_id, file_type, original_filename)
+                self.put_object(file_obj, key)
+        except Exception as e:
+            logger.error(f"Failed to store file object {original_filename}: {e}")
+            return self.fallback_url(file_type)
+
+        url = self.url_for_key(key)
+        logger.info(f"Stored {original_filename} at {url}")
+        return url
+
+    def delete_file(self, path):
         """
-        Delete a file from S3
-        
+        Delete a stored file
+
+        Content-addressed objects can be shared, so they are only removed
+        once no pet file or avatar refers to them. Call this after deleting
+        the record that pointed at the object.
+
         Args:
-            s3_path: S3 path or URL to delete
-            
+            path: Object URL or key to delete
+
         Returns:
-            True if successful, False otherwise
+            True if the object was removed or is still in use, False on error
         """
         try:
-            # Extract the S3 key from the path or URL
-            if s3_path.startswith('http'):
-                # Extract key from URL
-                s3_key = s3_path.split('.amazonaws.com/')[1]
+            key = self.key_from_url(path)
+            if is_content_key(key):
+                # Removes the object only if it is unreferenced and not just claimed
+                release_object(key, self.url_for_key(key), self.remove)
             else:
-                # Assume it's just the key
-                s3_key = s3_path
-                
-            # Delete the object
-            self.s3_client.delete_object(
-                Bucket=self.bucket_name,
-                Key=s3_key
+                self.remove(key)
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting {path}: {e}")
+            return False
+
+    def sweep_unreferenced(self, limit=500):
+        """
+        Remove content-addressed objects that nothing refers to any more
+
+        Returns:
+            Number of objects removed
+        """
+        removed = 0
+        for key in unreferenced_keys(limit):
+            try:
+                if release_object(key, self.url_for_key(key), self.remove):
+                    removed += 1
+            except Exception as e:
+                logger.warning(f"Could not sweep {key}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} unreferenced stored objects")
+        return removed
+
+class S3Storage(StorageBackend):
+    """Service to handle S3 storage operations"""
+
+    def __init__(self, config=default_config):
+        # Get environment variables with defaults
+        aws_access_key = os.getenv('AWS_ACCESS_KEY_ID')
+        aws_secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
+        aws_region = os.getenv('AWS_REGION', 'us-east-1')
+        self.bucket_name = os.getenv('S3_BUCKET_NAME')
+        self.config = config
+        self.transfer_config = transfer_config(config)
+
+        # Check for missing environment variables
+        missing_vars = []
+        if not aws_access_key: missing_vars.append('AWS_ACCESS_KEY_ID')
+        if not aws_secret_key: missing_vars.append('AWS_SECRET_ACCESS_KEY')
+        if not self.bucket_name: missing_vars.append('S3_BUCKET_NAME')
+
+        if missing_vars:
+            logger.warning(f"Missing S3 configuration: {', '.join(missing_vars)}")
+            if not self.bucket_name:
+                raise ValueError("S3_BUCKET_NAME environment variable not set")
+
+        try:
+            # Initialize S3 client. boto3 clients are thread-safe, so one client
+            # (and its connection pool) is shared by every request thread.
+            self.s3_client = boto3.client(
+                's3',
+                aws_access_key_id=aws_access_key,
+                aws_secret_access_key=aws_secret_key,
+                region_name=aws_region,
+                config=BotoConfig(
+                    max_pool_connections=config.s3_max_pool_connections,
+                    tcp_keepalive=config.s3_tcp_keepalive,
+                    connect_timeout=config.s3_connect_timeout,
+                    read_timeout=config.s3_read_timeout,
+                    retries={'max_attempts': config.retry_attempts, 'mode': 'standard'}
+                )
             )
+
+            # Log S3 configuration
+            logger.info(f"S3 Configuration:")
+            logger.info(f"  Bucket: {self.bucket_name}")
+            logger.info(f"  Region: {aws_region}")
+            logger.info(f"  Connection pool: {config.s3_max_pool_connections}")
+            logger.info(f"  Multipart: {config.s3_multipart_chunksize_mb}MB parts above "
+                        f"{config.s3_multipart_threshold_mb}MB, {config.s3_max_concurrency} at a time")
+        except Exception as e:
+            logger.error(f"Failed to initialize S3 client: {str(e)}")
+            # We'll continue without raising an exception and handle errors in the upload methods
+
+    def verify(self):
+        """
+        Check that the bucket exists and is accessible
+
+        Only run at startup; uploads don't probe the bucket first, since a
+        missing bucket or permission problem surfaces as an upload error anyway.
+
+        Returns:
+            True if the bucket is reachable, False otherwise
+        """
+        try:
+            self.s3_client.head_bucket(Bucket=self.bucket_name)
+            logger.info(f"Bucket verification: Success - bucket {self.bucket_name} exists and is accessible")
             return True
-            
         except ClientError as e:
-            logger.error(f"Error deleting file from S3: {e}")
-            return False
\ No newline at end of file
+            error_code = e.response['Error']['Code']
+            if error_code == '404':
+                logger.error(f"Bucket verification failed: Bucket {self.bucket_name} does not exist")
+            elif error_code == '403':
+                logger.error(f"Bucket verification failed: No permission to access bucket {self.bucket_name}")
+            else:
+                logger.error(f"Bucket verification failed: {str(e)}")
+        except Exception as e:
+            logger.error(f"Bucket verification failed: {str(e)}")
+        return False
+
+    def url_for_key(self, key):
+        # Use the regional endpoint format which works for all regions
+        region = self.s3_client.meta.region_name
+        return f"https://s3.{region}.amazonaws.com/{self.bucket_name}/{key}"
+
+    def key_from_url(self, url):
+        if not url.startswith('http'):
+            # Assume it's just the key
+            return url
+        path = url.split('.amazonaws.com/', 1)[1]
+        # Path-style URLs carry the bucket as the first segment
+        bucket_prefix = f"{self.bucket_name}/"
+        return path[len(bucket_prefix):] if path.startswith(bucket_prefix) else path
+
+    def _extra_args(self, key):
+        """Content type, plus long-lived caching for content-addressed objects (they never change)"""
+        extra_args = {}
+        content_type = mimetypes.guess_type(key)[0]
+        if content_type:
+            extra_args['ContentType'] = content_type
+        if is_content_key(key):
+            extra_args['CacheControl'] = 'public, max-age=31536000, immutable'
+        return extra_args
+
+    def put_file(self, file_path, key, content_hash=None):
+        # Upload without ACL - bucket policy should handle permissions
+        if os.path.getsize(file_path) < self.config.s3_multipart_threshold_mb * MB:
+            self.s3_client.upload_file(file_path, self.bucket_name, key,
+                                       ExtraArgs=self._extra_args(key), Config=self.transfer_config)
+            return
+
+        # Large files go up in recorded parts, so a retry only re-sends what's missing
+        upload = ResumableUpload(self.s3_client, self.bucket_name, key, file_path, self.config,
+                                 extra_args=self._extra_args(key), content_hash=content_hash)
+        for attempt in range(1, self.config.retry_attempts + 1):
+            try:
+                upload.upload()
+                return
+            except Exception as e:
+                if attempt == self.config.retry_attempts:
+                    upload.abort()
+                    raise
+                logger.warning(f"Upload of {key} interrupted (attempt {attempt}), resuming: {e}")
+                time.sleep(self.config.retry_delay * attempt)
+
+    def put_object(self, file_obj, key):
+        self.s3_client.upload_fileobj(file_obj, self.bucket_name, key,
+                                      ExtraArgs=self._extra_args(key), Config=self.transfer_config)
+
+    def remove(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=key)
+
+    def stat(self, key):
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return {'size': head['ContentLength'], 'content_type': head.get('ContentType')}
+
+    def download_file(self, key, dest_path):
+        self.s3_client.download_file(self.bucket_name, key, dest_path)
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in):
+        # The policy pins the key, content type and size so the form can't be reused for anything else
+        return self.s3_client.generate_presigned_post(
+            Bucket=self.bucket_name,
+            Key=key,
+            Fields={'Content-Type': content_type},
+            Conditions=[
+                {'Content-Type': content_type},
+                ['content-length-range', 1, max_bytes]
+            ],
+            ExpiresIn=expires_in
+        )
+
+class LocalStorage(StorageBackend):
+    """Stores files on the local filesystem, served from /static when under static/"""
+
+    def __init__(self, root=None, url_prefix=None):
+        self.root = os.path.abspath(root or os.getenv('LOCAL_STORAGE_DIR', os.path.join('static', 'uploads')))
+        self.url_prefix = (url_prefix or os.getenv('LOCAL_STORAGE_URL', '/static/uploads')).rstrip('/')
+        os.makedirs(self.root, exist_ok=True)
+        logger.info(f"Local storage at {self.root}")
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def verify(self):
+        return os.access(self.root, os.W_OK)
+
+    def url_for_key(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def key_from_url(self, url):
+        prefix = f"{self.url_prefix}/"
+        return url[len(prefix):] if url.startswith(prefix) else url
+
+    def put_file(self, file_path, key, content_hash=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def put_object(self, file_obj, key):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            shutil.copyfileobj(file_obj, file)
+
+    def remove(self, key):
+        os.remove(self._path(key))
+
+    def stat(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        return {'size': os.path.getsize(path), 'content_type': mimetypes.guess_type(path)[0]}
+
+    def download_file(self, key, dest_path):
+        shutil.copyfile(self._path(key), dest_path)
+
+class MemoryStorage(StorageBackend):
+    """Keeps files in a dict; for tests and benchmarks that shouldn't touch AWS or disk"""
+
+    URL_PREFIX = 'memory://'
+
+    def __init__(self):
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def url_for_key(self, key):
+        return f"{self.URL_PREFIX}{key}"
+
+    def key_from_url(self, url):
+        return url[len(self.URL_PREFIX):] if url.startswith(self.URL_PREFIX) else url
+
+    def put_file(self, file_path, key, content_hash=None):
+        with open(file_path, 'rb') as file:
+            self.put_object(file, key)
+
+    def put_object(self, file_obj, key):
+        data = file_obj.read()
+        with self._lock:
+            self.objects[key] = data
+
+    def remove(self, key):
+        with self._lock:
+            del self.objects[key]
+
+    def stat(self, key):
+        with self._lock:
+            data = self.objects.get(key)
+        if data is None:
+            return None
+        return {'size': len(data), 'content_type': mimetypes.guess_type(key)[0]}
+
+    def download_file(self, key, dest_path):
+        with self._lock:
+            data = self.objects[key]
+        with open(dest_path, 'wb') as file:
+            file.write(data)
+
+BACKENDS = {
+    's3': S3Storage,
+    'local': LocalStorage,
+    'memory': MemoryStorage
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def create_storage(backend=None):
+    """Build a storage backend by name (ProcessingConfig.storage_backend by default)"""
+    backend = backend or default_config.storage_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return BACKENDS[backend]()
+
+def get_storage():
+    """
+    Return the process-wide storage backend, creating it on first use
+
+    Raises:
+        ValueError if the backend is misconfigured (e.g. S3_BUCKET_NAME not set)
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+def set_storage(storage):
+    """Replace the shared backend, e.g. with MemoryStorage in tests"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
+
+def init_storage():
+    """Create the shared storage backend and verify it once at startup"""
+    try:
+        storage = get_storage()
+        storage.verify()
+        if isinstance(storage, S3Storage):
+            aborted = abort_stale_uploads(storage.s3_client, storage.config)
+            if aborted:
+                logger.info(f"Aborted {aborted} stale multipart uploads")
+        # Deletes that found an object freshly claimed leave it for this sweep
+        threading.Thread(target=storage.sweep_unreferenced, name='storage-sweep', daemon=True).start()
+    except Exception as e:
+        logger.error(f"Storage initialization failed: {str(e)}")
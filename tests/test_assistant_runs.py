@@ -0,0 +1,116 @@
+"""
+Assistants run waiter against a fake OpenAI client
+
+Delays are kept to milliseconds so the backoff and deadline paths run fast.
+"""
+import asyncio
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant_runs import (_Backoff, RunCancelledError, RunFailedError, RunTimeoutError,  # noqa: E402
+                            wait_for_run, wait_for_run_async)
+
+
+class FakeRuns:
+    """client.beta.threads.runs returning a scripted sequence of statuses"""
+
+    def __init__(self, statuses, errors=0):
+        self.statuses = list(statuses)
+        self.errors = errors
+        self.retrieved = 0
+        self.cancelled = []
+
+    def retrieve(self, thread_id, run_id):
+        self.retrieved += 1
+        if self.errors:
+            self.errors -= 1
+            raise ConnectionError('transient')
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return SimpleNamespace(id=run_id, status=status, last_error=None)
+
+    def cancel(self, thread_id, run_id):
+        self.cancelled.append(run_id)
+
+
+def fake_client(runs):
+    return SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+
+
+def test_backoff_doubles_up_to_the_limit_with_jitter():
+    backoff = _Backoff(initial_delay=1.0, max_delay=4.0)
+
+    sleeps = [backoff.next() for _ in range(5)]
+
+    # Equal jitter: each sleep is between half and all of the current delay
+    for sleep, delay in zip(sleeps, [1.0, 2.0, 4.0, 4.0, 4.0]):
+        assert delay / 2 <= sleep <= delay
+
+
+def test_wait_returns_the_completed_run():
+    runs = FakeRuns(['queued', 'in_progress', 'completed'])
+
+    run = wait_for_run(fake_client(runs), 'thread', 'run', timeout=5, initial_delay=0.001, max_delay=0.002)
+
+    assert run.status == 'completed'
+    assert runs.retrieved == 3
+
+
+def test_transient_retrieve_errors_keep_waiting():
+    runs = FakeRuns(['completed'], errors=2)
+
+    run = wait_for_run(fake_client(runs), 'thread', 'run', timeout=5, initial_delay=0.001, max_delay=0.002)
+
+    assert run.status == 'completed'
+
+
+def test_failed_run_raises():
+    runs = FakeRuns(['in_progress', 'failed'])
+
+    with pytest.raises(RunFailedError):
+        wait_for_run(fake_client(runs), 'thread', 'run', timeout=5, initial_delay=0.001, max_delay=0.002)
+
+
+def test_deadline_cancels_the_run():
+    runs = FakeRuns(['in_progress'])
+
+    with pytest.raises(RunTimeoutError):
+        wait_for_run(fake_client(runs), 'thread', 'run', timeout=0.05, initial_delay=0.01, max_delay=0.02)
+
+    assert runs.cancelled == ['run']
+
+
+def test_cancel_event_cancels_the_run():
+    runs = FakeRuns(['in_progress'])
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    with pytest.raises(RunCancelledError):
+        wait_for_run(fake_client(runs), 'thread', 'run', timeout=5, cancel_event=cancel_event,
+                     initial_delay=0.001, max_delay=0.002)
+
+    assert runs.cancelled == ['run']
+
+
+def test_async_wait_returns_the_completed_run():
+    runs = FakeRuns(['in_progress', 'completed'])
+
+    run = asyncio.run(wait_for_run_async(fake_client(runs), 'thread', 'run', timeout=5,
+                                         initial_delay=0.001, max_delay=0.002))
+
+    assert run.status == 'completed'
+
+
+def test_async_deadline_cancels_the_run():
+    runs = FakeRuns(['in_progress'])
+
+    with pytest.raises(RunTimeoutError):
+        asyncio.run(wait_for_run_async(fake_client(runs), 'thread', 'run', timeout=0.05,
+                                       initial_delay=0.01, max_delay=0.02))
+
+    assert runs.cancelled == ['run']
@@ -0,0 +1,87 @@
+"""
+Vision downscaling: target size and the bytes actually uploaded
+"""
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('pyheif')
+pytest.importorskip('sqlalchemy')
+
+from config import ProcessingConfig  # noqa: E402
+from image_ingest import prepare_for_vision, vision_size  # noqa: E402
+
+
+@pytest.fixture
+def config():
+    return ProcessingConfig(vision_max_edge=2048, vision_short_edge=768, vision_jpeg_quality=85)
+
+
+def test_vision_size_fits_the_long_then_the_short_edge(config):
+    assert vision_size(4000, 3000, config) == (1024, 768)
+    assert vision_size(3000, 4000, config) == (768, 1024)
+    # Very wide images are bounded by the long edge first
+    assert vision_size(8000, 1000, config) == (2048, 256)
+
+
+def test_vision_size_never_upscales(config):
+    assert vision_size(640, 480, config) == (640, 480)
+
+
+def save(image, path, image_format, **kwargs):
+    image.save(path, image_format, **kwargs)
+    return str(path)
+
+
+def test_large_image_is_downscaled_to_jpeg(tmp_path, config):
+    path = save(Image.new('RGB', (4000, 3000), (120, 80, 40)), tmp_path / 'stool.png', 'PNG')
+
+    data, stats = prepare_for_vision(path, config)
+
+    uploaded = Image.open(io.BytesIO(data))
+    assert uploaded.format == 'JPEG'
+    assert uploaded.size == (1024, 768)
+    assert stats['uploaded_size'] == [1024, 768]
+    assert stats['uploaded_bytes'] == len(data)
+
+
+def test_transparency_is_flattened_for_jpeg(tmp_path, config):
+    path = save(Image.new('RGBA', (100, 100), (0, 0, 0, 0)), tmp_path / 'stool.png', 'PNG')
+
+    data, _ = prepare_for_vision(path, config)
+
+    uploaded = Image.open(io.BytesIO(data))
+    assert uploaded.mode == 'RGB'
+    assert uploaded.getpixel((50, 50)) == (255, 255, 255)
+
+
+def test_small_jpeg_is_sent_as_is_when_reencoding_would_not_shrink_it(tmp_path, config):
+    # Noise at low quality: re-encoding at vision_jpeg_quality comes out larger
+    noise = Image.frombytes('RGB', (320, 240), os.urandom(320 * 240 * 3))
+    path = save(noise, tmp_path / 'stool.jpg', 'JPEG', quality=30)
+
+    data, stats = prepare_for_vision(path, config)
+
+    with open(path, 'rb') as file:
+        assert data == file.read()
+    assert stats['uploaded_bytes'] == stats['original_bytes']
+
+
+def test_rotated_jpeg_is_reencoded_upright(tmp_path, config):
+    # Stored sideways with "rotate 90° clockwise" (orientation 6), as phones do
+    noise = Image.frombytes('RGB', (320, 240), os.urandom(320 * 240 * 3))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    path = save(noise, tmp_path / 'stool.jpg', 'JPEG', quality=30, exif=exif.tobytes())
+
+    data, stats = prepare_for_vision(path, config)
+
+    with open(path, 'rb') as file:
+        assert data != file.read()
+    assert Image.open(io.BytesIO(data)).size == (240, 320)
+    assert stats['uploaded_size'] == [240, 320]
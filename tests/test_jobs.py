@@ -0,0 +1,180 @@
+"""
+JobQueue against a real Postgres database
+
+Set TEST_DATABASE_URL to a scratch database to run these; they are skipped
+otherwise. Handlers are stubbed, so no OpenAI credentials are needed.
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+
+@pytest.fixture(scope='module')
+def jobs_module():
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+    import jobs
+    from database import init_db
+
+    init_db()
+    jobs._handlers['stub_ok'] = lambda payload: {'success': True}
+    jobs._handlers['stub_failed'] = lambda payload: {'success': False, 'error': 'unreadable'}
+    return jobs
+
+
+@pytest.fixture
+def user_id(jobs_module):
+    """A user to own the test jobs, removed with them after the test"""
+    from database import session_factory
+    from models import User, AnalysisJob
+
+    db = session_factory()
+    user = User(auth0_id=f"test|{uuid.uuid4().hex}", email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+
+    yield user_id
+
+    db = session_factory()
+    db.query(AnalysisJob).filter(AnalysisJob.user_id == user_id).delete()
+    db.query(User).filter(User.id == user_id).delete()
+    db.commit()
+    db.close()
+
+
+def add_job(user_id, job_type, status, payload, age_minutes, file_ids=None):
+    from database import session_factory
+    from models import AnalysisJob
+
+    touched = datetime.utcnow() - timedelta(minutes=age_minutes)
+    db = session_factory()
+    job = AnalysisJob(job_type=job_type, user_id=user_id, status=status, payload=payload,
+                      file_ids=file_ids, created_at=touched, started_at=touched if status == 'running' else None)
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+    return job_id
+
+
+def wait_for_job(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_handler_reported_failure_marks_job_failed(jobs_module, user_id):
+    queue = jobs_module.JobQueue(max_workers=1)
+    job_id = add_job(user_id, 'stub_failed', 'queued', {}, age_minutes=0)
+
+    queue._run(job_id)
+
+    job = queue.get(job_id)
+    assert job['status'] == 'failed'
+    assert job['error'] == 'unreadable'
+
+
+def test_failed_poop_analysis_is_not_stored_as_a_result(jobs_module, user_id):
+    pytest.importorskip('openai')
+    os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+    from database import session_factory
+    from models import Pet, PetFile
+
+    db = session_factory()
+    pet = Pet(user_id=user_id, name='Rex', species='dog')
+    db.add(pet)
+    db.flush()
+    pet_file = PetFile(pet_id=pet.id, file_type='poop', original_filename='stool.jpg')
+    db.add(pet_file)
+    db.commit()
+    pet_id, file_id = pet.id, pet_file.id
+    db.close()
+
+    queue = jobs_module.JobQueue(max_workers=1)
+    # The image can't be read, so analyze_poop_image takes its error path
+    job_id = add_job(user_id, 'poop', 'queued', {'file_path': '/nonexistent/stool.jpg'},
+                     age_minutes=0, file_ids=[str(file_id)])
+    try:
+        queue._run(job_id)
+
+        job = queue.get(job_id)
+        assert job['status'] == 'failed'
+        assert job['error']
+
+        db = session_factory()
+        assert db.get(PetFile, file_id).analysis_json is None
+        db.close()
+    finally:
+        db = session_factory()
+        db.query(PetFile).filter(PetFile.pet_id == pet_id).delete()
+        db.query(Pet).filter(Pet.id == pet_id).delete()
+        db.commit()
+        db.close()
+
+
+def test_result_is_dropped_when_the_job_was_taken_over(jobs_module, user_id):
+    from database import session_factory
+    from models import AnalysisJob
+
+    def taken_over(payload):
+        # Another worker claims the job while this one is still running it
+        db = session_factory()
+        db.query(AnalysisJob).filter(AnalysisJob.id == payload['job_id']).update(
+            {'started_at': datetime.utcnow() + timedelta(seconds=1)})
+        db.commit()
+        db.close()
+        return {'success': True}
+
+    jobs_module._handlers['stub_taken_over'] = taken_over
+    queue = jobs_module.JobQueue(max_workers=1)
+    job_id = add_job(user_id, 'stub_taken_over', 'queued', {}, age_minutes=0)
+    db = session_factory()
+    db.query(AnalysisJob).filter(AnalysisJob.id == job_id).update({'payload': {'job_id': str(job_id)}})
+    db.commit()
+    db.close()
+
+    queue._run(job_id)
+
+    job = queue.get(job_id)
+    assert job['status'] == 'running'
+    assert job['result'] is None
+
+
+def test_recover_requeues_runnable_jobs_and_fails_lost_ones(jobs_module, user_id):
+    from database import session_factory
+    from models import AnalysisJob
+
+    queue = jobs_module.JobQueue(max_workers=1, stale_minutes=15)
+    runnable = add_job(user_id, 'stub_ok', 'running', {'storage_keys': ['content/00/0.txt']}, age_minutes=60)
+    lost = add_job(user_id, 'stub_ok', 'queued', {'file_paths': ['/nonexistent/record.txt']}, age_minutes=60)
+    recent = add_job(user_id, 'stub_ok', 'running', {'storage_keys': ['content/00/0.txt']}, age_minutes=1)
+    # Started long ago, but its worker is still heartbeating it
+    slow = add_job(user_id, 'stub_ok', 'running', {'storage_keys': ['content/00/0.txt']}, age_minutes=60)
+    db = session_factory()
+    db.query(AnalysisJob).filter(AnalysisJob.id == slow).update({'heartbeat_at': datetime.utcnow()})
+    db.commit()
+    db.close()
+
+    queue.recover()
+
+    assert wait_for_job(queue, runnable)['status'] == 'completed'
+    assert queue.get(lost)['status'] == 'failed'
+    assert queue.get(recent)['status'] == 'running'
+    assert queue.get(slow)['status'] == 'running'
+    queue.shutdown()
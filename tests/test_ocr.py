@@ -0,0 +1,50 @@
+"""
+Pure helpers of the OCR engine
+
+These need the PDF libraries importable but no PDF, poppler or tesseract.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('PyPDF2')
+pytest.importorskip('pdf2image')
+
+from ocr import OCRResult, PageResult, _page_windows  # noqa: E402
+
+
+def test_result_text_keeps_page_order():
+    result = OCRResult(pages=[PageResult(1, 'first'), PageResult(2, 'second'), PageResult(3, 'third')])
+
+    assert result.text == 'first\n\nsecond\n\nthird'
+
+
+def test_timings_sum_page_work_separately_from_wall_time():
+    result = OCRResult(pages=[
+        PageResult(1, 'a', rasterize_seconds=0.5, ocr_seconds=1.0),
+        PageResult(2, 'bb', rasterize_seconds=0.25, ocr_seconds=0.75)
+    ], wall_seconds=1.5)
+
+    timings = result.timings()
+
+    assert timings['wall_seconds'] == 1.5
+    assert timings['cpu_seconds'] == 2.5
+    assert [page['page'] for page in timings['pages']] == [1, 2]
+    assert timings['pages'][1]['chars'] == 2
+
+
+def test_page_windows_split_consecutive_pages_into_bounded_runs():
+    assert _page_windows([1, 2, 3, 4, 5], 2) == [(1, 2), (3, 4), (5, 5)]
+
+
+def test_page_windows_break_at_gaps():
+    # Pages with a usable text layer are skipped, leaving gaps
+    assert _page_windows([1, 2, 4, 5, 6, 9], 3) == [(1, 2), (4, 6), (9, 9)]
+
+
+def test_page_windows_are_at_least_one_page():
+    assert _page_windows([3, 4], 0) == [(3, 3), (4, 4)]
+    assert _page_windows([], 4) == []
@@ -0,0 +1,79 @@
+"""
+Thresholding and DPI selection for OCR preprocessing
+
+tesseract itself isn't run: choose_dpi is fed canned image_to_data output.
+"""
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ocr_preprocess  # noqa: E402
+from config import ProcessingConfig  # noqa: E402
+
+
+def test_otsu_threshold_splits_a_bimodal_histogram():
+    histogram = [0] * 256
+    histogram[30] = 500  # ink
+    histogram[220] = 1500  # paper
+
+    threshold = ocr_preprocess.otsu_threshold(histogram)
+
+    assert 30 <= threshold < 220
+
+
+def test_otsu_threshold_of_an_empty_histogram_is_mid_gray():
+    assert ocr_preprocess.otsu_threshold([0] * 256) == 127
+
+
+def test_binarize_leaves_only_black_and_white():
+    image = Image.new('L', (20, 10), 230)
+    for x in range(5, 15):
+        image.putpixel((x, 5), 20)
+
+    binary = ocr_preprocess.binarize(image)
+
+    assert set(binary.histogram()[1:255]) == {0}
+    assert binary.getpixel((10, 5)) == 0
+    assert binary.getpixel((0, 0)) == 255
+
+
+def fake_image_to_data(heights):
+    def image_to_data(image, output_type=None):
+        return {
+            'text': ['word'] * len(heights),
+            'conf': ['90'] * len(heights),
+            'height': list(heights)
+        }
+    return image_to_data
+
+
+@pytest.fixture
+def config():
+    return ProcessingConfig(ocr_dpi=300, ocr_min_dpi=150, ocr_max_dpi=400, ocr_target_text_height=32)
+
+
+def test_choose_dpi_scales_the_median_word_height_to_the_target(monkeypatch, config):
+    # 8px words at 72 DPI need 288 DPI to be 32px tall, rounded to 300
+    monkeypatch.setattr(ocr_preprocess.pytesseract, 'image_to_data', fake_image_to_data([7, 8, 9]))
+
+    assert ocr_preprocess.choose_dpi(Image.new('L', (10, 10)), 72, config) == 300
+
+
+def test_choose_dpi_clamps_to_the_configured_range(monkeypatch, config):
+    probe = Image.new('L', (10, 10))
+
+    monkeypatch.setattr(ocr_preprocess.pytesseract, 'image_to_data', fake_image_to_data([40, 40]))
+    assert ocr_preprocess.choose_dpi(probe, 72, config) == 150
+
+    monkeypatch.setattr(ocr_preprocess.pytesseract, 'image_to_data', fake_image_to_data([2, 2]))
+    assert ocr_preprocess.choose_dpi(probe, 72, config) == 400
+
+
+def test_choose_dpi_falls_back_when_no_words_are_found(monkeypatch, config):
+    monkeypatch.setattr(ocr_preprocess.pytesseract, 'image_to_data', fake_image_to_data([]))
+
+    assert ocr_preprocess.choose_dpi(Image.new('L', (10, 10)), 72, config) == 300
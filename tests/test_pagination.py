@@ -0,0 +1,46 @@
+"""
+Opaque file-list cursors: round trip and malformed input
+"""
+import base64
+import os
+import sys
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pagination import decode_file_cursor, encode_file_cursor  # noqa: E402
+
+
+def test_cursor_round_trips_the_position():
+    pet_file = SimpleNamespace(created_at=datetime(2024, 5, 1, 12, 30, 15, 250000), id=uuid.uuid4())
+
+    assert decode_file_cursor(encode_file_cursor(pet_file)) == (pet_file.created_at, pet_file.id)
+
+
+def test_cursor_is_url_safe():
+    pet_file = SimpleNamespace(created_at=datetime(2024, 5, 1), id=uuid.uuid4())
+
+    cursor = encode_file_cursor(pet_file)
+
+    assert not set(cursor) & set('+/?&')
+
+
+@pytest.mark.parametrize('position', [
+    b'not json',
+    b'["2024-05-01T00:00:00"]',
+    b'["yesterday", "00000000-0000-0000-0000-000000000000"]',
+    b'["2024-05-01T00:00:00", "not-a-uuid"]',
+    b'[1, 2]',
+])
+def test_malformed_positions_raise_value_error(position):
+    with pytest.raises(ValueError):
+        decode_file_cursor(base64.urlsafe_b64encode(position).decode())
+
+
+def test_garbage_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        decode_file_cursor('!!!')
@@ -0,0 +1,126 @@
+"""
+Hot route queries must be served by an index
+
+Runs EXPLAIN for each query below with sequential scans disabled, so the
+planner uses an index whenever one can serve the query, even on a small
+test database. A Seq Scan left in the plan means no index matches the
+query any more; add or fix one in migrations/versions (and models.py).
+
+Set TEST_DATABASE_URL to a scratch database to run these; they are skipped
+otherwise. Queries on raw-SQL tables that don't exist there are skipped.
+"""
+import importlib.util
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+SAMPLE_ID = '00000000-0000-0000-0000-000000000000'
+
+# (route, tables the query reads, SQL, parameters)
+HOT_QUERIES = [
+    ('get_pets', ['pets'],
+     "SELECT * FROM pets WHERE user_id = :user_id",
+     {'user_id': SAMPLE_ID}),
+    ('get_pet_files', ['pet_files'],
+     "SELECT id, created_at FROM pet_files WHERE pet_id = :pet_id "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     {'pet_id': SAMPLE_ID}),
+    ('get_pet_files?type', ['pet_files'],
+     "SELECT id, created_at FROM pet_files WHERE pet_id = :pet_id AND file_type = :file_type "
+     "ORDER BY created_at DESC, id DESC LIMIT 50",
+     {'pet_id': SAMPLE_ID, 'file_type': 'poop'}),
+    ('delete_pet_file', ['pet_files'],
+     "SELECT count(*) FROM pet_files WHERE s3_path = :url",
+     {'url': 'https://example.com/content/00/0'}),
+    ('get_matches', ['users'],
+     "SELECT * FROM users WHERE id != :user_id AND city = :city AND us_state = :state AND looking_for IS NOT NULL",
+     {'user_id': SAMPLE_ID, 'city': 'Austin', 'state': 'TX'}),
+    ('get_matches', ['user_matches'],
+     "SELECT * FROM user_matches WHERE user_1 = :u1 AND user_2 = :u2",
+     {'u1': SAMPLE_ID, 'u2': SAMPLE_ID}),
+    ('get_chats', ['user_matches'],
+     "SELECT * FROM user_matches WHERE user_1_match = true AND user_2_match = true "
+     "AND (user_1 = :uid OR user_2 = :uid)",
+     {'uid': SAMPLE_ID}),
+    ('get_chats', ['user_chats'],
+     "SELECT * FROM user_chats WHERE (from_id = :u1 AND to_id = :u2) OR (from_id = :u2 AND to_id = :u1) "
+     "ORDER BY created_at ASC",
+     {'u1': SAMPLE_ID, 'u2': SAMPLE_ID}),
+    ('search_rescues', ['rescue_tickets'],
+     "SELECT * FROM rescue_tickets WHERE zipcode = :zipcode ORDER BY date DESC",
+     {'zipcode': '78701'}),
+    ('search_providers', ['providers'],
+     "SELECT provider AS name, location, url FROM providers WHERE provider ILIKE :term AND location ILIKE :state",
+     {'term': '%animal%', 'state': '%TX%'}),
+    ('get_provider_url', ['providers'],
+     "SELECT url FROM providers WHERE provider = :provider",
+     {'provider': 'Example Animal Hospital'}),
+]
+
+
+def seq_scans(plan):
+    """Relations read by Seq Scan nodes anywhere in an EXPLAIN (FORMAT JSON) plan"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def load_index_migration():
+    path = os.path.join(ROOT, 'migrations', 'versions', '0003_hot_lookup_indexes.py')
+    spec = importlib.util.spec_from_file_location('hot_lookup_indexes', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def engine():
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+
+    from sqlalchemy import inspect, text
+    from database import engine, init_db
+
+    init_db()
+    # The raw-SQL tables only get their indexes from the migration
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+        if 'providers' in existing_tables:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for name, table, definition in load_index_migration().INDEXES:
+            if table in existing_tables:
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}'))
+    return engine
+
+
+@pytest.mark.parametrize('route, tables, sql, params', HOT_QUERIES,
+                         ids=[f"{route}:{tables[0]}" for route, tables, _, _ in HOT_QUERIES])
+def test_hot_query_uses_an_index(engine, route, tables, sql, params):
+    from sqlalchemy import inspect, text
+
+    missing = [table for table in tables if table not in inspect(engine).get_table_names()]
+    if missing:
+        pytest.skip(f"no table {', '.join(missing)}")
+
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(text("SET LOCAL enable_seqscan = off"))
+            result = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+        finally:
+            transaction.rollback()
+
+    plan = (result if isinstance(result, list) else json.loads(result))[0]['Plan']
+    assert not seq_scans(plan), f"{route} scans {seq_scans(plan)} sequentially:\n{json.dumps(plan, indent=2)}"
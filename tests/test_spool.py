@@ -0,0 +1,95 @@
+"""
+Per-request spool directories: creation, usage accounting and sweeping
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spool import LOCK_FILENAME, SpoolFullError, SpoolManager  # noqa: E402
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return SpoolManager(str(tmp_path / 'spool'), max_bytes=1000, max_age_seconds=3600, sweep_interval=300)
+
+
+def write(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as file:
+        file.write(b'x' * size)
+    return path
+
+
+def test_create_makes_separate_locked_directories(spool):
+    first, second = spool.create(), spool.create()
+
+    assert first != second
+    assert os.path.exists(os.path.join(first, LOCK_FILENAME))
+    assert spool._in_use(first)
+
+
+def test_record_and_release_keep_a_running_count(spool):
+    directory = spool.create()
+    assert spool.usage() == 0
+
+    assert spool.record(write(directory, 'a.pdf', 300)) == 300
+    spool.record(write(directory, 'b.pdf', 200))
+    assert spool.usage() == 500
+
+    spool.release(directory)
+    assert not os.path.exists(directory)
+    assert spool.usage() == 0
+
+
+def test_create_refuses_when_full_of_directories_in_use(spool):
+    directory = spool.create()
+    spool.record(write(directory, 'big.pdf', 1200))
+
+    with pytest.raises(SpoolFullError):
+        spool.create()
+
+
+def test_sweep_removes_abandoned_directories_but_not_live_ones(spool):
+    live = spool.create()
+    abandoned = os.path.join(spool.root, 'request-abandoned')
+    os.makedirs(abandoned)
+    write(abandoned, 'left.pdf', 100)
+    old = time.time() - 2 * spool.max_age_seconds
+    os.utime(abandoned, (old, old))
+    os.utime(live, (old, old))
+
+    assert spool.sweep() == 1
+    assert not os.path.exists(abandoned)
+    assert os.path.exists(live)
+
+
+def test_sweep_measures_files_it_was_not_told_about(spool):
+    directory = spool.create()
+    # e.g. written by another worker process sharing the root
+    write(directory, 'unrecorded.pdf', 400)
+    assert spool.usage() == 0
+
+    spool.sweep()
+
+    assert spool.usage() == 400
+
+
+def test_directory_context_releases_on_exit(spool):
+    with spool.directory('analysis-') as directory:
+        spool.record(write(directory, 'page.png', 100))
+
+    assert not os.path.exists(directory)
+    assert spool.usage() == 0
+
+
+def test_release_refuses_paths_outside_the_root(spool, tmp_path):
+    outside = tmp_path / 'keep'
+    outside.mkdir()
+
+    spool.release(str(outside))
+
+    assert outside.exists()
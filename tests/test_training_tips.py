@@ -0,0 +1,47 @@
+"""
+Cache keys and response parsing for breed training tips
+
+No database or OpenAI access; skipped when SQLAlchemy isn't installed,
+since training_tips imports it for the cache table.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('sqlalchemy')
+
+from training_tips import TIPS_PROMPT_VERSION, normalize, parse_tips, tips_cache_key  # noqa: E402
+
+
+def test_normalize_ignores_case_and_spacing():
+    assert normalize('  Golden   Retriever ') == 'golden retriever'
+    assert normalize(None) == ''
+
+
+def test_cache_key_is_shared_by_equivalent_breeds():
+    assert tips_cache_key('Dog', 'Golden  Retriever') == tips_cache_key('dog', 'golden retriever')
+    assert tips_cache_key('dog', 'beagle').startswith(f"v{TIPS_PROMPT_VERSION}:")
+
+
+def test_parse_tips_splits_the_three_sections():
+    response = (
+        "Training Tips:\n• Basic Training: sit\n\n"
+        "• Training Methods: rewards\n\n"
+        "Exercise & Play:\n• Exercise Needs: an hour a day\n\n"
+        "Enrichment Activities:\n• Mental Stimulation: puzzles"
+    )
+
+    tips = parse_tips(response)
+
+    assert tips['training'] == "Training Tips:\n• Basic Training: sit\n• Training Methods: rewards"
+    assert tips['play'] == "Exercise & Play:\n• Exercise Needs: an hour a day"
+    assert tips['enrichment'] == "Enrichment Activities:\n• Mental Stimulation: puzzles"
+
+
+def test_parse_tips_leaves_missing_sections_empty():
+    tips = parse_tips("Some preamble\n\nTraining Tips:\n• Basic Training: sit")
+
+    assert tips == {'training': "Training Tips:\n• Basic Training: sit", 'play': '', 'enrichment': ''}
@@ -0,0 +1,132 @@
+"""
+Multipart part sizing and resumable uploads against a stub S3 client
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('boto3')
+pytest.importorskip('sqlalchemy')
+
+from config import ProcessingConfig  # noqa: E402
+from transfers import MAX_PARTS, MB, MIN_PART_SIZE, ResumableUpload, part_size_for  # noqa: E402
+
+
+class StubS3:
+    """Just enough of the S3 client for multipart uploads, failing chosen parts"""
+
+    def __init__(self, fail_parts=()):
+        self.fail_parts = set(fail_parts)
+        self.uploads = {}  # upload id -> {part number: ETag}
+        self.uploaded_parts = []
+        self.completed = []
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber in self.fail_parts:
+            raise ConnectionError(f"part {PartNumber} dropped")
+        self.uploaded_parts.append(PartNumber)
+        etag = f'"etag-{PartNumber}"'
+        self.uploads[UploadId][PartNumber] = etag
+        return {'ETag': etag}
+
+    def get_paginator(self, operation):
+        assert operation == 'list_parts'
+        stub = self
+
+        class Paginator:
+            def paginate(self, Bucket, Key, UploadId):
+                parts = stub.uploads[UploadId]
+                yield {'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in sorted(parts.items())]}
+
+        return Paginator()
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.completed.append((Key, UploadId, [part['PartNumber'] for part in MultipartUpload['Parts']]))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+def test_part_size_is_at_least_the_s3_minimum():
+    assert part_size_for(1 * MB, 1 * MB) == MIN_PART_SIZE
+    assert part_size_for(100 * MB, 8 * MB) == 8 * MB
+
+
+def test_part_size_grows_to_stay_under_the_part_limit():
+    file_size = 8 * MB * MAX_PARTS * 3
+    part_size = part_size_for(file_size, 8 * MB)
+
+    assert part_size == 32 * MB
+    assert file_size <= part_size * MAX_PARTS
+
+
+@pytest.fixture
+def config(tmp_path):
+    return ProcessingConfig(s3_resume_dir=str(tmp_path / 'resume'), s3_multipart_chunksize_mb=5,
+                            s3_max_concurrency=1, retry_attempts=1, retry_delay=0)
+
+
+def write_file(path, size):
+    with open(path, 'wb') as file:
+        file.write(os.urandom(size))
+    return str(path)
+
+
+def test_retry_after_a_failed_part_only_sends_missing_parts(tmp_path, config):
+    # Three parts: 5MB, 5MB and 1MB
+    file_path = write_file(tmp_path / 'record.pdf', 11 * MB)
+    client = StubS3(fail_parts={2})
+
+    with pytest.raises(ConnectionError):
+        ResumableUpload(client, 'bucket', 'content/ab/record.pdf', file_path, config).upload()
+    assert sorted(client.uploaded_parts) == [1, 3]
+
+    client.fail_parts.clear()
+    client.uploaded_parts.clear()
+    ResumableUpload(client, 'bucket', 'content/ab/record.pdf', file_path, config).upload()
+
+    assert client.uploaded_parts == [2]
+    assert client.completed == [('content/ab/record.pdf', 'upload-1', [1, 2, 3])]
+    assert os.listdir(config.s3_resume_dir) == []
+
+
+def test_same_bytes_from_another_path_resume(tmp_path, config):
+    # A restarted worker spools the retried upload to a new directory
+    first_path = write_file(tmp_path / 'first.pdf', 11 * MB)
+    second_path = str(tmp_path / 'second.pdf')
+    with open(first_path, 'rb') as source, open(second_path, 'wb') as copy:
+        copy.write(source.read())
+    client = StubS3(fail_parts={3})
+
+    with pytest.raises(ConnectionError):
+        ResumableUpload(client, 'bucket', 'content/cd/record.pdf', first_path, config).upload()
+
+    client.fail_parts.clear()
+    client.uploaded_parts.clear()
+    ResumableUpload(client, 'bucket', 'content/cd/record.pdf', second_path, config).upload()
+
+    assert client.uploaded_parts == [3]
+    assert len(client.uploads) == 1
+
+
+def test_different_bytes_start_a_new_upload(tmp_path, config):
+    client = StubS3(fail_parts={2})
+    with pytest.raises(ConnectionError):
+        ResumableUpload(client, 'bucket', 'uploads/record.pdf', write_file(tmp_path / 'a.pdf', 11 * MB),
+                        config).upload()
+
+    client.fail_parts.clear()
+    client.uploaded_parts.clear()
+    ResumableUpload(client, 'bucket', 'uploads/record.pdf', write_file(tmp_path / 'b.pdf', 11 * MB),
+                    config).upload()
+
+    assert sorted(client.uploaded_parts) == [1, 2, 3]
+    assert client.completed[-1][1] == 'upload-2'
@@ -0,0 +1,106 @@
+"""
+/upload end to end against a real Postgres database
+
+Set TEST_DATABASE_URL to a scratch database to run these; they are skipped
+otherwise. Files go to MemoryStorage and the analysis handler is stubbed,
+so no AWS or OpenAI credentials are needed.
+"""
+import io
+import os
+import sys
+import time
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL not set')
+
+
+@pytest.fixture(scope='module')
+def app_module():
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ['STORAGE_BACKEND'] = 'memory'
+
+    import app as app_module
+    import jobs
+    from database import init_db
+
+    init_db()
+    app_module.app.config['TESTING'] = True
+    jobs._handlers['health_record'] = lambda payload: {'success': True, 'synopsis': 'stub'}
+    return app_module
+
+
+@pytest.fixture
+def owner(app_module):
+    """A user with one pet, removed after the test"""
+    from database import session_factory
+    from models import User, Pet
+
+    db = session_factory()
+    user = User(auth0_id=f"test|{uuid.uuid4().hex}", email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    db.flush()
+    pet = Pet(user_id=user.id, name='Rex', species='dog')
+    db.add(pet)
+    db.commit()
+    user_id, pet_id = str(user.id), str(pet.id)
+    db.close()
+
+    yield user_id, pet_id
+
+    from models import AnalysisJob
+
+    db = session_factory()
+    db.query(AnalysisJob).filter(AnalysisJob.user_id == user_id).delete()
+    # ORM delete so the pets and their files cascade
+    db.delete(db.get(User, uuid.UUID(user_id)))
+    db.commit()
+    db.close()
+
+
+def wait_for_job(app_module, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = app_module.job_queue.get(uuid.UUID(job_id))
+        if job and job['status'] in ('completed', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_upload_creates_files_and_queues_job(app_module, owner):
+    from database import session_factory
+    from models import PetFile
+
+    user_id, pet_id = owner
+    client = app_module.app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['is_authenticated'] = True
+        flask_session['db_user_id'] = user_id
+        flask_session['active_pet_id'] = pet_id
+
+    response = client.post('/upload', data={
+        'files[]': [
+            (io.BytesIO(b'vaccinated 2024'), 'record.txt'),
+            (io.BytesIO(b'checkup 2025'), 'record.txt')
+        ]
+    }, content_type='multipart/form-data')
+
+    # 202 Accepted: the files are stored and the analysis job is queued
+    assert response.status_code == 202, response.get_json()
+    body = response.get_json()
+    assert body['success'] is True
+    assert len(body['file_ids']) == 2
+
+    db = session_factory()
+    try:
+        assert db.query(PetFile).filter(PetFile.id.in_(body['file_ids'])).count() == 2
+    finally:
+        db.close()
+
+    assert wait_for_job(app_module, body['job_id'])['status'] == 'completed'
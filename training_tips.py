@@ -0,0 +1,250 @@
+import argparse
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects.postgresql import insert
+
+from assistant_runs import wait_for_run
+from config import default_config
+
+logger = logging.getLogger('TrainingTips')
+
+TIPS_ASSISTANT_ID = "asst_bYxIi1SefCRrdHSHfByUtNjd"
+
+# Bump whenever the prompt or the section parsing changes so cached tips are regenerated
+TIPS_PROMPT_VERSION = '1'
+
+
+def normalize(value):
+    """Lowercase and collapse whitespace so 'Golden  Retriever' and 'golden retriever' share an entry"""
+    return re.sub(r'\s+', ' ', (value or '').strip().lower())
+
+
+def tips_cache_key(species, breed):
+    """Cache key for a species/breed pair under the current prompt version"""
+    return f"v{TIPS_PROMPT_VERSION}:{normalize(species)}:{normalize(breed)}"
+
+
+def build_tips_prompt(species, breed):
+    return f"""As a veterinary expert, please provide detailed training and care tips for a {breed} {species}.
+        If you're not familiar with this specific breed, provide general tips for {species} while incorporating any known traits of similar breeds.
+
+        Please format your response with these sections:
+
+        Training Tips:
+        • Basic Training: Focus on essential commands and techniques specific to {breed}s
+        • Behavioral Tips: Common {breed} traits and how to manage them
+        • Training Methods: Most effective approaches for this breed
+
+        Exercise & Play:
+        • Exercise Needs: Daily requirements based on {breed} energy levels
+        • Play Activities: Best games and toys for this breed
+        • Exercise Tips: Special considerations for {breed}s
+
+        Enrichment Activities:
+        • Mental Stimulation: Puzzle and learning activities suited for {breed}s
+        • Environmental Enrichment: Creating an engaging space
+        • Social Enrichment: Interaction needs and socialization tips
+
+        Please be specific to the breed when possible, and provide general {species} advice when breed-specific information is limited."""
+
+
+def parse_tips(response):
+    """Split the assistant's answer into training, play and enrichment sections"""
+    result = {
+        'training': '',
+        'play': '',
+        'enrichment': ''
+    }
+
+    current_section = None
+    for section in response.split('\n\n'):
+        if 'Training Tips:' in section:
+            current_section = 'training'
+            result['training'] = section
+        elif 'Exercise & Play:' in section:
+            current_section = 'play'
+            result['play'] = section
+        elif 'Enrichment Activities:' in section:
+            current_section = 'enrichment'
+            result['enrichment'] = section
+        elif current_section:
+            result[current_section] += '\n' + section
+
+    return result
+
+
+def generate_tips(client, species, breed):
+    """Ask the assistant for tips and return the parsed sections"""
+    thread = client.beta.threads.create()
+    client.beta.threads.messages.create(
+        thread_id=thread.id,
+        role="user",
+        content=build_tips_prompt(species, breed)
+    )
+    run = client.beta.threads.runs.create(
+        thread_id=thread.id,
+        assistant_id=TIPS_ASSISTANT_ID
+    )
+    wait_for_run(client, thread.id, run.id)
+
+    messages = client.beta.threads.messages.list(thread_id=thread.id, limit=1)
+    return parse_tips(messages.data[0].content[0].text.value)
+
+
+class TrainingTipsCache:
+    """Persistent cache of generated training tips in the training_tips_cache table"""
+
+    def __init__(self, ttl_days=None):
+        self.ttl_days = ttl_days if ttl_days is not None else default_config.training_tips_ttl_days
+
+    def get(self, species, breed):
+        """Return cached tips, or None when missing or expired"""
+        from models import TrainingTipsCacheEntry
+        from database import session_factory, close_db_session
+
+        # Own session: a failed read mustn't abort the caller's transaction
+        db = None
+        try:
+            db = session_factory()
+            entry = db.query(TrainingTipsCacheEntry).filter(
+                TrainingTipsCacheEntry.cache_key == tips_cache_key(species, breed),
+                TrainingTipsCacheEntry.expires_at > datetime.utcnow()
+            ).first()
+            return entry.tips if entry else None
+        except Exception as e:
+            logger.warning(f"Training tips cache read failed: {e}")
+            return None
+        finally:
+            close_db_session(db)
+
+    def put(self, species, breed, tips):
+        from models import TrainingTipsCacheEntry
+        from database import session_factory, close_db_session
+
+        now = datetime.utcnow()
+        values = {
+            'cache_key': tips_cache_key(species, breed),
+            'species': normalize(species),
+            'breed': normalize(breed),
+            'prompt_version': TIPS_PROMPT_VERSION,
+            'tips': tips,
+            'created_at': now,
+            'expires_at': now + timedelta(days=self.ttl_days)
+        }
+
+        # Own session: generated tips are worth keeping even if the request fails
+        db = None
+        try:
+            db = session_factory()
+            statement = insert(TrainingTipsCacheEntry).values(**values)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=['cache_key'],
+                set_={key: values[key] for key in ('tips', 'created_at', 'expires_at')}
+            ))
+            db.commit()
+        except Exception as e:
+            if db:
+                db.rollback()
+            logger.warning(f"Training tips cache write failed: {e}")
+        finally:
+            close_db_session(db)
+
+    def invalidate(self, species=None, breed=None):
+        """
+        Delete cached tips
+
+        Args:
+            species: Only delete entries for this species (all species if None)
+            breed: Only delete entries for this breed (requires species)
+
+        Returns:
+            Number of entries deleted
+        """
+        from models import TrainingTipsCacheEntry
+        from database import get_db_session, close_db_session, commit_db_session
+
+        db = get_db_session()
+        try:
+            query = db.query(TrainingTipsCacheEntry)
+            if species:
+                query = query.filter(TrainingTipsCacheEntry.species == normalize(species))
+                if breed:
+                    query = query.filter(TrainingTipsCacheEntry.breed == normalize(breed))
+            deleted = query.delete(synchronize_session=False)
+            commit_db_session(db)
+            logger.info(f"Invalidated {deleted} cached training tips")
+            return deleted
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            close_db_session(db)
+
+    def get_or_generate(self, client, species, breed):
+        """
+        Return tips for a species/breed, calling the assistant only on a miss
+
+        Returns:
+            (tips dict, True if served from the cache)
+        """
+        tips = self.get(species, breed)
+        if tips is not None:
+            return tips, True
+
+        tips = generate_tips(client, species, breed)
+        if any(tips.values()):
+            self.put(species, breed, tips)
+        return tips, False
+
+
+training_tips_cache = TrainingTipsCache()
+
+
+def warm(client, pet_types=None, refresh=False):
+    """
+    Precompute tips for every breed in the catalog
+
+    Args:
+        client: OpenAI client
+        pet_types: Optional list of pet types to limit the warm-up to
+        refresh: Regenerate entries that are already cached
+
+    Returns:
+        (generated, skipped, failed) counts
+    """
+    from breeds import iter_breeds
+
+    generated = skipped = failed = 0
+    for species, breed in iter_breeds():
+        if pet_types and species not in pet_types:
+            continue
+        if not refresh and training_tips_cache.get(species, breed) is not None:
+            skipped += 1
+            continue
+        start = time.perf_counter()
+        try:
+            tips = generate_tips(client, species, breed)
+            training_tips_cache.put(species, breed, tips)
+            generated += 1
+            logger.info(f"Cached tips for {breed} {species} in {time.perf_counter() - start:.1f}s")
+        except Exception as e:
+            failed += 1
+            logger.error(f"Could not generate tips for {breed} {species}: {e}")
+    return generated, skipped, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Warm the training tips cache from the breed catalog')
+    parser.add_argument('--pet-type', action='append', dest='pet_types',
+                        help='Only warm this pet type (repeatable)')
+    parser.add_argument('--refresh', action='store_true', help='Regenerate tips that are already cached')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from gpt_agent import client
+
+    generated, skipped, failed = warm(client, pet_types=args.pet_types, refresh=args.refresh)
+    print(f"Generated {generated}, skipped {skipped} already cached, {failed} failed")
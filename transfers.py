@@ -0,0 +1,224 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.s3.transfer import TransferConfig
+
+from config import default_config
+from content_store import file_sha256
+
+logger = logging.getLogger('Transfers')
+
+MB = 1024 * 1024
+
+# S3 rejects parts smaller than 5MB (except the last) and more than 10,000 parts
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+
+
+def transfer_config(config=default_config):
+    """boto3 TransferConfig built from the multipart settings in ProcessingConfig"""
+    return TransferConfig(
+        multipart_threshold=config.s3_multipart_threshold_mb * MB,
+        multipart_chunksize=config.s3_multipart_chunksize_mb * MB,
+        max_concurrency=config.s3_max_concurrency,
+        use_threads=config.s3_max_concurrency > 1
+    )
+
+
+def part_size_for(file_size, chunk_size):
+    """Smallest part size >= chunk_size that keeps the upload under MAX_PARTS"""
+    part_size = max(MIN_PART_SIZE, chunk_size)
+    while file_size > part_size * MAX_PARTS:
+        part_size *= 2
+    return part_size
+
+
+class ResumableUpload:
+    """
+    Multipart upload that records finished parts on disk
+
+    Each completed part's ETag is written to a JSON state file, so a retry
+    after a dropped connection (or a restarted worker) re-sends only the
+    parts that are missing instead of the whole file. The state is keyed on
+    the bucket, key and the file's content hash, not its path, so the same
+    bytes uploaded again from a different (e.g. per-request) path resume too.
+    """
+
+    def __init__(self, client, bucket, key, file_path, config=default_config, extra_args=None,
+                 content_hash=None):
+        self.client = client
+        self.extra_args = extra_args or {}
+        self.bucket = bucket
+        self.key = key
+        self.file_path = file_path
+        self.config = config
+        self.file_size = os.path.getsize(file_path)
+        self.content_hash = content_hash or file_sha256(file_path)
+        self.part_size = part_size_for(self.file_size, config.s3_multipart_chunksize_mb * MB)
+        self.state_path = os.path.join(config.s3_resume_dir, f"{self._state_id()}.json")
+        self._lock = threading.Lock()
+        self.state = None
+
+    def _state_id(self):
+        identity = f"{self.bucket}|{self.key}|{self.content_hash}"
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as file:
+                state = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if state.get('part_size') != self.part_size:
+            return None
+        return state
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        temp_path = f"{self.state_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w') as file:
+            json.dump(self.state, file)
+        os.replace(temp_path, self.state_path)
+
+    def _clear_state(self):
+        try:
+            os.remove(self.state_path)
+        except FileNotFoundError:
+            pass
+
+    def _start(self):
+        """Resume the recorded multipart upload if S3 still has it, otherwise start one"""
+        state = self._load_state()
+        if state:
+            try:
+                # S3 is the source of truth for which parts actually landed
+                parts = {}
+                paginator = self.client.get_paginator('list_parts')
+                for page in paginator.paginate(Bucket=self.bucket, Key=self.key, UploadId=state['upload_id']):
+                    for part in page.get('Parts', []):
+                        parts[str(part['PartNumber'])] = part['ETag']
+                state['parts'] = parts
+                self.state = state
+                logger.info(f"Resuming upload of {self.key} with {len(parts)} parts done")
+                return
+            except Exception as e:
+                logger.warning(f"Could not resume upload of {self.key}, starting over: {e}")
+
+        upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)
+        self.state = {
+            'bucket': self.bucket,
+            'key': self.key,
+            'upload_id': upload['UploadId'],
+            'part_size': self.part_size,
+            'started_at': time.time(),
+            'parts': {}
+        }
+        self._save_state()
+
+    def _upload_part(self, part_number):
+        offset = (part_number - 1) * self.part_size
+        with open(self.file_path, 'rb') as file:
+            file.seek(offset)
+            body = file.read(self.part_size)
+
+        delay = self.config.retry_delay
+        for attempt in range(1, self.config.retry_attempts + 1):
+            try:
+                response = self.client.upload_part(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self.state['upload_id'],
+                    PartNumber=part_number,
+                    Body=body
+                )
+                break
+            except Exception as e:
+                if attempt == self.config.retry_attempts:
+                    raise
+                logger.warning(f"Part {part_number} of {self.key} failed (attempt {attempt}): {e}")
+                time.sleep(delay)
+                delay *= 2
+
+        with self._lock:
+            self.state['parts'][str(part_number)] = response['ETag']
+            self._save_state()
+
+    def upload(self):
+        """
+        Upload the missing parts and complete the upload
+
+        Raises:
+            The last part error if a part keeps failing; the state file is
+            kept so calling upload() again picks up where this one stopped
+        """
+        self._start()
+        part_count = max(1, -(-self.file_size // self.part_size))
+        missing = [number for number in range(1, part_count + 1) if str(number) not in self.state['parts']]
+
+        with ThreadPoolExecutor(max_workers=max(1, self.config.s3_max_concurrency)) as executor:
+            # list() re-raises the first part failure
+            list(executor.map(self._upload_part, missing))
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.state['upload_id'],
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': self.state['parts'][str(number)]}
+                for number in range(1, part_count + 1)
+            ]}
+        )
+        self._clear_state()
+        logger.info(f"Uploaded {self.key} in {part_count} parts of {self.part_size // MB}MB")
+
+    def abort(self):
+        """Abandon the upload and free the parts S3 is holding"""
+        state = self.state or self._load_state()
+        if state:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=state['upload_id'])
+            except Exception as e:
+                logger.warning(f"Could not abort upload of {self.key}: {e}")
+        self._clear_state()
+
+
+def abort_stale_uploads(client, config=default_config, max_age_hours=24):
+    """
+    Abort multipart uploads whose state files are older than max_age_hours
+
+    Parts of an unfinished upload are billed until it is aborted, so this is
+    run at startup to clean up after workers that died mid-upload.
+
+    Returns:
+        Number of uploads aborted
+    """
+    directory = config.s3_resume_dir
+    if not os.path.isdir(directory):
+        return 0
+
+    aborted = 0
+    cutoff = time.time() - max_age_hours * 3600
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, 'r') as file:
+                state = json.load(file)
+            if state.get('started_at', 0) > cutoff:
+                continue
+            client.abort_multipart_upload(Bucket=state['bucket'], Key=state['key'], UploadId=state['upload_id'])
+            aborted += 1
+        except Exception as e:
+            logger.warning(f"Could not abort stale upload {filename}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return aborted